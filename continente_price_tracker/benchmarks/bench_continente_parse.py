@@ -0,0 +1,72 @@
+"""
+Per-page CPU cost of parsing a Continente grid response.
+
+Compares the old pipeline, which tokenized every response three times (the
+throwaway soup in fetch_page, parse_total_products and parse_product_data),
+with `parse_page`, which reads the total and the tiles from a single tree.
+
+Usage (from the repository root), with a saved grid response, or without
+one to use the latest Continente page of the raw archive (a crawl run with
+SCRAPER_ARCHIVE=1 fills it):
+    python continente_price_tracker/benchmarks/bench_continente_parse.py \
+        [page.html]
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import config  # noqa: E402
+from archive import RawArchive  # noqa: E402
+from html_parsing import get_backend, parse_html  # noqa: E402
+from continente.catalog import (parse_page, parse_product_data,  # noqa: E402
+                                parse_total_products)
+
+REPEATS = 10
+
+
+def old_pipeline(html_content, backend):
+    parse_html(html_content, backend).find_all("div", class_="product-tile")
+    parse_total_products(html_content, backend)
+    parse_product_data(html_content, "bench", backend)
+
+
+def new_pipeline(html_content, backend):
+    parse_page(html_content, "bench", backend)
+
+
+def latest_archived_page():
+    archive = RawArchive(config.ARCHIVE_PATH)
+    index = os.path.join(config.ARCHIVE_PATH, "index")
+    days = sorted(name[:-len(".jsonl")] for name in os.listdir(index)
+                  if name.endswith(".jsonl")) if os.path.isdir(index) else []
+    for date in reversed(days):
+        entries = archive.entries(date, retailer="continente")
+        if entries:
+            return archive.get(entries[0])
+    sys.exit(f"No Continente page archived under {config.ARCHIVE_PATH}")
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            html_content = f.read()
+    else:
+        html_content = latest_archived_page()
+
+    for backend in ("bs4", "lxml"):
+        if get_backend(backend) != backend:
+            print(f"{backend}: not installed, skipped")
+            continue
+        old = timeit.timeit(lambda: old_pipeline(html_content, backend),
+                            number=REPEATS) / REPEATS
+        new = timeit.timeit(lambda: new_pipeline(html_content, backend),
+                            number=REPEATS) / REPEATS
+        print(f"{backend}: 3 parses {old * 1000:.1f} ms/page, "
+              f"1 parse {new * 1000:.1f} ms/page ({old / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cost of turning price strings into floats, on every row of price_data.csv.
+
+Compares the per-row `process_price` that notebooks/cleaning.py used to apply
+with the vectorized `prices.parse_prices`, on the prices as stored in the
+file ("22.99") and on the same amounts written the way the sites show them
+("€22,99/kg", "0,15€ / UN", "€1,997,33/lt").
+
+Usage (from the repository root):
+    python continente_price_tracker/benchmarks/bench_price_parse.py \
+        [price_data.csv]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from prices import parse_prices  # noqa: E402
+
+REPEATS = 5
+
+
+def process_price(price):
+    # The per-row parser formerly in notebooks/cleaning.py
+    price = str(price)
+    try:
+        clean_price = price.replace('€', '').split('/')[0].strip()
+        if ',' in clean_price and '.' in clean_price:
+            clean_price = clean_price.replace('.', '').replace(',', '.')
+        elif ',' in clean_price:
+            clean_price = clean_price.replace(',', '.')
+        return float(clean_price)
+    except ValueError:
+        return None
+
+
+def decimal_comma(amount, thousands):
+    # 1997.33 -> "1<thousands>997,33"
+    return f"{amount:,.2f}".replace(",", "X").replace(".", ",").replace(
+        "X", thousands)
+
+
+def site_formats(amounts):
+    # Cycle through the formats of the three sites, with Continente's comma
+    # thousands separator on the larger amounts
+    formats = [
+        lambda a: "€" + decimal_comma(a, ",") + "/kg",
+        lambda a: f"{a:.2f}".replace(".", ",") + "€ / UN",
+        lambda a: f"{a:.2f}",
+        lambda a: "€" + decimal_comma(a, ".") + "/lt",
+    ]
+    return pd.Series(
+        [formats[i % len(formats)](a) for i, a in enumerate(amounts)],
+        dtype="str")
+
+
+def compare(name, prices, expected):
+    per_row = timeit.timeit(lambda: prices.apply(process_price),
+                            number=REPEATS) / REPEATS
+    vectorized = timeit.timeit(lambda: parse_prices(prices),
+                               number=REPEATS) / REPEATS
+
+    old = pd.to_numeric(prices.apply(process_price),
+                        errors="coerce").to_numpy()
+    new = parse_prices(prices)["amount"].to_numpy()
+    old_wrong = int((~np.isclose(old, expected, equal_nan=True)).sum())
+    new_wrong = int((~np.isclose(new, expected, equal_nan=True)).sum())
+    print(f"{name}: {len(prices)} rows, process_price {per_row * 1000:.1f} ms "
+          f"({old_wrong} wrong), parse_prices {vectorized * 1000:.1f} ms "
+          f"({new_wrong} wrong), {per_row / vectorized:.1f}x faster")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "price_data.csv"
+    stored = pd.read_csv(path, usecols=["price"],
+                         dtype={"price": "str"})["price"]
+    amounts = pd.to_numeric(stored).to_numpy()
+
+    compare("stored", stored, amounts)
+    compare("site formats", site_formats(amounts), np.round(amounts, 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import os
+import sys
 import pandas as pd
 import glob
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from prices import parse_prices  # noqa: E402
+
 # Function to read and concatenate all CSV files in a given path
 def read_and_concat_csvs(directory_path):
     csv_files = glob.glob(f"{directory_path}/*.csv")
@@ -45,31 +52,8 @@ merged_df = pd.concat([continente_df, pingo_doce_df, auchan_df], axis=0, ignore_
 # Add a new column to identify the source
 merged_df['source'] = ['Continente'] * len(continente_df) + ['Pingo Doce'] * len(pingo_doce_df) + ["Auchan"] * len(auchan_df)
 
-# Function to clean and convert price to float
-def process_price(price):
-    price = str(price)
-    try:
-        # Remove currency symbol and units
-        clean_price = price.replace('€', '').split('/')[0].strip()
-        
-        # Check if the price has a European format (comma as decimal separator)
-        if ',' in clean_price and '.' in clean_price:
-            # Remove thousands separator (.) and replace comma with dot for decimals
-            clean_price = clean_price.replace('.', '').replace(',', '.')
-        elif ',' in clean_price:
-            # Only replace comma with dot if no thousands separator is present
-            clean_price = clean_price.replace(',', '.')
-        elif '.' in clean_price:
-            # If only dot is present, assume it's a standard decimal
-            clean_price = clean_price
-        
-        # Convert to float
-        return float(clean_price)
-    except ValueError:
-        return None
-
-# Apply the function to the price column
-merged_df['price'] = merged_df['price'].apply(process_price).dropna()
+# Convert every price format ("€22,99/un", "0,15€ / UN", 4.99) to a float in one pass
+merged_df['price'] = parse_prices(merged_df['price'])["amount"]
 merged_df.to_csv("price_data.csv")
 
 # Display the results
@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import config
+from storage.files import move_into_place
+
+# Single archive shared by every scraper of the process, created on first use
+_archive = None
+
+
+class RawArchive:
+    """
+    Content-addressed, zstd-compressed archive of raw category responses.
+
+    Each response is identified by a key hashed from (retailer, category,
+    unit, date), where unit is the page offset or page number. Bodies are
+    stored once per content hash, so identical responses (an unchanged
+    page, or the same page fetched twice) share one object:
+
+        <base_path>/objects/<ab>/<content sha256>.zst
+        <base_path>/index/<YYYYMMDD>.jsonl
+
+    The daily index maps every key to its object and keeps the fields needed
+    to re-parse the response offline.
+
+    Args:
+        base_path (str): Root directory of the archive.
+        level (int): zstd compression level.
+    """
+
+    def __init__(self, base_path="data/archive", level=10):
+        import zstandard
+
+        self.base_path = base_path
+        self.level = level
+        self._zstd = zstandard
+
+    @staticmethod
+    def make_key(retailer, category, unit, date):
+        raw = f"{retailer}|{category}|{unit}|{date}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.base_path, "objects", digest[:2],
+                            f"{digest}.zst")
+
+    def _index_path(self, date):
+        return os.path.join(self.base_path, "index", f"{date}.jsonl")
+
+    def put(self, retailer, category, unit, html_content, date=None):
+        """
+        Archives one raw response.
+
+        Args:
+            retailer (str): Retailer name ("continente", "pingo_doce",
+                "auchan").
+            category (str): Category or cgid the page belongs to.
+            unit (int): Page offset or page number.
+            html_content (str): The raw response body.
+            date (str): Crawl date as YYYYMMDD; defaults to today.
+
+        Returns:
+            str: The key of the archived response.
+        """
+        fetched_at = datetime.now()
+        date = date or fetched_at.strftime("%Y%m%d")
+        body = html_content.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # zstd contexts are not thread-safe, so each put gets its own
+            compressor = self._zstd.ZstdCompressor(level=self.level)
+            compressed = compressor.compress(body)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            move_into_place(tmp_path, object_path)
+
+        key = self.make_key(retailer, category, unit, date)
+        entry = {
+            "key": key,
+            "retailer": retailer,
+            "category": category,
+            "unit": unit,
+            "date": date,
+            "object": digest,
+            "fetched_at": fetched_at.strftime("%Y%m%d_%H%M%S"),
+        }
+        index_path = self._index_path(date)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return key
+
+    def entries(self, date, retailer=None):
+        """
+        Lists the responses archived on `date`, optionally for one retailer.
+
+        When a unit was archived more than once that day, only the latest
+        entry is returned.
+
+        Returns:
+            list: Index entries (dicts) ordered by retailer, category and unit.
+        """
+        index_path = self._index_path(date)
+        if not os.path.exists(index_path):
+            return []
+
+        latest = {}
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if retailer is None or entry["retailer"] == retailer:
+                    latest[entry["key"]] = entry
+        return sorted(latest.values(),
+                      key=lambda e: (e["retailer"], e["category"], e["unit"]))
+
+    def get(self, entry):
+        """Returns the decompressed body of an index entry."""
+        with open(self._object_path(entry["object"]), "rb") as f:
+            body = self._zstd.ZstdDecompressor().decompress(f.read())
+        return body.decode("utf-8")
+
+
+def get_archive():
+    """
+    Returns the process-wide archive, or None when archiving is disabled
+    (see `config.ARCHIVE_ENABLED`).
+    """
+    global _archive
+    if not config.ARCHIVE_ENABLED:
+        return None
+    if _archive is None:
+        _archive = RawArchive(config.ARCHIVE_PATH)
+    return _archive
+
+
+async def archive_response(retailer, category, unit, html_content,
+                           date=None):
+    """
+    Archives a response, off the event loop, when archiving is enabled.
+
+    `date` is the crawl date (YYYYMMDD) the scraper also uses for its journal
+    and output, so a run crossing midnight archives its pages under the day
+    they belong to.
+    """
+    archive = get_archive()
+    if archive is not None:
+        await asyncio.to_thread(archive.put, retailer, category, unit,
+                                html_content, date)
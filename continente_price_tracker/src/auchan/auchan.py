@@ -1,145 +1,188 @@
-import requests
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
-import pandas as pd
-import time
 import json
 from datetime import datetime
-from utils import retry_on_failure
+from html_parsing import parse_html
+from http_client import get_client, run
+from checkpoint import CheckpointJournal, IncompleteCategoryError
+from archive import archive_response, get_archive
+from tile_stream import TileStreamParser, streaming_enabled
+from parse_pool import closing_parse_stage, parse
+from records import RecordBuilder
+from schema import normalize_auchan
+from storage.sink import open_category_sink
 from logger import setup_logger
 
-
-def parse_products_from_html(html_content):
+AUCHAN_HOST = "www.auchan.pt"
+GRID_URL = ("https://www.auchan.pt/on/demandware.store/"
+            "Sites-AuchanPT-Site/pt_PT/Search-UpdateGrid")
+HEADERS = {
+    "User-Agent":
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36",
+    "Accept":
+    "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,"
+    "*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+    "Upgrade-Insecure-Requests": "1",
+    "TE": "Trailers"
+}
+
+
+# Schema of the product information DataFrame
+PRODUCT_SCHEMA = {
+    "product_id": 'str',
+    "product_name": 'str',
+    "product_price": 'float',
+    "product_category": 'str',
+    "product_category2": 'str',
+    "product_category3": 'str',
+    "product_image": 'str',
+    "product_urls": 'str',
+    "product_ratings": 'str',
+    "product_labels": 'str',
+    "product_promotions": 'str',
+    # "quantity_selector": 'str'
+}
+
+
+def product_row_from_tile(product):
     """
-    Parses HTML content to extract product information and returns it as a DataFrame.
+    Extracts the information of a single product tile.
 
     Args:
-        html_content (str): The raw HTML content of the page to be parsed.
+        product: The `div.product` element of the tile.
 
     Returns:
-        pd.DataFrame: A DataFrame containing parsed product information, such as product ID, name, price, categories, image, and other attributes.
+        dict: The product fields, keyed by the `PRODUCT_SCHEMA` column names.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
-
-    # Define the schema for the product information DataFrame
-    product_schema = {
-        "product_id": pd.Series(dtype='str'),
-        "product_name": pd.Series(dtype='str'),
-        "product_price": pd.Series(dtype='float'),
-        "product_category": pd.Series(dtype='str'),
-        "product_category2": pd.Series(dtype='str'),
-        "product_category3": pd.Series(dtype='str'),
-        "product_image": pd.Series(dtype='str'),
-        "product_urls": pd.Series(dtype='str'),
-        "product_ratings": pd.Series(dtype='str'),
-        "product_labels": pd.Series(dtype='str'),
-        "product_promotions": pd.Series(dtype='str'),
-        # "quantity_selector": pd.Series(dtype='str')
-    }
-
-    # Create an empty DataFrame with the defined schema
-    product_df = pd.DataFrame(product_schema)
+    product_data = {}
+
+    # Extract product ID
+    product_data['product_id'] = product['data-pid']
+
+    # Extract product URLs
+    product_urls = product.find('div', class_='product-tile')['data-urls']
+    product_data['product_urls'] = product_urls
+
+    # Extract product name
+    product_name = product.find('div',
+                                class_='pdp-link').find('a').text.strip()
+    product_data['product_name'] = product_name
+
+    # Extract product price
+    product_price = product.find('span', class_='value')['content']
+    product_data['product_price'] = float(product_price)
+
+    # Extract product category
+    product_category = product.find('div',
+                                    class_='product-tile')['data-gtm-new']
+    product_data['product_category'] = product_category
+
+    # Extract nested product categories
+    product_category_data = json.loads(product_category)
+    product_data['product_category'] = product_category_data.get(
+        'item_category', None)
+    product_data['product_category2'] = product_category_data.get(
+        'item_category2', None)
+    product_data['product_category3'] = product_category_data.get(
+        'item_category3', None)
+
+    # Extract product image URL
+    product_image = product.find('div',
+                                 class_='image-container').find('img')['src']
+    product_data['product_image'] = product_image
+
+    # Extract product ratings
+    product_ratings = product.find(
+        'div',
+        class_='auc-product-tile__bazaarvoice--ratings')['data-bv-product-id']
+    product_data['product_ratings'] = product_ratings
+
+    # Extract product labels
+    product_labels = []
+    labels = product.find_all('img', class_='auc-product-labels__icon')
+    for label in labels:
+        product_labels.append({
+            'alt': label['alt'],
+            'title': label['title'],
+            # 'src': label['src']
+        })
+    product_data['product_labels'] = product_labels
+
+    # Extract product promotions (assign None if not found)
+    product_promotions = product.find('div',
+                                      class_='auc-price__promotion__label')
+    product_data['product_promotions'] = product_promotions.text.strip(
+    ) if product_promotions else None
+
+    # Extract quantity selector details (assign None if not found)
+    # quantity_selector = product.find('div', class_='auc-qty-selector')
+    # if quantity_selector:
+    #     product_data['quantity_selector'] = quantity_selector
+    # else:
+    #     product_data['quantity_selector'] = None
+
+    # Convert nested dictionaries to JSON strings for DataFrame compatibility
+    product_data["product_urls"] = str(product_data["product_urls"])
+    product_data["product_ratings"] = str(product_data["product_ratings"])
+    product_data["product_labels"] = str(product_data["product_labels"])
+    # product_data["quantity_selector"] = str(
+    #     product_data["quantity_selector"])
+
+    return product_data
+
+
+def products_frame(product_list):
+    """
+    Builds the product DataFrame from the tile rows, with the `PRODUCT_SCHEMA`
+    columns in order even when the page has no products.
 
-    # Find all product elements in the HTML
-    products = soup.find_all('div', class_='product')
+    Args:
+        product_list (list): Rows returned by `product_row_from_tile`.
 
-    product_list = []
-
-    for product in products:
-        product_data = {}
-
-        # Extract product ID
-        product_data['product_id'] = product['data-pid']
-
-        # Extract product URLs
-        product_urls = product.find('div', class_='product-tile')['data-urls']
-        product_data['product_urls'] = product_urls
-
-        # Extract product name
-        product_name = product.find('div',
-                                    class_='pdp-link').find('a').text.strip()
-        product_data['product_name'] = product_name
-
-        # Extract product price
-        product_price = product.find('span', class_='value')['content']
-        product_data['product_price'] = float(product_price)
-
-        # Extract product category
-        product_category = product.find('div',
-                                        class_='product-tile')['data-gtm-new']
-        product_data['product_category'] = product_category
-
-        # Extract nested product categories
-        product_category_data = json.loads(product_category)
-        product_data['product_category'] = product_category_data.get(
-            'item_category', None)
-        product_data['product_category2'] = product_category_data.get(
-            'item_category2', None)
-        product_data['product_category3'] = product_category_data.get(
-            'item_category3', None)
-
-        # Extract product image URL
-        product_image = product.find(
-            'div', class_='image-container').find('img')['src']
-        product_data['product_image'] = product_image
-
-        # Extract product ratings
-        product_ratings = product.find(
-            'div', class_='auc-product-tile__bazaarvoice--ratings'
-        )['data-bv-product-id']
-        product_data['product_ratings'] = product_ratings
-
-        # Extract product labels
-        product_labels = []
-        labels = product.find_all('img', class_='auc-product-labels__icon')
-        for label in labels:
-            product_labels.append({
-                'alt': label['alt'],
-                'title': label['title'],
-                # 'src': label['src']
-            })
-        product_data['product_labels'] = product_labels
-
-        # Extract product promotions (assign None if not found)
-        product_promotions = product.find('div',
-                                          class_='auc-price__promotion__label')
-        product_data['product_promotions'] = product_promotions.text.strip(
-        ) if product_promotions else None
-
-        # Extract quantity selector details (assign None if not found)
-        # quantity_selector = product.find('div', class_='auc-qty-selector')
-        # if quantity_selector:
-        #     product_data['quantity_selector'] = quantity_selector
-        # else:
-        #     product_data['quantity_selector'] = None
-
-        # Convert nested dictionaries to JSON strings for DataFrame compatibility
-        product_data["product_urls"] = str(product_data["product_urls"])
-        product_data["product_ratings"] = str(product_data["product_ratings"])
-        product_data["product_labels"] = str(product_data["product_labels"])
-        # product_data["quantity_selector"] = str(
-        #     product_data["quantity_selector"])
-
-        # Append the product data to the list
-        product_list.append(product_data)
-
-    # Convert the list of product data to a DataFrame
-    product_df = pd.concat([product_df, pd.DataFrame(product_list)],
-                           ignore_index=True)
-
-    # Reindex the DataFrame to ensure it has the same columns as the schema
-    product_df = product_df.reindex(columns=product_schema.keys())
+    Returns:
+        pd.DataFrame: The products of the page.
+    """
+    # Collect the rows column by column and build the DataFrame once
+    builder = RecordBuilder(PRODUCT_SCHEMA)
+    builder.extend(product_list)
+    product_df = builder.to_frame()
 
     # Assert that the DataFrame structure is consistent with the schema
     assert list(product_df.columns) == list(
-        product_schema.keys()), "DataFrame structure does not match the schema"
+        PRODUCT_SCHEMA.keys()), "DataFrame structure does not match the schema"
 
     return product_df
 
 
-@retry_on_failure(retries=3, delay=60)
-def get_auchan_data(cgid, prefn1, prefv1, start, sz, next, selectedUrl):
+def parse_products_from_html(html_content, backend=None):
+    """
+    Parses HTML content to extract product information and returns it as a
+    DataFrame.
+
+    Args:
+        html_content (str): The raw HTML content of the page to be parsed.
+        backend (str): HTML parser backend ("lxml" or "bs4"); defaults to the
+            configured one.
+
+    Returns:
+        pd.DataFrame: A DataFrame containing parsed product information,
+        such as product ID, name, price, categories, image, and other
+        attributes.
+    """
+    soup = parse_html(html_content, backend)
+
+    # Find all product elements in the HTML
+    products = soup.find_all('div', class_='product')
+
+    return products_frame(
+        [product_row_from_tile(product) for product in products])
+
+
+async def get_auchan_data(cgid, prefn1, prefv1, start, sz, next, selectedUrl,
+                          date=None):
     """
     Fetches HTML data from the Auchan store's search API endpoint.
 
@@ -151,22 +194,41 @@ def get_auchan_data(cgid, prefn1, prefv1, start, sz, next, selectedUrl):
         sz (int): The number of products to fetch per request.
         next (str): Whether or not to fetch the next page of products (usually "true").
         selectedUrl (str): The URL that includes the parameters for the request.
+        date (str): Crawl date (YYYYMMDD) the response is archived under;
+            defaults to today.
 
     Returns:
         str: The raw HTML content from the Auchan store's search results.
     """
-    url = "https://www.auchan.pt/on/demandware.store/Sites-AuchanPT-Site/pt_PT/Search-UpdateGrid"
-    headers = {
-        "User-Agent":
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36",
-        "Accept":
-        "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-        "TE": "Trailers"
+    url = GRID_URL
+    params = {
+        "cgid": cgid,
+        "prefn1": prefn1,
+        "prefv1": prefv1,
+        "start": start,
+        "sz": sz,
+        "next": next
     }
+
+    client = get_client(AUCHAN_HOST, headers=HEADERS)
+    html_content = await client.get_text(url, params=params)
+    await archive_response("auchan", cgid, start, html_content, date)
+    return html_content
+
+
+async def stream_auchan_data(cgid, prefn1, prefv1, start, sz, next,
+                             selectedUrl, date=None):
+    """
+    Fetches a page from the Auchan store's search API endpoint and extracts the
+    product tiles while the response downloads, without building the full DOM.
+
+    Args:
+        Same as `get_auchan_data`.
+
+    Returns:
+        pd.DataFrame: The parsed products of the page, like
+        `parse_products_from_html`.
+    """
     params = {
         "cgid": cgid,
         "prefn1": prefn1,
@@ -175,17 +237,22 @@ def get_auchan_data(cgid, prefn1, prefv1, start, sz, next, selectedUrl):
         "sz": sz,
         "next": next
     }
+    keep_body = get_archive() is not None
 
-    response = requests.get(url, headers=headers, params=params)
+    def make_parser():
+        return TileStreamParser("product", product_row_from_tile,
+                                keep_body=keep_body)
 
-    if response.status_code == 200:
-        return response.text
-    else:
-        response.raise_for_status()
+    client = get_client(AUCHAN_HOST, headers=HEADERS)
+    stream = await client.stream(GRID_URL, make_parser, params=params)
+    if keep_body:
+        await archive_response("auchan", cgid, start, stream.body, date)
+    return products_frame(stream.rows)
 
 
-@retry_on_failure(retries=3, delay=60)
-def get_and_parse_auchan_data(cgid, prefn1, prefv1, sz, base_url, logger):
+async def get_and_parse_auchan_data(cgid, prefn1, prefv1, sz, base_url,
+                                    logger, journal=None, sink=None,
+                                    date=None):
     """
     Retrieves and parses product data from the Auchan store in a paginated manner.
 
@@ -196,30 +263,67 @@ def get_and_parse_auchan_data(cgid, prefn1, prefv1, sz, base_url, logger):
         sz (int): The number of products to fetch per request.
         base_url (str): The base URL of the search results.
         logger (logging.Logger): The logger object for logging messages.
+        journal (CheckpointJournal): Optional journal of completed pages;
+            pages found in it are replayed instead of fetched.
+        sink (CategorySink): Optional sink each page is written to as soon
+            as it is parsed, instead of being accumulated.
+        date (str): Crawl date (YYYYMMDD) the responses are archived under;
+            defaults to today.
 
     Returns:
-        pd.DataFrame: A DataFrame containing parsed product information across multiple pages.
+        pd.DataFrame: A DataFrame containing parsed product information
+        across multiple pages (empty when a sink is given).
+
+    Raises:
+        IncompleteCategoryError: If a page could not be fetched; the pages
+            before it stay journaled for the next run.
     """
     start = 0
-    all_data = pd.DataFrame()
+    # Pages are accumulated column-wise and turned into one DataFrame at the
+    # end
+    all_data = RecordBuilder(PRODUCT_SCHEMA)
 
     with tqdm(total=30, unit='batch') as pbar:
         while True:
             selectedUrl = f"{base_url}?cgid={cgid}&prefn1={prefn1}&prefv1={prefv1}&start={start}&sz={sz}&next=true"
 
             try:
-                data = get_auchan_data(cgid, prefn1, prefv1, start, sz, "true", selectedUrl)
-                logger.info(f"Successful GET request for URL: {selectedUrl}")
-                parsed_data = parse_products_from_html(data)
+                checkpoint = (journal.get(cgid, start)
+                              if journal is not None else None)
+                if checkpoint is not None:
+                    parsed_data, _ = checkpoint
+                    logger.info(f"Replaying URL {selectedUrl} from checkpoint")
+                elif streaming_enabled():
+                    parsed_data = await stream_auchan_data(
+                        cgid, prefn1, prefv1, start, sz, "true", selectedUrl,
+                        date)
+                    logger.info(f"Successful GET request for URL: "
+                                f"{selectedUrl}")
+                else:
+                    data = await get_auchan_data(
+                        cgid, prefn1, prefv1, start, sz, "true", selectedUrl,
+                        date)
+                    logger.info(f"Successful GET request for URL: "
+                                f"{selectedUrl}")
+                    parsed_data = await parse(parse_products_from_html, data)
+
+                if checkpoint is None and journal is not None:
+                    journal.record(cgid, start, parsed_data)
 
             except Exception as e:
                 logger.error(f"Error fetching data for URL {selectedUrl}: {str(e)}")
-                return all_data
-
-            all_data = pd.concat([all_data, parsed_data], ignore_index=True)
+                # The next page is only known from this one, so the category
+                # stops here
+                raise IncompleteCategoryError(
+                    f"Page at start {start} of cgid {cgid} could not be "
+                    f"fetched") from e
+
+            if sink is not None:
+                sink.write_page(parsed_data)
+            else:
+                all_data.extend_frame(parsed_data)
 
             pbar.update(1)
-            time.sleep(3)
 
             if len(parsed_data) < sz:
                 break
@@ -227,15 +331,15 @@ def get_and_parse_auchan_data(cgid, prefn1, prefv1, sz, base_url, logger):
             start += sz
             pbar.total += 1  # Increase the total count dynamically
 
-    return all_data
+    return all_data.to_frame()
 
 
-def save_data_for_all_cgids(cgid_list,
-                            prefn1,
-                            prefv1,
-                            sz,
-                            base_url,
-                            base_path="data/raw"):
+async def save_data_for_all_cgids_async(cgid_list,
+                                        prefn1,
+                                        prefv1,
+                                        sz,
+                                        base_url,
+                                        base_path="data/raw"):
     """
     Fetches and processes product data for each cgid in the list and saves it to CSV files in the specified directory.
 
@@ -268,32 +372,70 @@ def save_data_for_all_cgids(cgid_list,
     os.makedirs(data_directory, exist_ok=True)
     logger.info(f"Data will be saved in '{data_directory}'")
 
+    # Completed pages and cgids survive a crash in the checkpoint journal
+    journal = CheckpointJournal("auchan", date=timestamp)
+
     # Loop through each cgid and fetch & save the corresponding data
     for cgid in cgid_list:
+        if journal.is_category_done(cgid):
+            logger.info(f"Skipping cgid {cgid}, already saved by a previous "
+                        f"run")
+            continue
+
         logger.info(f"Processing cgid: {cgid}")
 
         try:
-            # Fetch and parse the data for the given cgid
-            final_data = get_and_parse_auchan_data(cgid, prefn1, prefv1, sz, base_url, logger)
-            final_data["source"] = "auchan"
-            final_data["timestamp"] = timestamp
-
-            if not final_data.empty:
-                # Create a filename with timestamp and cgid
-                filename = f"{cgid}_{timestamp}.csv"
-                file_path = os.path.join(data_directory, filename)
-
-                # Save the data to CSV
-                final_data.to_csv(file_path, index=False)
-                logger.info(f"Data for {cgid} saved to {file_path}")
+            # Create a filename with timestamp and cgid
+            filename = f"{cgid}_{timestamp}.csv"
+            file_path = os.path.join(data_directory, filename)
+
+            # Fetch and parse the data for the given cgid; every page is
+            # converted to the canonical product schema and saved in the
+            # configured output format as it arrives
+            with open_category_sink(
+                    "auchan", timestamp, cgid,
+                    lambda page: normalize_auchan(page, cgid,
+                                                  tracking_date=timestamp),
+                    file_path) as sink:
+                await get_and_parse_auchan_data(cgid, prefn1, prefv1, sz,
+                                                base_url, logger, journal,
+                                                sink, timestamp)
+
+            if sink.rows:
+                logger.info(f"Data for {cgid} saved to {sink.path}")
+                journal.mark_category_done(cgid)
             else:
                 logger.warning(f"No data found for {cgid}. Skipping...")
+        except IncompleteCategoryError as e:
+            logger.warning(f"cgid {cgid} left incomplete for the next run: "
+                           f"{str(e)}")
         except Exception as e:
             logger.error(f"Error processing cgid {cgid}: {str(e)}", exc_info=True)
 
+    # Keep the journal while some cgid is still missing so a rerun can
+    # finish it
+    if all(journal.is_category_done(cgid) for cgid in cgid_list):
+        journal.discard()
+
     logger.info("Data fetch process completed")
 
 
+def save_data_for_all_cgids(cgid_list,
+                            prefn1,
+                            prefv1,
+                            sz,
+                            base_url,
+                            base_path="data/raw"):
+    """
+    Synchronous entry point that runs `save_data_for_all_cgids_async` in its
+    own event loop.
+    """
+    run(
+        closing_parse_stage(
+            save_data_for_all_cgids_async(cgid_list, prefn1, prefv1, sz,
+                                          base_url, base_path)))
+
+
 # List of cgid values
 # cgid_list = [
 #     "alimentacao-", "biologico-e-escolhas-alimentares",
@@ -0,0 +1,258 @@
+"""
+Imports every generation of CSV output found on disk into the Parquet store.
+
+Three layouts have been written over time, all recognised from their path:
+
+    <cat>_<YYYYMMDD>_<HHMMSS>.csv                   legacy Continente files
+    .../continente/<YYYYMMDD>/<cat>.csv             Continente by date
+    .../pingo_doce/<YYYYMMDD>/<cat>.csv             Pingo Doce by date
+    .../auchan/<YYYYMMDD>/<cgid>_<YYYYMMDD>.csv     Auchan by date
+
+Each file is read and converted to the canonical product schema by the
+retailer's `normalize_*` function (files already in the canonical schema,
+from the "csv" output format, are only cast) and written to its Parquet
+partition by a pool of worker processes. The product dimension and the price
+history are then updated in date order, one rewrite per retailer and day.
+
+Imported files are recorded in a checkpoint journal, so an interrupted
+backfill picks up where it stopped when run again.
+
+Usage:
+    python continente_price_tracker/src/backfill.py . data/raw
+    python continente_price_tracker/src/backfill.py data/raw --workers 8 \
+        --restart
+"""
+import argparse
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+import pandas as pd
+from tqdm import tqdm
+
+import config
+from checkpoint import CheckpointJournal
+from logger import setup_logger
+from schema import (PRODUCT_SCHEMA, RETAILERS, normalize_auchan,
+                    normalize_continente, normalize_pingo_doce,
+                    to_product_schema)
+from storage.output import (detect_changes, get_dimension, get_history,
+                            get_store, load_warehouse, update_aggregates,
+                            update_matches, update_matrix,
+                            update_product_index)
+
+logger = setup_logger("logs/backfill.log")
+
+LEGACY_PATTERN = re.compile(r"^(?P<cgid>.+)_(?P<date>\d{8})_\d{6}\.csv$")
+AUCHAN_PATTERN = re.compile(r"^(?P<cgid>.+)_(?P<date>\d{8})\.csv$")
+DATE_PATTERN = re.compile(r"^\d{8}$")
+
+# Legacy Continente files called the product price "Price per kg"
+LEGACY_COLUMNS = {"Price per kg": "Price"}
+
+
+def classify(path):
+    """
+    Works out where a CSV file comes from.
+
+    Returns:
+        tuple: (retailer, date, cgid), or None for files that are not
+        scraper output.
+    """
+    name = os.path.basename(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    date_dir = os.path.basename(directory)
+    retailer_dir = os.path.basename(os.path.dirname(directory))
+
+    if DATE_PATTERN.match(date_dir) and retailer_dir in RETAILERS:
+        if retailer_dir == "auchan":
+            match = AUCHAN_PATTERN.match(name)
+            cgid = match.group("cgid") if match else name[:-len(".csv")]
+        else:
+            cgid = name[:-len(".csv")]
+        return retailer_dir, date_dir, cgid
+
+    match = LEGACY_PATTERN.match(name)
+    if match:
+        return "continente", match.group("date"), match.group("cgid")
+    return None
+
+
+def discover(roots):
+    """
+    Finds the scraper CSV files under `roots`, oldest crawl first.
+
+    Returns:
+        list: (retailer, date, cgid, path) tuples. When two files hold the
+        same category of the same day, the one found last is kept.
+    """
+    found = {}
+    for root in roots:
+        for directory, subdirectories, files in os.walk(root):
+            # Hidden directories (.git, files being written) hold no output
+            subdirectories[:] = sorted(d for d in subdirectories
+                                       if not d.startswith("."))
+            for name in sorted(files):
+                if not name.endswith(".csv"):
+                    continue
+                path = os.path.abspath(os.path.join(directory, name))
+                key = classify(path)
+                if key is None:
+                    continue
+                if key in found and found[key] != path:
+                    logger.warning(f"{path} duplicates {found[key]}; "
+                                   f"keeping {path}")
+                found[key] = path
+    # Crawls are applied in date order
+    return sorted((key + (path,) for key, path in found.items()),
+                  key=lambda task: (task[1], task[0], task[2]))
+
+
+def read_normalized(retailer, date, cgid, path):
+    """Reads one CSV file and converts it to the canonical product schema."""
+    df = pd.read_csv(path, dtype={"Product ID": "str", "product_id": "str"})
+    if set(PRODUCT_SCHEMA) <= set(df.columns):
+        return to_product_schema(
+            {column: df[column] for column in PRODUCT_SCHEMA}, df.index)
+    if retailer == "continente":
+        df = df.rename(columns={
+            old: new
+            for old, new in LEGACY_COLUMNS.items() if new not in df.columns
+        })
+        df["cgid"] = cgid
+        return normalize_continente(df, tracking_date=date)
+    if retailer == "pingo_doce":
+        return normalize_pingo_doce(df, cgid, tracking_date=date)
+    return normalize_auchan(df, cgid, tracking_date=date)
+
+
+def import_file(retailer, date, cgid, path):
+    """
+    Worker task: writes one file to its Parquet partition.
+
+    Returns:
+        pd.DataFrame: The normalized rows, for the dimension and history.
+    """
+    df = read_normalized(retailer, date, cgid, path)
+    if not df.empty:
+        get_store().write_category(df, retailer, date, cgid)
+    return df
+
+
+def _ordered_results(executor, tasks, window):
+    # Results come back in task order, with at most `window` files in flight,
+    # so the derived tables see the days in order and memory stays bounded
+    pending = deque()
+    for task in tasks:
+        pending.append((task, executor.submit(import_file, *task)))
+        if len(pending) >= window:
+            task, future = pending.popleft()
+            yield task, future
+    while pending:
+        yield pending.popleft()
+
+
+def update_derived_day(retailer, date, frames):
+    """
+    Folds one retailer's day of imported categories into the derived tables.
+    """
+    dimension = get_dimension()
+    if dimension is not None:
+        dimension.upsert(pd.concat(frames.values(), ignore_index=True),
+                         retailer, date)
+    history = get_history()
+    if history is not None:
+        history.apply_day(frames, retailer, date)
+
+
+def _import_day(retailer, date, results, journal, progress):
+    # Collects one retailer's day of imported categories, updates the
+    # derived tables with them in one rewrite and records the files as done.
+    # Returns the paths imported, none when the derived tables failed.
+    frames = {}
+    paths = []
+    for (_, _, cgid, path), future in results:
+        try:
+            df = future.result()
+            if not df.empty:
+                frames[cgid] = df
+            paths.append(path)
+        except Exception as e:
+            logger.error(f"Error importing {path}: {str(e)}", exc_info=True)
+        progress.update(1)
+
+    if frames:
+        try:
+            update_derived_day(retailer, date, frames)
+        except Exception as e:
+            logger.error(f"Error updating the derived tables for {retailer} "
+                         f"{date}: {str(e)}", exc_info=True)
+            return []
+    for path in paths:
+        journal.mark_category_done(path)
+    logger.info(f"Imported {len(paths)} {retailer} files of {date}")
+    return paths
+
+
+def backfill(roots, workers=None, restart=False):
+    """
+    Imports every scraper CSV file under `roots` that is not imported yet.
+
+    Args:
+        roots (list): Directories to search.
+        workers (int): Worker processes; defaults to `config.PARSE_WORKERS`.
+        restart (bool): Forget previous progress and import everything again.
+
+    Returns:
+        list: Paths of the files imported by this run.
+    """
+    journal = CheckpointJournal("backfill", date="import")
+    if restart:
+        journal.discard()
+
+    tasks = [task for task in discover(roots)
+             if not journal.is_category_done(task[3])]
+    workers = workers or config.PARSE_WORKERS
+    logger.info(f"Importing {len(tasks)} files with {workers} workers")
+
+    imported = []
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            tqdm(total=len(tasks), unit="file") as progress:
+        results = _ordered_results(executor, tasks, window=2 * workers)
+        # One retailer's day at a time: its categories share one rewrite of
+        # the dimension and history files
+        days = groupby(results, key=lambda item: (item[0][1], item[0][0]))
+        for (date, retailer), group in days:
+            imported += _import_day(retailer, date, group, journal, progress)
+
+    # Every day touched goes to the warehouse in one load each, and through
+    # the change detector and the aggregates in date order
+    dates = {classify(path)[1] for path in imported}
+    load_warehouse(dates)
+    detect_changes(dates)
+    update_aggregates(dates)
+    update_matrix(dates)
+    update_product_index(dates)
+    if dates:
+        update_matches(max(dates))
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("roots", nargs="+",
+                        help="Directories to search for CSV files")
+    parser.add_argument("--workers", type=int, default=config.PARSE_WORKERS)
+    parser.add_argument("--restart", action="store_true",
+                        help="Import every file again, ignoring previous "
+                        "progress")
+    args = parser.parse_args()
+
+    imported = backfill(args.roots, args.workers, args.restart)
+    print(f"Imported {len(imported)} files")
+
+
+if __name__ == "__main__":
+    main()
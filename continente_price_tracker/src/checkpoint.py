@@ -0,0 +1,129 @@
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+
+class IncompleteCategoryError(Exception):
+    """
+    Raised when some units of a category could not be fetched.
+
+    The category is then neither saved nor marked done: its completed units
+    stay in the journal, so the next run only fetches the missing ones.
+    """
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of the crawl units a retailer has completed today.
+
+    A unit is one page of a category, identified by its offset (Continente,
+    Auchan) or page number (Pingo Doce). Each completed unit is written as one
+    JSON line together with the rows parsed from it, and each saved category
+    gets a closing line. A restarted run loads the journal, skips categories
+    that were already saved and replays finished pages instead of fetching them
+    again.
+
+    Rows only stay in memory for the units loaded from a previous run, until
+    they are replayed; units recorded by this run go to disk only.
+
+    The journal lives in `<base_path>/<retailer>/<YYYYMMDD>.jsonl`, so a new
+    day always starts from scratch.
+
+    Args:
+        retailer (str): Retailer name, used to namespace the journal.
+        date (str): Crawl date as YYYYMMDD; defaults to today.
+        base_path (str): Directory holding the journals.
+    """
+
+    def __init__(self, retailer, date=None, base_path="data/checkpoints"):
+        date = date or datetime.now().strftime("%Y%m%d")
+        self.path = os.path.join(base_path, retailer, f"{date}.jsonl")
+        # Entries loaded from the journal, with their rows, until replayed
+        self._units = {}
+        self._done_categories = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by the crash; everything before it
+                    # is valid
+                    break
+                if entry.get("done"):
+                    self._done_categories.add(entry["category"])
+                else:
+                    self._units[(entry["category"], entry["unit"])] = entry
+        # Rows of saved categories are never needed again
+        self._units = {
+            key: entry
+            for key, entry in self._units.items()
+            if key[0] not in self._done_categories
+        }
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def get(self, category, unit):
+        """
+        Returns the rows and metadata a previous run journaled for a unit.
+
+        The rows are handed out once: the entry is dropped from memory as
+        soon as it has been replayed.
+
+        Returns:
+            tuple: (pd.DataFrame, dict) with the parsed rows and the unit
+            metadata, or None if there is nothing to replay for the unit.
+        """
+        entry = self._units.pop((category, unit), None)
+        if entry is None:
+            return None
+        return pd.DataFrame(entry["rows"]), entry["meta"]
+
+    def record(self, category, unit, rows, meta=None):
+        """
+        Journals a completed unit.
+
+        Args:
+            category (str): Category the unit belongs to.
+            unit (int): Offset or page number of the unit.
+            rows (pd.DataFrame): Rows parsed from the unit.
+            meta (dict): Extra values needed to resume, e.g. the total
+                product count.
+        """
+        # The rows go to disk only; a rerun reads them back from there
+        self._append({
+            "category": category,
+            "unit": unit,
+            "meta": meta or {},
+            "rows": json.loads(rows.to_json(orient="records")),
+        })
+
+    def is_category_done(self, category):
+        return category in self._done_categories
+
+    def mark_category_done(self, category):
+        """Journals that a category has been saved and forgets its units."""
+        self._append({"category": category, "done": True})
+        self._done_categories.add(category)
+        self._units = {
+            key: entry
+            for key, entry in self._units.items() if key[0] != category
+        }
+
+    def discard(self):
+        """Removes the journal once the whole run has completed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._units.clear()
+        self._done_categories.clear()
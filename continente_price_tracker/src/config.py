@@ -0,0 +1,126 @@
+"""
+Runtime settings shared by the scrapers.
+
+Every value can be overridden through an environment variable so the CI
+workflow can tune the crawl without code changes.
+"""
+import os
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Total time (seconds) allowed for a single HTTP request, connect included.
+HTTP_TIMEOUT = _env_float("SCRAPER_HTTP_TIMEOUT", 30.0)
+
+# Time (seconds) allowed to establish the TCP+TLS connection.
+HTTP_CONNECT_TIMEOUT = _env_float("SCRAPER_HTTP_CONNECT_TIMEOUT", 10.0)
+
+# Maximum number of requests in flight against a single retailer host.
+HOST_CONCURRENCY = _env_int("SCRAPER_HOST_CONCURRENCY", 4)
+
+# Once the first page reveals the catalogue size, fetch the remaining pages
+# concurrently instead of one at a time ("0" disables the fan-out).
+FANOUT_ENABLED = os.getenv("SCRAPER_FANOUT", "1") != "0"
+
+# Maximum number of pages of one category scheduled at the same time.
+FANOUT_WORKERS = _env_int("SCRAPER_FANOUT_WORKERS", 8)
+
+# Adaptive per-host rate limit (requests per second). Each host starts at the
+# initial rate and moves between the bounds depending on how the site answers.
+RATE_LIMIT_INITIAL = _env_float("SCRAPER_RATE_INITIAL", 1.0)
+RATE_LIMIT_MIN = _env_float("SCRAPER_RATE_MIN", 0.1)
+RATE_LIMIT_MAX = _env_float("SCRAPER_RATE_MAX", 10.0)
+
+# Number of requests that may start back to back before the rate applies.
+RATE_LIMIT_BURST = _env_int("SCRAPER_RATE_BURST", 2)
+
+# Per-request retries: exponential backoff with jitter, bounded per run.
+RETRY_ATTEMPTS = _env_int("SCRAPER_RETRY_ATTEMPTS", 4)
+RETRY_BASE_DELAY = _env_float("SCRAPER_RETRY_BASE_DELAY", 2.0)
+RETRY_MAX_DELAY = _env_float("SCRAPER_RETRY_MAX_DELAY", 120.0)
+
+# Total number of seconds one run may spend waiting between retries.
+RETRY_BUDGET = _env_float("SCRAPER_RETRY_BUDGET", 900.0)
+
+# Opt-in archive of raw category responses for offline re-parsing.
+ARCHIVE_ENABLED = os.getenv("SCRAPER_ARCHIVE", "0") == "1"
+ARCHIVE_PATH = os.getenv("SCRAPER_ARCHIVE_PATH", "data/archive")
+
+# HTML parsing backend for the product grids: "lxml" (fast, C-backed) or
+# "bs4" (BeautifulSoup's pure-Python html.parser, used as fallback).
+HTML_PARSER_BACKEND = os.getenv("SCRAPER_HTML_PARSER", "lxml")
+
+# How grid pages are parsed: "inline" (once the whole response is downloaded),
+# "stream" (tile by tile while the response downloads, never building the
+# full DOM; Continente and Auchan only, needs lxml) or "pool" (in a pool of
+# worker processes fed through a bounded queue).
+PARSE_MODE = os.getenv("SCRAPER_PARSE_MODE", "stream")
+
+# Worker processes of the "pool" parse mode, and how many downloaded pages
+# may wait for them before the fetchers are held back.
+PARSE_WORKERS = _env_int("SCRAPER_PARSE_WORKERS", os.cpu_count() or 1)
+PARSE_QUEUE_SIZE = _env_int("SCRAPER_PARSE_QUEUE_SIZE", 2 * PARSE_WORKERS)
+
+# Where the scrapers save each category: "parquet" (partitioned, zstd
+# compressed store under PARQUET_PATH) or "csv" (one file per category under
+# data/raw, as before).
+OUTPUT_FORMAT = os.getenv("SCRAPER_OUTPUT_FORMAT", "parquet")
+PARQUET_PATH = os.getenv("SCRAPER_PARQUET_PATH", "data/parquet")
+
+# Change-only price history, updated from the Parquet store once per retailer
+# and day at the end of a run ("0" disables it).
+HISTORY_ENABLED = os.getenv("SCRAPER_HISTORY", "1") != "0"
+HISTORY_PATH = os.getenv("SCRAPER_HISTORY_PATH", "data/history")
+
+# Product dimension holding the static attributes once per product; with it
+# the Parquet files only keep the daily facts ("0" disables it).
+DIMENSION_ENABLED = os.getenv("SCRAPER_DIMENSION", "1") != "0"
+DIMENSION_PATH = os.getenv("SCRAPER_DIMENSION_PATH", "data/dimension")
+
+# DuckDB warehouse loaded with each day's data once the scrapers finish
+# ("0" disables it). Loading reads the Parquet store, so it needs the
+# "parquet" output format.
+WAREHOUSE_ENABLED = os.getenv("SCRAPER_WAREHOUSE", "1") != "0"
+WAREHOUSE_PATH = os.getenv("SCRAPER_WAREHOUSE_PATH", "data/warehouse.duckdb")
+
+# Package sizes already read from product names, by name hash, so each crawl
+# only parses the names it has not seen before.
+QUANTITY_CACHE_PATH = os.getenv("SCRAPER_QUANTITY_CACHE_PATH",
+                                "data/cache/quantities.parquet")
+
+# Day-over-day change events (new, removed, price up/down) written once the
+# scrapers finish ("0" disables it). Like the warehouse, it reads the Parquet
+# store.
+CHANGES_ENABLED = os.getenv("SCRAPER_CHANGES", "1") != "0"
+CHANGES_PATH = os.getenv("SCRAPER_CHANGES_PATH", "data/changes")
+
+# Rolling 7/30/90-day price aggregates per product, updated from each day
+# once the scrapers finish ("0" disables it). Reads the Parquet store too.
+AGGREGATES_ENABLED = os.getenv("SCRAPER_AGGREGATES", "1") != "0"
+AGGREGATES_PATH = os.getenv("SCRAPER_AGGREGATES_PATH", "data/aggregates")
+
+# Memory-mapped day x product price matrix, one row appended per crawl day
+# once the scrapers finish ("0" disables it). Reads the Parquet store too.
+MATRIX_ENABLED = os.getenv("SCRAPER_MATRIX", "1") != "0"
+MATRIX_PATH = os.getenv("SCRAPER_MATRIX_PATH", "data/matrix")
+
+# Index from each product to the files and row groups holding its rows,
+# updated once the scrapers finish, so one product's history is read in
+# milliseconds ("0" disables it). Indexes the Parquet store.
+INDEX_ENABLED = os.getenv("SCRAPER_INDEX", "1") != "0"
+INDEX_PATH = os.getenv("SCRAPER_INDEX_PATH", "data/index")
+
+# Cross-retailer product matches, updated from the product dimension once
+# the scrapers finish ("0" disables it); pairs scoring under
+# MATCH_MIN_SCORE (0 to 1) are not kept.
+MATCHING_ENABLED = os.getenv("SCRAPER_MATCHING", "1") != "0"
+MATCHES_PATH = os.getenv("SCRAPER_MATCHES_PATH", "data/matches")
+MATCH_MIN_SCORE = _env_float("SCRAPER_MATCH_MIN_SCORE", 0.5)
@@ -1,29 +1,29 @@
-import requests
-from bs4 import BeautifulSoup
+from html_parsing import parse_html
 import json
 import pandas as pd
 import re
-import time
-import random
 from datetime import datetime
-from utils import retry_on_failure
+from http_client import gather_in_order, get_client, run
+from checkpoint import CheckpointJournal, IncompleteCategoryError
+from archive import archive_response, get_archive
+from tile_stream import TileStreamParser, streaming_enabled
+from parse_pool import closing_parse_stage, parse
+from records import RecordBuilder
+from schema import normalize_continente
+from storage.sink import open_category_sink
+import config
 import os
 from logger import setup_logger
 
 
-def parse_total_products(html_content):
-    # Parse the HTML content
-    soup = BeautifulSoup(html_content, 'html.parser')
+COUNTER_CLASS = "search-results-products-counter d-flex justify-content-center"
 
-    # Find the div with the specific class
-    counter_div = soup.find(
-        "div",
-        class_="search-results-products-counter d-flex justify-content-center")
 
-    # Check if the div is found and contains text
-    if counter_div and counter_div.text:
+def total_products_from_text(counter_text):
+    # Check if the counter contains text
+    if counter_text:
         # Extract numbers from the text using regex
-        numbers = re.findall(r'\d+', counter_div.text)
+        numbers = re.findall(r'\d+', counter_text)
 
         # Convert numbers to integers and get the max value (total number of products)
         if numbers:
@@ -34,98 +34,130 @@ def parse_total_products(html_content):
     return None
 
 
-def parse_product_data(html_content, cgid):
-    # Parse the HTML content
-    soup = BeautifulSoup(html_content, 'html.parser')
+def total_products_from_tree(soup):
+    # Find the div with the specific class
+    counter_div = soup.find("div", class_=COUNTER_CLASS)
+    return total_products_from_text(counter_div.text if counter_div else None)
+
 
-    # Find all product tiles
-    product_tiles = soup.find_all("div", class_="product-tile")
+def product_row_from_tile(tile):
+    # Defaults for tiles without a (valid) data-product-tile-impression JSON
+    name = ""
+    product_id = ""
+    price_per_kg = 0.0
+    brand = ""
+    category = ""
+
+    # Extract data from data-product-tile-impression JSON
+    product_info_json = tile.get("data-product-tile-impression")
+    if product_info_json:
+        try:
+            # Replace unescaped single quotes with escaped single quotes
+            product_info_json = product_info_json.replace("'", "\\'")
+            product_info = json.loads(product_info_json)
+
+            # Get product details from the JSON object
+            name = product_info.get("name", "")
+            product_id = product_info.get("id", "")
+            price_per_kg = product_info.get("price", 0.0)
+            brand = product_info.get("brand", "")
+            category = product_info.get("category", "")
+
+        except json.JSONDecodeError:
+            logger.warning(f"Error decoding JSON: {product_info_json}")
+
+    # Get product image URL
+    image_tag = tile.find("img", class_="ct-tile-image")
+    image_url = image_tag["data-src"] if image_tag else ""
+
+    # Get price per unit (if available)
+    price_per_unit_tag = tile.find("div",
+                                   class_="pwc-tile--price-secondary")
+    price_per_unit = price_per_unit_tag.get_text(
+        strip=True) if price_per_unit_tag else None
+
+    # Get minimum quantity information
+    min_quantity_tag = tile.find("p", class_="pwc-tile--quantity")
+    min_quantity = min_quantity_tag.get_text(
+        strip=True) if min_quantity_tag else None
+
+    # Get product link
+    product_link_tag = tile.find("a", href=True)
+    product_link = product_link_tag["href"] if product_link_tag else ""
+
+    return {
+        "Product Name": name,
+        "Product ID": product_id,
+        "Price": price_per_kg,
+        "Price per unit": price_per_unit,
+        "Brand": brand,
+        "Category": category,
+        "Image URL": image_url,
+        "Minimum Quantity": min_quantity,
+        "Product Link": product_link
+    }
 
-    # Initialize lists to store product data
-    product_data = []
-
-    # Loop through each product tile and extract data
-    for tile in product_tiles:
-        # Extract data from data-product-tile-impression JSON
-        product_info_json = tile.get("data-product-tile-impression")
-        if product_info_json:
-            try:
-                # Replace unescaped single quotes with escaped single quotes
-                product_info_json = product_info_json.replace("'", "\\'")
-                product_info = json.loads(product_info_json)
-
-                # Get product details from the JSON object
-                name = product_info.get("name", "")
-                product_id = product_info.get("id", "")
-                price_per_kg = product_info.get("price", 0.0)
-                brand = product_info.get("brand", "")
-                category = product_info.get("category", "")
-
-            except json.JSONDecodeError:
-                print(f"Error decoding JSON: {product_info_json}")
-                name = ""
-                product_id = ""
-                price_per_kg = 0.0
-                brand = ""
-                category = ""
-
-        # Get product image URL
-        image_tag = tile.find("img", class_="ct-tile-image")
-        image_url = image_tag["data-src"] if image_tag else ""
-
-        # Get price per unit (if available)
-        price_per_unit_tag = tile.find("div",
-                                       class_="pwc-tile--price-secondary")
-        price_per_unit = price_per_unit_tag.get_text(
-            strip=True) if price_per_unit_tag else None
-
-        # Get minimum quantity information
-        min_quantity_tag = tile.find("p", class_="pwc-tile--quantity")
-        min_quantity = min_quantity_tag.get_text(
-            strip=True) if min_quantity_tag else None
-
-        # Get product link
-        product_link_tag = tile.find("a", href=True)
-        product_link = product_link_tag["href"] if product_link_tag else ""
-
-        # Append extracted data to list
-        product_data.append({
-            "Product Name": name,
-            "Product ID": product_id,
-            "Price": price_per_kg,
-            "Price per unit": price_per_unit,
-            "Brand": brand,
-            "Category": category,
-            "Image URL": image_url,
-            "Minimum Quantity": min_quantity,
-            "Product Link": product_link
-        })
 
+def products_frame(product_data, cgid):
     # Create a DataFrame from the list of dictionaries
     df = pd.DataFrame(product_data)
     df["cgid"] = cgid
     return df
 
 
-# Function to fetch a page of products with caching and retry behavior
+def product_data_from_tree(soup, cgid):
+    # Find all product tiles and extract one row per tile
+    product_tiles = soup.find_all("div", class_="product-tile")
+    return products_frame(
+        [product_row_from_tile(tile) for tile in product_tiles], cgid)
+
+
+def parse_total_products(html_content, backend=None):
+    return total_products_from_tree(parse_html(html_content, backend))
+
+
+def parse_product_data(html_content, cgid, backend=None):
+    return product_data_from_tree(parse_html(html_content, backend), cgid)
+
+
+def parse_page(html_content, cgid, backend=None):
+    """
+    Tokenizes a grid response once and reads both the total product count and
+    the product tiles from that single tree.
+
+    Returns:
+        tuple: (int, pd.DataFrame) with the total number of products in the
+        category (None if the counter is missing) and the page products.
+    """
+    soup = parse_html(html_content, backend)
+    return total_products_from_tree(soup), product_data_from_tree(soup, cgid)
+
+
+CONTINENTE_HOST = "www.continente.pt"
+GRID_URL = ("https://www.continente.pt/on/demandware.store/"
+            "Sites-continente-Site/default/Search-UpdateGrid")
+HEADERS = {
+    "Accept":
+    "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding":
+    "gzip, deflate",
+    "Accept-Language":
+    "pt-PT,pt;q=0.8,en;q=0.5,en-US;q=0.3",
+    "User-Agent":
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) "
+    "Gecko/20100101 Firefox/133.0"
+}
+
+
+def get_continente_client():
+    """Returns the keep-alive client shared by all Continente requests."""
+    return get_client(CONTINENTE_HOST, headers=HEADERS)
+
+
+# Function to fetch a page of products; retries happen per request in the
+# host client
 # @lru_cache(maxsize=None)
-@retry_on_failure(retries=3, delay=120)
-def fetch_page(start, sz, cgid, pmin, srule):
-    url = "https://www.continente.pt/on/demandware.store/Sites-continente-Site/default/Search-UpdateGrid"
-    headers = {
-        "Accept":
-        "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Encoding":
-        "gzip, deflate, br, zstd",
-        "Accept-Language":
-        "pt-PT,pt;q=0.8,en;q=0.5,en-US;q=0.3",
-        "Connection":
-        "keep-alive",
-        "Host":
-        "www.continente.pt",
-        "User-Agent":
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:133.0) Gecko/20100101 Firefox/133.0"
-    }
+async def fetch_page(start, sz, cgid, pmin, srule, date=None):
     params = {
         "cgid": cgid,
         "pmin": pmin,
@@ -133,85 +165,266 @@ def fetch_page(start, sz, cgid, pmin, srule):
         "start": start,
         "sz": sz,
     }
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()  # Raise an error if the request failed
+    html_content = await get_continente_client().get_text(GRID_URL,
+                                                          params=params)
+    await archive_response("continente", cgid, start, html_content, date)
+    return html_content
 
-    # check this
-    soup = BeautifulSoup(response.text, 'html.parser')
 
-    # Find all product tiles
-    product_tiles = soup.find_all("div", class_="product-tile")
+async def stream_page(start, sz, cgid, pmin, srule, date=None):
+    """
+    Fetches a page of products and extracts the tiles while the response
+    downloads, without building the full DOM.
 
-    # Initialize lists to store product data
-    product_data = []
+    Returns:
+        tuple: (int, pd.DataFrame), like `parse_page`.
+    """
+    params = {
+        "cgid": cgid,
+        "pmin": pmin,
+        "start": start,
+        "sz": sz,
+    }
+    keep_body = get_archive() is not None
 
-    with open('data.html', 'w') as f:
-        f.write(response.text)
+    def make_parser():
+        return TileStreamParser("product-tile",
+                                product_row_from_tile,
+                                capture={"counter": ("div", COUNTER_CLASS)},
+                                keep_body=keep_body)
 
-    return response.text
+    stream = await get_continente_client().stream(GRID_URL, make_parser,
+                                                  params=params)
+    if keep_body:
+        await archive_response("continente", cgid, start, stream.body, date)
+    total_products = total_products_from_text(stream.captured.get("counter"))
+    return total_products, products_frame(stream.rows, cgid)
 
 
 # Main function to fetch all products for a given category
 logger = setup_logger("logs/continente_scraper.log")
 
-@retry_on_failure(retries=3, delay=360)
-def fetch_all_products_for_category(cgid, sz=216, pmin="0.01", srule="FRESH-Peixaria"):
-    logger.info(f"Starting to fetch products for category: {cgid}")
+
+async def fetch_products_page(cgid, start, sz, pmin, srule, journal=None,
+                              date=None):
+    """
+    Fetches and parses the page at offset `start`, or replays it from the
+    checkpoint journal if a previous run already completed it. `date` is the
+    crawl date the fetched response is archived under.
+
+    Returns:
+        tuple: (pd.DataFrame, int) with the page products and, for the first
+        page, the total number of products in the category (None otherwise).
+    """
+    if journal is not None:
+        checkpoint = journal.get(cgid, start)
+        if checkpoint is not None:
+            logger.debug(f"Replaying page for category {cgid}, "
+                         f"start: {start} from checkpoint")
+            page_products, meta = checkpoint
+            return page_products, meta.get("total_products")
+
+    if streaming_enabled():
+        total_products, page_products = await stream_page(
+            start, sz, cgid, pmin, srule, date)
+        logger.debug(f"Streamed page for category {cgid}, start: {start}")
+    else:
+        html_content = await fetch_page(start, sz, cgid, pmin, srule, date)
+        logger.debug(f"Fetched page for category {cgid}, start: {start}")
+
+        # One parse gives both the tiles and, on the first page, the total
+        total_products, page_products = await parse(parse_page, html_content,
+                                                    cgid)
+    if start != 0:
+        total_products = None
+    elif total_products is None:
+        return pd.DataFrame(), None
+
+    if journal is not None:
+        journal.record(cgid, start, page_products,
+                       {"total_products": total_products})
+    return page_products, total_products
+
+
+async def fetch_remaining_pages(cgid, sz, pmin, srule, total_products,
+                                journal=None, sink=None, date=None):
+    """
+    Fetches every page after the first one concurrently, under the fan-out
+    worker budget.
+
+    Returns:
+        tuple: (list, int) with the parsed pages in offset order (none with a
+        `sink`, which gets each page as soon as it is parsed) and the number
+        of pages that failed.
+    """
+    offsets = list(range(sz, total_products, sz))
+    logger.info(f"Fetching {len(offsets)} remaining pages for category "
+                f"{cgid} concurrently")
+
+    async def fetch_offset(start):
+        page_products, _ = await fetch_products_page(
+            cgid, start, sz, pmin, srule, journal, date)
+        if sink is None:
+            return page_products
+        # Pages reach the sink in completion order; only this page stays in
+        # memory
+        sink.write_page(page_products)
+        return None
+
+    pages = await gather_in_order(fetch_offset, offsets)
+
     products = []
+    failed = 0
+    for start, page_products in zip(offsets, pages):
+        if isinstance(page_products, Exception):
+            logger.error(f"Error fetching products for category {cgid}, "
+                         f"start {start}: {str(page_products)}")
+            failed += 1
+            continue
+        if page_products is not None:
+            products.append(page_products)
+        logger.info(f"Fetched {min(start + sz, total_products)} of "
+                    f"{total_products} products for category {cgid}")
+    return products, failed
+
+
+async def fetch_all_products_for_category(cgid, sz=216, pmin="0.01",
+                                          srule="FRESH-Peixaria",
+                                          fanout=config.FANOUT_ENABLED,
+                                          journal=None, sink=None,
+                                          date=None):
+    """
+    Fetches every page of a category. Without a `sink` the pages are collected
+    and returned as one normalized DataFrame; with one, each page is handed to
+    `sink.write_page` as it arrives and None is returned. Responses are
+    archived under the crawl `date` (YYYYMMDD), today by default.
+
+    Raises:
+        IncompleteCategoryError: If some page could not be fetched, once the
+            other pages have been fetched and journaled.
+    """
+    logger.info(f"Starting to fetch products for category: {cgid}")
+    # Pages are accumulated column-wise and turned into one DataFrame at the
+    # end
+    products = RecordBuilder()
     current_start = 0
     total_products = None
+    failed = 0
 
     while total_products is None or current_start < total_products:
         try:
-            # Fetch the current page with caching and retry
-            html_content = fetch_page(current_start, sz, cgid, pmin, srule)
-            logger.debug(f"Fetched page for category {cgid}, start: {current_start}")
+            # Fetch the current page, or replay it from the checkpoint journal
+            page_products, page_total = await fetch_products_page(
+                cgid, current_start, sz, pmin, srule, journal, date)
 
-            # Parse total products only on the first page load
             if total_products is None:
-                total_products = parse_total_products(html_content)
+                total_products = page_total
                 if total_products is None:
-                    logger.warning(f"Failed to retrieve total products count for category {cgid}.")
-                    return pd.DataFrame(products)
+                    raise IncompleteCategoryError(
+                        f"Failed to retrieve total products count for "
+                        f"category {cgid}")
                 logger.info(f"Total products for category {cgid}: {total_products}")
 
-            # Parse products from current page
-            page_products = parse_product_data(html_content, cgid)
-            products.append(page_products)
-
-            logger.info(f"Fetched {min(current_start + sz, total_products)} of {total_products} products for category {cgid}")
-
-            # Move to the next batch
+            _keep_page(page_products, products, sink)
+            logger.info(f"Fetched {min(current_start + sz, total_products)} "
+                        f"of {total_products} products for category {cgid}")
+
+            # The first page told us how many pages there are; fetch the rest
+            # at once
+            if fanout and current_start == 0:
+                pages, failed = await fetch_remaining_pages(
+                    cgid, sz, pmin, srule, total_products, journal, sink,
+                    date)
+                for page in pages:
+                    products.extend_frame(page)
+                break
+
+            # Move to the next batch; pacing is left to the host's rate limiter
             current_start += sz
-            delay = random.randint(5, 10)
-            logger.debug(f"Waiting for {delay} seconds before next request")
-            time.sleep(delay)  # Random delay to avoid server overload
 
+        except IncompleteCategoryError:
+            raise
         except Exception as e:
-            logger.error(f"Error fetching products for category {cgid}: {str(e)}", exc_info=True)
-            break
+            logger.error(f"Error fetching products for category {cgid}, "
+                         f"start {current_start}: {str(e)}", exc_info=True)
+            failed += 1
+            if total_products is None:
+                break
+            # Skip the failed page rather than losing the pages already fetched
+            current_start += sz
+
+    return _finish_category(cgid, products, sink, failed)
+
 
-    df = pd.concat(products)
-    df["tracking_date"] = datetime.now().strftime("%Y-%m-%d")
-    df["source"] = "Continente"
+def _keep_page(page_products, products, sink):
+    # Pages go to the sink as they arrive, or are collected for the end
+    if sink is not None:
+        sink.write_page(page_products)
+    else:
+        products.extend_frame(page_products)
 
-    logger.info(f"Completed fetching products for category {cgid}. Total products: {len(df)}")
+
+def _finish_category(cgid, products, sink, failed):
+    # A category with missing pages is not saved, so the next run retries them
+    if failed:
+        raise IncompleteCategoryError(
+            f"{failed} pages of category {cgid} could not be fetched")
+
+    if sink is not None:
+        logger.info(f"Completed fetching products for category {cgid}. "
+                    f"Total products: {sink.rows}")
+        return None
+
+    if not products:
+        return pd.DataFrame()
+
+    # Convert the category to the canonical product schema in one pass
+    df = normalize_continente(products.to_frame())
+
+    logger.info(f"Completed fetching products for category {cgid}. "
+                f"Total products: {len(df)}")
     return df
 
-def process_and_save_categories(base_path="data/raw/continente"):
+
+async def save_category_pages(category, base_path, date, journal):
+    """
+    Crawls one category and writes it, page by page, to its output file or
+    partition, marking it done in the journal once saved.
+
+    Raises:
+        IncompleteCategoryError: If some page could not be fetched.
+    """
+    file_path = os.path.join(base_path, f"{category}.csv")
+    # Pages are normalized and written as they are parsed, not held until
+    # the end
+    with open_category_sink(
+            "continente", date, category,
+            lambda page: normalize_continente(page, tracking_date=date),
+            file_path) as sink:
+        await fetch_all_products_for_category(category, journal=journal,
+                                              sink=sink, date=date)
+
+    if sink.rows:
+        logger.info(f"Saved data for category '{category}' to {sink.path}")
+        journal.mark_category_done(category)
+    else:
+        logger.warning(f"No data found for category {category}.")
+
+
+async def process_and_save_categories_async(base_path="data/raw/continente"):
     logger.info("Starting process_and_save_categories")
 
     # Base URL to make requests (could be useful for fetching pages etc.)
     initial_url = "https://www.continente.pt/"
     try:
-        requests.get(initial_url)
+        await get_continente_client().get_text(initial_url)
         logger.info("Successfully hit the initial URL")
     except Exception as e:
         logger.error(f"Failed to hit initial URL: {str(e)}", exc_info=True)
 
-    # Create a timestamp for unique filenames
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    base_path = base_path + "/" + datetime.now().strftime("%Y%m%d")
+    # Crawl date, used for the output directory or partition
+    date = datetime.now().strftime("%Y%m%d")
+    base_path = base_path + "/" + date
 
     # Ensure the base path exists; if not, create it
     if not os.path.exists(base_path):
@@ -224,20 +437,36 @@ def process_and_save_categories(base_path="data/raw/continente"):
         "limpeza", "higiene-beleza", "bebe"
     ]
 
+    # Completed pages and categories survive a crash in the checkpoint journal
+    journal = CheckpointJournal("continente", date=date)
+
     # Iterate through categories and fetch/save product data
     for category in CATEGORIES:
+        if journal.is_category_done(category):
+            logger.info(f"Skipping category {category}, already saved by a "
+                        f"previous run")
+            continue
+
         logger.info(f"Processing category: {category}")
         try:
-            df_category_products = fetch_all_products_for_category(category)
-
-            if not df_category_products.empty:
-                filename = f"{category}.csv"
-                file_path = os.path.join(base_path, filename)  # Path to save the file
-                df_category_products.to_csv(file_path, index=False)
-                logger.info(f"Saved data for category '{category}' to {file_path}")
-            else:
-                logger.warning(f"No data found for category {category}.")
+            await save_category_pages(category, base_path, date, journal)
+        except IncompleteCategoryError as e:
+            logger.warning(f"Category {category} left incomplete for the "
+                           f"next run: {str(e)}")
         except Exception as e:
-            logger.error(f"Error processing category {category}: {str(e)}", exc_info=True)
+            logger.error(f"Error processing category {category}: {str(e)}",
+                         exc_info=True)
+
+    # Keep the journal while some category is still missing so a rerun can
+    # finish it
+    if all(journal.is_category_done(category) for category in CATEGORIES):
+        journal.discard()
 
-    logger.info("Completed process_and_save_categories")
\ No newline at end of file
+    logger.info("Completed process_and_save_categories")
+
+
+def process_and_save_categories(base_path="data/raw/continente"):
+    """
+    Synchronous entry point that crawls every category in its own event loop.
+    """
+    run(closing_parse_stage(process_and_save_categories_async(base_path)))
@@ -0,0 +1,133 @@
+"""
+Pluggable HTML parsing backends for the product grid parsers.
+
+The parsers only rely on a small subset of the BeautifulSoup API: `find`,
+`find_all`, `get`, `[attr]`, `get_text` and `.text`. `parse_html` returns a
+tree exposing that subset, built either by lxml (C-backed, the default) or by
+BeautifulSoup's pure-Python `html.parser` (the fallback). Both backends yield
+the same rows.
+"""
+from bs4 import BeautifulSoup
+
+import config
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is an optional speed-up
+    etree = None
+
+# Text inside these elements is not document text, mirroring BeautifulSoup
+_NON_TEXT_TAGS = {"script", "style", "template"}
+
+# Compiled XPath expressions, keyed by the find/find_all arguments
+_xpath_cache = {}
+
+
+def _class_condition(class_):
+    # BeautifulSoup matches a single class against any token of the class
+    # attribute, and a value with spaces against the whole attribute
+    if " " in class_:
+        return f"normalize-space(@class)='{class_}'"
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')"
+
+
+def _compile(tag, class_, attrs):
+    key = (tag, class_, tuple(sorted(attrs.items())))
+    xpath = _xpath_cache.get(key)
+    if xpath is None:
+        conditions = []
+        if class_ is not None:
+            conditions.append(_class_condition(class_))
+        for name, value in sorted(attrs.items()):
+            if value is True:
+                conditions.append(f"@{name}")
+            else:
+                conditions.append(f"@{name}='{value}'")
+        predicate = "".join(f"[{condition}]" for condition in conditions)
+        xpath = etree.XPath(f".//{tag or '*'}{predicate}")
+        _xpath_cache[key] = xpath
+    return xpath
+
+
+class LxmlNode:
+    """
+    Wraps an lxml element behind the BeautifulSoup subset used by the parsers.
+    """
+
+    __slots__ = ("_element", )
+
+    def __init__(self, element):
+        self._element = element
+
+    def find_all(self, tag=None, class_=None, **attrs):
+        return [
+            LxmlNode(element)
+            for element in _compile(tag, class_, attrs)(self._element)
+        ]
+
+    def find(self, tag=None, class_=None, **attrs):
+        matches = _compile(tag, class_, attrs)(self._element)
+        return LxmlNode(matches[0]) if matches else None
+
+    def get(self, attr, default=None):
+        return self._element.get(attr, default)
+
+    def __getitem__(self, attr):
+        return self._element.attrib[attr]
+
+    def _strings(self, element):
+        if element.tag in _NON_TEXT_TAGS:
+            return
+        if element.text:
+            yield element.text
+        for child in element:
+            # Comments and processing instructions have a non-string tag
+            if isinstance(child.tag, str):
+                yield from self._strings(child)
+            if child.tail:
+                yield child.tail
+
+    def get_text(self, strip=False):
+        strings = self._strings(self._element)
+        if strip:
+            return "".join(s.strip() for s in strings if s.strip())
+        return "".join(strings)
+
+    @property
+    def text(self):
+        return self.get_text()
+
+
+def get_backend(backend=None):
+    """
+    Resolves the backend name, falling back to BeautifulSoup when lxml is not
+    installed.
+    """
+    backend = backend or config.HTML_PARSER_BACKEND
+    if backend == "lxml" and etree is None:
+        return "bs4"
+    return backend
+
+
+def parse_html(html_content, backend=None):
+    """
+    Parses an HTML document with the configured backend.
+
+    Args:
+        html_content (str): The HTML content to parse.
+        backend (str): "lxml" or "bs4"; defaults to
+            `config.HTML_PARSER_BACKEND`.
+
+    Returns:
+        The document root, supporting `find`, `find_all`, `get`, `[attr]`,
+        `get_text` and `.text`.
+    """
+    backend = get_backend(backend)
+    if backend == "lxml":
+        parser = etree.HTMLParser(encoding="utf-8")
+        root = etree.fromstring(html_content.encode("utf-8"), parser)
+        # lxml returns None for a document without any element
+        return LxmlNode(root if root is not None else etree.Element("html"))
+    if backend == "bs4":
+        return BeautifulSoup(html_content, "html.parser")
+    raise ValueError(f"Unknown HTML parser backend: {backend}")
@@ -0,0 +1,217 @@
+import asyncio
+import time
+
+import aiohttp
+
+import config
+from rate_limiter import AdaptiveRateLimiter
+from retry import RetryPolicy
+
+# One pooled client per retailer host, created lazily inside the running loop
+_clients = {}
+
+# Size of the chunks handed to streaming consumers, in bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class HostClient:
+    """
+    Keep-alive HTTP client bound to a single retailer host.
+
+    All requests made through the same client share one connection pool, so
+    consecutive pages reuse the TCP+TLS connection instead of opening a new
+    one per request. A semaphore caps the number of requests in flight and an
+    adaptive token bucket paces them at the rate the host currently tolerates.
+    Failed requests are retried individually according to `retry_policy`.
+
+    Args:
+        host (str): Host name the client talks to (e.g. "www.continente.pt").
+        headers (dict): Default headers sent with every request.
+        max_concurrency (int): Maximum number of concurrent requests.
+        timeout (float): Total timeout for a single request, in seconds.
+        connect_timeout (float): Timeout to establish a connection, in seconds.
+        rate_limiter (AdaptiveRateLimiter): Limiter shared by every request
+            to the host.
+        retry_policy (RetryPolicy): Retry policy applied to every request.
+    """
+
+    def __init__(self,
+                 host,
+                 headers=None,
+                 max_concurrency=None,
+                 timeout=None,
+                 connect_timeout=None,
+                 rate_limiter=None,
+                 retry_policy=None):
+        self.host = host
+        self.headers = headers or {}
+        self.max_concurrency = max_concurrency or config.HOST_CONCURRENCY
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout or config.HTTP_TIMEOUT,
+            connect=connect_timeout or config.HTTP_CONNECT_TIMEOUT)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.max_concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(headers=self.headers,
+                                                  timeout=self.timeout,
+                                                  connector=connector)
+        return self._session
+
+    async def get_text(self, url, params=None):
+        """
+        Performs a GET request, retrying it if needed, and returns the decoded
+        response body.
+
+        Args:
+            url (str): Absolute URL to fetch.
+            params (dict): Query string parameters.
+
+        Returns:
+            str: The response body.
+
+        Raises:
+            aiohttp.ClientResponseError: If the server keeps answering with
+                an error status.
+            asyncio.TimeoutError: If the request keeps exceeding the
+                configured timeout.
+        """
+        return await self.retry_policy.call(self._get_text_once, url, params)
+
+    async def _get_text_once(self, url, params):
+        session = self._get_session()
+        async with self._semaphore:
+            await self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                async with session.get(url, params=params) as response:
+                    body = await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.rate_limiter.record(None, time.monotonic() - started)
+                raise
+            self.rate_limiter.record(response.status,
+                                     time.monotonic() - started)
+            response.raise_for_status()
+            return body
+
+    async def stream(self, url, make_consumer, params=None):
+        """
+        Performs a GET request and feeds the response body to a consumer while
+        it downloads, retrying the request if needed.
+
+        Args:
+            url (str): Absolute URL to fetch.
+            make_consumer (callable): Returns a fresh consumer for each
+                attempt; the consumer exposes `feed(chunk)` and `close()`.
+            params (dict): Query string parameters.
+
+        Returns:
+            The value returned by the consumer's `close()`.
+
+        Raises:
+            aiohttp.ClientResponseError: If the server keeps answering with
+                an error status.
+            asyncio.TimeoutError: If the request keeps exceeding the
+                configured timeout.
+        """
+        return await self.retry_policy.call(self._stream_once, url,
+                                            make_consumer, params)
+
+    async def _stream_once(self, url, make_consumer, params):
+        session = self._get_session()
+        async with self._semaphore:
+            await self.rate_limiter.acquire()
+            started = time.monotonic()
+            # The outcome is recorded once the headers are in, whatever then
+            # happens to the body (a consumer raising included), or when the
+            # transport fails
+            status, settled = None, False
+            try:
+                async with session.get(url, params=params) as response:
+                    status, settled = response.status, True
+                    response.raise_for_status()
+                    consumer = make_consumer()
+                    async for chunk in response.content.iter_chunked(
+                            STREAM_CHUNK_SIZE):
+                        consumer.feed(chunk)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                status, settled = None, True
+                raise
+            finally:
+                if settled:
+                    self.rate_limiter.record(status,
+                                             time.monotonic() - started)
+            return consumer.close()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def get_client(host, **kwargs):
+    """
+    Returns the pooled client for `host`, creating it on first use.
+
+    Keyword arguments are only used when the client is created, so the first
+    caller for a host decides its headers and concurrency limit.
+    """
+    client = _clients.get(host)
+    if client is None:
+        client = HostClient(host, **kwargs)
+        _clients[host] = client
+    return client
+
+
+async def gather_in_order(func, items, max_workers=None):
+    """
+    Runs `func(item)` for every item, with at most `max_workers` calls in
+    flight.
+
+    Args:
+        func (callable): Coroutine function called with a single item.
+        items (iterable): Items to process.
+        max_workers (int): Worker budget; defaults to `config.FANOUT_WORKERS`.
+
+    Returns:
+        list: One entry per item, in the order of `items`. A call that fails
+        yields its exception instead of a result, so one bad page never
+        cancels the others.
+    """
+    semaphore = asyncio.Semaphore(max_workers or config.FANOUT_WORKERS)
+
+    async def worker(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(worker(item) for item in items),
+                                return_exceptions=True)
+
+
+async def close_clients():
+    """Closes every pooled client and forgets them."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
+
+
+def run(coro):
+    """
+    Runs a crawl coroutine to completion from synchronous code.
+
+    The pooled clients are bound to the event loop that created them, so they
+    are always closed before the loop shuts down.
+    """
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_clients()
+
+    return asyncio.run(runner())
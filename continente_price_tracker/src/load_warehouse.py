@@ -0,0 +1,49 @@
+"""
+Loads days of the Parquet store into the DuckDB warehouse.
+
+Usage:
+    python continente_price_tracker/src/load_warehouse.py 20241125 20241126
+    python continente_price_tracker/src/load_warehouse.py --all \
+        --retailer auchan
+"""
+import argparse
+
+import config
+from logger import setup_logger
+from schema import RETAILERS
+from storage.output import get_store, load_warehouse
+
+logger = setup_logger("logs/load_warehouse.log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dates", nargs="*",
+                        help="Crawl dates to load, as YYYYMMDD")
+    parser.add_argument("--all", action="store_true",
+                        help="Load every day present in the Parquet store")
+    parser.add_argument("--retailer", action="append", choices=RETAILERS,
+                        help="Retailer to load (repeatable); defaults to all")
+    parser.add_argument("--warehouse-path", default=config.WAREHOUSE_PATH)
+    args = parser.parse_args()
+
+    # The command line asks for a load explicitly, whatever the scheduled
+    # default
+    config.WAREHOUSE_ENABLED = True
+    config.WAREHOUSE_PATH = args.warehouse_path
+
+    dates = list(args.dates)
+    if args.all:
+        dates += [date for _, date, _ in get_store().partitions()]
+    if not dates:
+        parser.error("give at least one date, or --all")
+
+    loaded = load_warehouse(dates, args.retailer)
+    for date, rows in loaded.items():
+        logger.info(f"Loaded {rows} rows of {date} into {args.warehouse_path}")
+    print(f"Loaded {sum(loaded.values())} rows from {len(loaded)} of "
+          f"{len(set(dates))} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,82 @@
-from continente.catalog import process_and_save_categories
-from pingo_doce.pingo_doce import parse_and_save_all_categories
-from auchan.auchan import save_data_for_all_cgids
-
-# continente
-process_and_save_categories()
-
-# pingo doce
-# Example usage
-categories = [
-    "pingo-doce-lacticinios", "pingo-doce-bebidas",
-    "pingo-doce-frescos-embalados", "pingo-doce-higiene-e-beleza",
-    "pingo-doce-maquinas-e-capsulas-de-cafe", "pingo-doce-mercearia",
-    "pingo-doce-refeicoes-prontas", "pingo-doce-cozinha-e-limpeza", "pingo-doce-congelados"
-]
-
-parse_and_save_all_categories(categories)
-
-cgid_list = [
-    "alimentacao-", "biologico-e-escolhas-alimentares",
-    "limpeza-da-casa-e-roupa", "bebidas-e-garrafeira", "marcas-auchan",
-    "saude-e-bem-estar/acne/"
-]
-prefn1 = "soldInStores"
-prefv1 = "000"
-sz = 212
-base_url = "https://www.auchan.pt/on/demandware.store/Sites-AuchanPT-Site/pt_PT/Search-UpdateGrid"
-
-save_data_for_all_cgids(cgid_list,
-                       prefn1,
-                       prefv1,
-                       sz,
-                       base_url,
-                       base_path="data/raw/auchan")
+import asyncio
+from continente.catalog import process_and_save_categories_async
+from pingo_doce.pingo_doce import parse_and_save_all_categories_async
+from auchan.auchan import save_data_for_all_cgids_async
+from datetime import datetime
+from http_client import close_clients
+from parse_pool import close_parse_stage
+from storage.output import (detect_changes, load_warehouse, update_aggregates,
+                            update_history, update_matches, update_matrix,
+                            update_product_index)
+
+
+async def crawl():
+    """
+    Crawls the retailers one after the other in a single event loop, so they
+    share the pooled clients and the parse workers, which are closed before
+    the loop shuts down.
+    """
+    try:
+        # continente
+        await process_and_save_categories_async()
+
+        # pingo doce
+        # Example usage
+        categories = [
+            "pingo-doce-lacticinios", "pingo-doce-bebidas",
+            "pingo-doce-frescos-embalados", "pingo-doce-higiene-e-beleza",
+            "pingo-doce-maquinas-e-capsulas-de-cafe", "pingo-doce-mercearia",
+            "pingo-doce-refeicoes-prontas", "pingo-doce-cozinha-e-limpeza",
+            "pingo-doce-congelados"
+        ]
+
+        await parse_and_save_all_categories_async(categories)
+
+        cgid_list = [
+            "alimentacao-", "biologico-e-escolhas-alimentares",
+            "limpeza-da-casa-e-roupa", "bebidas-e-garrafeira",
+            "marcas-auchan", "saude-e-bem-estar/acne/"
+        ]
+        prefn1 = "soldInStores"
+        prefv1 = "000"
+        sz = 212
+        base_url = ("https://www.auchan.pt/on/demandware.store/"
+                    "Sites-AuchanPT-Site/pt_PT/Search-UpdateGrid")
+
+        await save_data_for_all_cgids_async(cgid_list,
+                                            prefn1,
+                                            prefv1,
+                                            sz,
+                                            base_url,
+                                            base_path="data/raw/auchan")
+    finally:
+        await close_clients()
+        await close_parse_stage()
+
+
+def main():
+    start_date = datetime.now().strftime("%Y%m%d")
+
+    asyncio.run(crawl())
+
+    # Bulk-load the day's output into the warehouse in one transaction
+    days = [start_date, datetime.now().strftime("%Y%m%d")]
+    load_warehouse(days)
+
+    # Then the day's price history, change events, rolling aggregates, price
+    # matrix row and product index, each read from the Parquet store once per
+    # retailer and day
+    update_history(days)
+    detect_changes(days)
+    update_aggregates(days)
+    update_matrix(days)
+    update_product_index(days)
+
+    # Link the products first seen today to the other retailers
+    update_matches(datetime.now().strftime("%Y%m%d"))
+
+
+# The parse pool (SCRAPER_PARSE_MODE=pool) spawns workers that import this
+# module again; only the script itself may start a crawl
+if __name__ == "__main__":
+    main()
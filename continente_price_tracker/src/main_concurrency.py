@@ -1,23 +1,39 @@
-import concurrent.futures
-from continente.catalog import process_and_save_categories
-from pingo_doce.pingo_doce import parse_and_save_all_categories
-from auchan.auchan import save_data_for_all_cgids
+import asyncio
+from datetime import datetime
+from continente.catalog import process_and_save_categories_async
+from pingo_doce.pingo_doce import parse_and_save_all_categories_async
+from auchan.auchan import save_data_for_all_cgids_async
+from http_client import close_clients
+from logger import setup_logger
+from parse_pool import close_parse_stage
+from storage.output import (detect_changes, load_warehouse, update_aggregates,
+                            update_history, update_matches, update_matrix,
+                            update_product_index)
+
+logger = setup_logger("logs/main_concurrency.log")
+
+
+async def run_all():
+    # Each scraper dates its output when it starts; a run crossing midnight
+    # spans two days
+    start_date = datetime.now().strftime("%Y%m%d")
 
-def main():
     # Define the tasks you want to run in parallel
     tasks = [
-        ("Continente", process_and_save_categories, {"base_path": "data/raw/continente"}),
-        ("Pingo Doce", parse_and_save_all_categories, {"categories": [
+        ("Continente", process_and_save_categories_async,
+         {"base_path": "data/raw/continente"}),
+        ("Pingo Doce", parse_and_save_all_categories_async, {"categories": [
             "pingo-doce-lacticinios", "pingo-doce-bebidas",
             "pingo-doce-frescos-embalados", "pingo-doce-higiene-e-beleza",
             "pingo-doce-maquinas-e-capsulas-de-cafe", "pingo-doce-mercearia",
             "pingo-doce-refeicoes-prontas"
         ]}),
-        ("Auchan", save_data_for_all_cgids, {
+        ("Auchan", save_data_for_all_cgids_async, {
             "cgid_list": [
                 "alimentacao-", "biologico-e-escolhas-alimentares",
-                "limpeza-da-casa-e-roupa", "bebidas-e-garrafeira", "marcas-auchan", 
-                "produtos-frescos", "Páginasbe_Antimanchas", "Páginasbe_Antiidade",
+                "limpeza-da-casa-e-roupa", "bebidas-e-garrafeira",
+                "marcas-auchan", "produtos-frescos", "Páginasbe_Antimanchas",
+                "Páginasbe_Antiidade",
                 "Páginasbe_Acne", "produtos-solares", "multivitaminicos", "PaginaSBE_pelesecaatopica",
                 "maquilhagem"
             ],
@@ -29,17 +45,44 @@ def main():
         })
     ]
 
-    # Use ThreadPoolExecutor to run tasks in parallel
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_to_task = {executor.submit(task[1], **task[2]): task[0] for task in tasks}
+    # Run every retailer in the same event loop; each one talks to its own
+    # pooled host client, so a slow site never blocks the others
+    try:
+        results = await asyncio.gather(
+            *(task[1](**task[2]) for task in tasks), return_exceptions=True)
+    finally:
+        await close_clients()
+        await close_parse_stage()
+
+    for (task_name, _, _), result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logger.error(f"{task_name} generated an exception: {result}",
+                         exc_info=result)
+        else:
+            logger.info(f"{task_name} completed successfully.")
+
+    # Bulk-load the day's output into the warehouse in one transaction
+    days = [start_date, datetime.now().strftime("%Y%m%d")]
+    load_warehouse(days)
+
+    # Then the day's price history, change events, rolling aggregates, price
+    # matrix row and product index, each read from the Parquet store once per
+    # retailer and day
+    update_history(days)
+    detect_changes(days)
+    update_aggregates(days)
+    update_matrix(days)
+    update_product_index(days)
+
+    # Link the products first seen today to the other retailers
+    update_matches(datetime.now().strftime("%Y%m%d"))
+
+
+def main():
+    asyncio.run(run_all())
 
-        for future in concurrent.futures.as_completed(future_to_task):
-            task_name = future_to_task[future]
-            try:
-                result = future.result()
-                print(f"{task_name} completed successfully.")
-            except Exception as e:
-                print(f"{task_name} generated an exception: {e}")
 
+# Spawned parse workers import this module again; only the script itself may
+# start a crawl
 if __name__ == "__main__":
     main()
@@ -0,0 +1,62 @@
+"""
+Links the products of the dimension across retailers, or shows one's matches.
+
+Usage:
+    python continente_price_tracker/src/match_products.py
+    python continente_price_tracker/src/match_products.py --restart \
+        --min-score 0.6
+    python continente_price_tracker/src/match_products.py \
+        --product continente 7130167
+"""
+import argparse
+from datetime import datetime
+
+import config
+from logger import setup_logger
+from schema import RETAILERS
+from storage.output import get_matcher, update_matches
+
+logger = setup_logger("logs/match_products.log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--product", nargs=2,
+                        metavar=("RETAILER", "PRODUCT_ID"),
+                        help="Show the matches of one product instead of "
+                        "updating")
+    parser.add_argument("--restart", action="store_true",
+                        help="Forget the previous matches and match every "
+                        "product again")
+    parser.add_argument("--min-score", type=float,
+                        default=config.MATCH_MIN_SCORE)
+    parser.add_argument("--matches-path", default=config.MATCHES_PATH)
+    args = parser.parse_args()
+
+    # The command line asks for matching explicitly, whatever the scheduled
+    # default
+    config.MATCHING_ENABLED = True
+    config.MATCH_MIN_SCORE = args.min_score
+    config.MATCHES_PATH = args.matches_path
+    matcher = get_matcher()
+    if matcher is None:
+        parser.error(
+            "matching needs the product dimension (SCRAPER_DIMENSION)")
+
+    if args.product:
+        retailer, product_id = args.product
+        if retailer not in RETAILERS:
+            parser.error(f"unknown retailer {retailer}; "
+                         f"choose from {', '.join(RETAILERS)}")
+        print(matcher.matches_of(retailer, product_id).to_string(index=False))
+        return
+
+    if args.restart:
+        matcher.discard()
+    matched = update_matches(datetime.now().strftime("%Y%m%d"))
+    print(f"Matched {matched} products; {len(matcher.load())} matches in "
+          f"{args.matches_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Links the same product across retailers, for price comparison.
+
+Comparing every product with every product of the other retailers grows with
+n·m and soon stops fitting in a daily run. Candidates are found through an
+inverted index instead:
+
+    1. Names (with the brand, when the site gives one) are lowercased, their
+       sizes and accents removed and split into tokens, each weighted by its
+       inverse document frequency.
+    2. Tokens shared by at most `max_block` products make up the index. A
+       product is looked up by its `keys` rarest tokens, so it is only
+       compared with products sharing one of them.
+    3. Candidates are scored in one pass: the weighted Jaccard similarity of
+       their tokens. Pairs whose package sizes (see `quantities`) are both
+       known and differ are dropped, since their prices are not comparable.
+
+`ProductMatcher` keeps the resulting match table on disk, with each
+product's best match at every other retailer, and only matches products that
+are new or whose attributes changed since the previous run.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from quantities import QUANTITY_PATTERN, extract_quantities
+from storage.files import move_into_place
+
+# Words that say nothing about which product it is
+STOPWORDS = {
+    "a", "ao", "as", "c", "com", "da", "das", "de", "do", "dos", "e", "em",
+    "na", "no", "o", "os", "ou", "p", "para", "por", "s", "sem",
+}
+
+MATCH_SCHEMA = {
+    "source": "str",
+    "product_id": "str",
+    "match_source": "str",
+    "match_product_id": "str",
+    "score": "float32",
+    "matched_on": "datetime64[s]",
+}
+
+SEEN_SCHEMA = {
+    "source": "str",
+    "product_id": "str",
+    "attributes_hash": "uint64",
+}
+
+KEY_COLUMNS = ["source", "product_id"]
+
+
+def _empty(schema):
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype) for column, dtype in schema.items()
+    })
+
+
+def normalize_names(names):
+    """
+    Lowercases names and strips their sizes, accents and punctuation, e.g.
+    "Iogurte Líquido Morango Pingo Doce 4×170 g" -> "iogurte liquido morango
+    pingo doce".
+    """
+    text = names.astype("object").fillna("").str.replace(
+        QUANTITY_PATTERN, " ", regex=True)
+    text = (text.str.lower().str.normalize("NFKD")
+            .str.encode("ascii", errors="ignore").str.decode("ascii"))
+    return text.str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+
+
+def product_tokens(products):
+    """
+    Splits the names of `products` into weighted tokens.
+
+    Returns:
+        pd.DataFrame: One row per distinct token of each product, with
+        "product" (its position in `products`), "token", "frequency" (how
+        many products hold it) and "weight" (its inverse document frequency).
+    """
+    text = products["product_name"].astype("object").fillna("")
+    if "brand" in products.columns:
+        text = products["brand"].astype("object").fillna("") + " " + text
+    words = normalize_names(text).str.split().explode()
+
+    tokens = pd.DataFrame({
+        "product": words.index.to_numpy(),
+        "token": words.to_numpy(),
+    }).dropna()
+    # Single letters are noise, single digits ("3 anos") are not
+    is_word = (tokens["token"].str.len() > 1) | tokens["token"].str.isdigit()
+    tokens = tokens[is_word & ~tokens["token"].isin(STOPWORDS)]
+    tokens = tokens.drop_duplicates(ignore_index=True)
+
+    tokens["frequency"] = tokens["token"].map(
+        tokens["token"].value_counts()).to_numpy()
+    tokens["weight"] = np.log(len(products) / tokens["frequency"])
+    return tokens
+
+
+def package_sizes(products):
+    """
+    Package sizes read from the names, or from the package when the name has
+    none.
+    """
+    sizes = extract_quantities(products["product_name"])
+    if "package" in products.columns:
+        from_package = extract_quantities(products["package"])
+        missing = sizes["quantity"].isna()
+        sizes = sizes.astype({"quantity_unit": "object"})
+        from_package = from_package.astype({"quantity_unit": "object"})
+        sizes.loc[missing, :] = from_package.loc[missing, :]
+    return sizes
+
+
+def find_matches(products, new, max_block=200, keys=4, min_score=0.5,
+                 size_tolerance=0.05):
+    """
+    Scores the candidate matches of the `new` products among all `products`.
+
+    Args:
+        products (pd.DataFrame): Products with "source" and "product_name",
+            optionally "brand" and "package", on a RangeIndex.
+        new (np.ndarray): Boolean mask of the products to find matches for.
+        max_block (int): Tokens held by more products are not indexed.
+        keys (int): Rarest tokens a product is looked up by.
+        min_score (float): Lowest similarity kept, between 0 and 1.
+        size_tolerance (float): Relative difference under which two package
+            sizes are the same.
+
+    Returns:
+        pd.DataFrame: "product", "match" (positions in `products`, at another
+        retailer) and "score", for every candidate above `min_score`.
+    """
+    tokens = product_tokens(products)
+    norms = tokens.groupby("product")["weight"].sum()
+
+    indexed = tokens.loc[tokens["frequency"] <= max_block,
+                         ["product", "token", "weight"]]
+    lookups = indexed[new[indexed["product"].to_numpy()]]
+    lookups = lookups.sort_values("weight", ascending=False,
+                                  kind="stable").groupby("product").head(keys)
+
+    candidates = lookups[["product", "token"]].merge(
+        indexed[["product", "token"]].rename(columns={"product": "match"}),
+        on="token")
+    source = products["source"].astype("str").to_numpy()
+    other_retailer = (source[candidates["product"].to_numpy()]
+                      != source[candidates["match"].to_numpy()])
+    candidates = candidates.loc[other_retailer, ["product", "match"]]
+    candidates = candidates.drop_duplicates(ignore_index=True)
+
+    # Every token the two names share, not only the indexed ones
+    shared = candidates.merge(tokens[["product", "token", "weight"]],
+                              on="product").merge(
+        tokens[["product", "token"]].rename(columns={"product": "match"}),
+        on=["match", "token"])
+    pairs = shared.groupby(["product", "match"],
+                           as_index=False)["weight"].sum()
+    union = (norms.reindex(pairs["product"]).to_numpy()
+             + norms.reindex(pairs["match"]).to_numpy()
+             - pairs["weight"].to_numpy())
+    pairs["score"] = pairs["weight"].to_numpy() / union
+    pairs = pairs[pairs["score"] >= min_score]
+
+    sizes = package_sizes(products)
+    quantity = sizes["quantity"].to_numpy()
+    unit = sizes["quantity_unit"].astype("object").to_numpy()
+    left, right = pairs["product"].to_numpy(), pairs["match"].to_numpy()
+    both_known = ~np.isnan(quantity[left]) & ~np.isnan(quantity[right])
+    same_size = (unit[left] == unit[right]) & (
+        np.abs(quantity[left] - quantity[right])
+        <= size_tolerance * np.fmax(quantity[left], quantity[right]))
+    pairs = pairs[~both_known | same_size]
+    return pairs[["product", "match", "score"]].reset_index(drop=True)
+
+
+class ProductMatcher:
+    """
+    Keeps the cross-retailer match table under `base_path`.
+
+    `matches.parquet` holds each product's best match at every other retailer
+    (both directions of a pair are stored) and `seen.parquet` the attribute
+    hashes of the products already matched.
+
+    Args:
+        base_path (str): Directory of the match table.
+        min_score (float): Lowest similarity kept, see `find_matches`.
+    """
+
+    def __init__(self, base_path="data/matches", min_score=0.5):
+        self.base_path = base_path
+        self.min_score = min_score
+
+    def _path(self, name):
+        return os.path.join(self.base_path, f"{name}.parquet")
+
+    def _read(self, name, schema):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return _empty(schema)
+        return pd.read_parquet(path).astype(schema)
+
+    def _save(self, name, df):
+        os.makedirs(self.base_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path,
+                                        prefix=f".{name}-")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False, compression="zstd")
+            move_into_place(tmp_path, self._path(name))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self):
+        """Returns the whole match table."""
+        return self._read("matches", MATCH_SCHEMA)
+
+    def discard(self):
+        """
+        Forgets every match, so the next update matches all products again.
+        """
+        for name in ("matches", "seen"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    def update(self, products, date):
+        """
+        Matches the products that are new or changed since the last update,
+        and the products they were matched with before.
+
+        Args:
+            products (pd.DataFrame): Every product of every retailer, in the
+                product dimension layout (with "attributes_hash").
+            date (str): Crawl date as YYYYMMDD, recorded with new matches.
+
+        Returns:
+            int: Number of products matched; the files are only rewritten
+            when it is not zero.
+        """
+        products = products.astype({
+            "source": "str",
+            "product_id": "str"
+        }).reset_index(drop=True)
+        seen = self._read("seen", SEEN_SCHEMA)
+        current = products[list(SEEN_SCHEMA)].astype(SEEN_SCHEMA)
+        new = current.merge(seen, how="left", indicator=True)["_merge"].eq(
+            "left_only").to_numpy()
+        if not new.any():
+            return 0
+
+        # The previous partners of the changed products lose their match,
+        # so they are searched again too
+        table = self.load()
+        changed = current[new].set_index(KEY_COLUMNS).index
+        partners = table[table.set_index(KEY_COLUMNS).index.isin(changed)]
+        partners = partners.set_index(["match_source",
+                                       "match_product_id"]).index
+        new = new | current.set_index(KEY_COLUMNS).index.isin(partners)
+
+        pairs = find_matches(products, new, min_score=self.min_score)
+        left = products.iloc[pairs["product"].to_numpy()]
+        right = products.iloc[pairs["match"].to_numpy()]
+        found = pd.DataFrame({
+            "source": left["source"].to_numpy(),
+            "product_id": left["product_id"].to_numpy(),
+            "match_source": right["source"].to_numpy(),
+            "match_product_id": right["product_id"].to_numpy(),
+            "score": pairs["score"].to_numpy(),
+        })
+        found = pd.concat([found, found.rename(columns={
+            "source": "match_source", "product_id": "match_product_id",
+            "match_source": "source", "match_product_id": "product_id",
+        })], ignore_index=True)
+        found["matched_on"] = pd.Timestamp(date)
+
+        # Products matched again lose their previous matches, in both
+        # directions; then every product keeps its best match at each
+        # retailer
+        rematched = current[new].set_index(KEY_COLUMNS).index
+        as_product = table.set_index(KEY_COLUMNS).index
+        as_match = table.set_index(["match_source", "match_product_id"]).index
+        table = table[~(as_product.isin(rematched)
+                        | as_match.isin(rematched))]
+        table = pd.concat([table, found.astype(MATCH_SCHEMA)],
+                          ignore_index=True)
+        table = table.sort_values("score", ascending=False,
+                                  kind="stable").drop_duplicates(
+            subset=["source", "product_id", "match_source"])
+        table = table.sort_values(KEY_COLUMNS + ["match_source"],
+                                  ignore_index=True)
+
+        self._save("matches", table.astype(MATCH_SCHEMA))
+        self._save("seen", current)
+        return int(new.sum())
+
+    def matches_of(self, retailer, product_id):
+        """Returns the matches of one product at the other retailers."""
+        table = self.load()
+        rows = table[(table["source"] == retailer)
+                     & (table["product_id"] == str(product_id))]
+        return rows.reset_index(drop=True)
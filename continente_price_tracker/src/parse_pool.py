@@ -0,0 +1,128 @@
+"""
+Process-pool parse stage, decoupled from the fetchers.
+
+Parsing a grid page is CPU-bound Python, so running it on the event loop both
+serializes it under the GIL and stalls every fetch behind it. With
+`config.PARSE_MODE = "pool"`, fetchers hand the raw HTML to `parse()`, which
+queues it for a `ProcessPoolExecutor` of parse workers and waits for the
+records. The queue is bounded: once it is full, fetchers wait in `parse()`
+before downloading their next page, so raw pages never pile up in memory
+faster than the workers can turn them into records.
+
+Workers are spawned, so they import the entry script again: a script using
+the pool must start its crawl under `if __name__ == "__main__":`.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+# Parse stage of the running event loop, created on first use
+_stage = None
+
+
+class ParseStage:
+    """
+    Bounded queue of parse jobs drained by a pool of worker processes.
+
+    Args:
+        workers (int): Number of parse processes.
+        queue_size (int): Maximum number of pages waiting for a worker.
+
+    Jobs are `(func, args)` pairs; `func` must be a module-level function so
+    it can be sent to the worker processes.
+    """
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or config.PARSE_WORKERS
+        self._queue = asyncio.Queue(
+            maxsize=queue_size or config.PARSE_QUEUE_SIZE)
+        self._executor = None
+        self._dispatchers = []
+
+    def _start(self):
+        # Spawned workers start from a clean interpreter, which is safe even
+        # though the parent runs an event loop and archive threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"))
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch())
+            for _ in range(self.workers)
+        ]
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, args, future = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(self._executor, func,
+                                                    *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def submit(self, func, *args):
+        """
+        Queues `func(*args)` for a worker process and returns its result.
+
+        Waits for room in the queue first, which is what slows the fetchers
+        down when the workers fall behind.
+        """
+        if self._executor is None:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future))
+        return await future
+
+    async def close(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown)
+            self._executor = None
+
+
+def get_parse_stage():
+    """Returns the parse stage of the running crawl, created on first use."""
+    global _stage
+    if _stage is None:
+        _stage = ParseStage()
+    return _stage
+
+
+async def close_parse_stage():
+    """Stops the parse workers, if they were started."""
+    global _stage
+    stage, _stage = _stage, None
+    if stage is not None:
+        await stage.close()
+
+
+async def closing_parse_stage(coro):
+    """
+    Awaits a crawl coroutine, then stops the parse workers it started while
+    their event loop is still running.
+    """
+    try:
+        return await coro
+    finally:
+        await close_parse_stage()
+
+
+async def parse(func, *args):
+    """
+    Runs the parser `func(*args)` as configured by `config.PARSE_MODE`: in the
+    worker pool for "pool", directly otherwise.
+    """
+    if config.PARSE_MODE == "pool":
+        return await get_parse_stage().submit(func, *args)
+    return func(*args)
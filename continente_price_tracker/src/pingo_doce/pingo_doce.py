@@ -1,7 +1,4 @@
 from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
 import sys
 import os
 from logger import setup_logger
@@ -12,27 +9,49 @@ src_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
 sys.path.append(src_path)
 
-from utils import retry_on_failure
-import time
-
-
-@retry_on_failure(retries=3, delay=60)
-def fetch_html_from_pingodoce(cp, categoria):
+from html_parsing import parse_html
+from http_client import gather_in_order, get_client, run
+from checkpoint import CheckpointJournal, IncompleteCategoryError
+from archive import archive_response
+from parse_pool import closing_parse_stage, parse
+from records import RecordBuilder
+from schema import normalize_pingo_doce
+from storage.sink import open_category_sink
+import config
+
+PINGO_DOCE_HOST = "www.pingodoce.pt"
+
+# Columns of the product DataFrame, in order
+PRODUCT_SCHEMA = {
+    "product_id": 'str',
+    "product_name": 'str',
+    "product_price": 'str',
+    "product_image": 'str',
+    "product_url": 'str',
+    "product_rating": 'str'
+}
+
+
+async def fetch_html_from_pingodoce(cp, categoria, date=None):
     """
     Fetches the HTML content for a specific category page from the Pingo Doce website.
 
     Parameters:
     - cp (int): The postal code used to filter the products.
     - categoria (str): The category of products to fetch (e.g., "pingo-doce-lacticinios").
+    - date (str): Crawl date (YYYYMMDD) the response is archived under;
+      defaults to today.
 
     Returns:
     - str: The HTML content of the page.
 
     Raises:
-    - requests.exceptions.HTTPError: If the request to the server fails (non-200 status code).
+    - aiohttp.ClientResponseError: If the request to the server fails
+      (non-200 status code).
 
     Example:
-    >>> html_content = fetch_html_from_pingodoce(cp=1000, categoria="pingo-doce-lacticinios")
+    >>> html_content = await fetch_html_from_pingodoce(
+    ...     cp=1000, categoria="pingo-doce-lacticinios")
     >>> print(html_content)  # Prints the HTML content of the category page.
     """
     url = "https://www.pingodoce.pt/produtos/marca-propria-pingo-doce/pingo-doce/"
@@ -46,20 +65,20 @@ def fetch_html_from_pingodoce(cp, categoria):
         "novidades": 0
     }
 
-    response = requests.get(url, params=payload)
-
-    if response.status_code == 200:
-        return response.text
-    else:
-        response.raise_for_status()
+    html_content = await get_client(PINGO_DOCE_HOST).get_text(
+        url, params=payload)
+    await archive_response("pingo_doce", categoria, cp, html_content, date)
+    return html_content
 
 
-def parse_last_page(html_content):
+def parse_last_page(html_content, backend=None):
     """
     Parses the HTML content to determine the last page number of the product listings.
 
     Parameters:
     - html_content (str): The HTML content of the page to parse.
+    - backend (str): HTML parser backend ("lxml" or "bs4"); defaults to the
+      configured one.
 
     Returns:
     - int: The last page number of the product listings (e.g., 5).
@@ -69,7 +88,7 @@ def parse_last_page(html_content):
     >>> last_page = parse_last_page(html_content)
     >>> print(last_page)  # Prints the last page number (e.g., 5).
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content, backend)
 
     # Find all elements with the class 'page js-change-page'
     pages = soup.find_all('div', class_='page js-change-page')
@@ -81,12 +100,14 @@ def parse_last_page(html_content):
         return None
 
 
-def parse_products_from_html(html_content):
+def parse_products_from_html(html_content, backend=None):
     """
     Parses the HTML content to extract product details, including ID, name, price, image URL, and rating.
 
     Parameters:
     - html_content (str): The HTML content of the page to parse.
+    - backend (str): HTML parser backend ("lxml" or "bs4"); defaults to the
+      configured one.
 
     Returns:
     - pd.DataFrame: A pandas DataFrame containing product details such as product ID, name, price, 
@@ -96,18 +117,8 @@ def parse_products_from_html(html_content):
     >>> products_df = parse_products_from_html(html_content)
     >>> print(products_df.head())  # Prints the first few rows of the parsed product DataFrame.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = parse_html(html_content, backend)
 
-    product_schema = {
-        "product_id": pd.Series(dtype='str'),
-        "product_name": pd.Series(dtype='str'),
-        "product_price": pd.Series(dtype='str'),
-        "product_image": pd.Series(dtype='str'),
-        "product_url": pd.Series(dtype='str'),
-        "product_rating": pd.Series(dtype='str')
-    }
-
-    product_df = pd.DataFrame(product_schema)
     products = soup.find_all('div', class_='product-cards')
 
     product_list = []
@@ -139,27 +150,142 @@ def parse_products_from_html(html_content):
         product_list.append(product_data)
 
     # Convert list of products to DataFrame
-    product_df = pd.concat([product_df, pd.DataFrame(product_list)],
-                           ignore_index=True)
-    product_df = product_df.reindex(columns=product_schema.keys())
+    builder = RecordBuilder(PRODUCT_SCHEMA)
+    builder.extend(product_list)
+    product_df = builder.to_frame()
 
     assert list(product_df.columns) == list(
-        product_schema.keys()), "DataFrame structure does not match the schema"
+        PRODUCT_SCHEMA.keys()), "DataFrame structure does not match the schema"
 
     return product_df
 
 
+def parse_page(html_content, cp):
+    """
+    Parses one page of a category.
+
+    Parameters:
+    - html_content (str): The HTML content of the page to parse.
+    - cp (int): The page number; the pagination is only read on page 1.
+
+    Returns:
+    - tuple: (pd.DataFrame, int) as returned by `fetch_products_page`.
+    """
+    last_page = parse_last_page(html_content) if cp == 1 else None
+    return parse_products_from_html(html_content), last_page
+
+
 # Assume setup_logger is defined elsewhere
 logger = setup_logger("logs/pingo_doce_scraper.log")
 
-@retry_on_failure(retries=3, delay=60)
-def parse_all_pages_for_category(categoria):
+
+async def fetch_products_page(categoria, cp, journal=None, date=None):
+    """
+    Fetches and parses one page of a category, or replays it from the
+    checkpoint journal if a previous run already completed it.
+
+    Parameters:
+    - categoria (str): The category of products being fetched.
+    - cp (int): The page number.
+    - journal (CheckpointJournal): Optional journal of completed pages.
+    - date (str): Crawl date (YYYYMMDD) the fetched response is archived under.
+
+    Returns:
+    - tuple: (pd.DataFrame, int) with the page products and, for page 1, the
+      last page number of the category (None otherwise or if it cannot be
+      determined).
+    """
+    if journal is not None:
+        checkpoint = journal.get(categoria, cp)
+        if checkpoint is not None:
+            logger.debug(f"Replaying page {cp} for category {categoria} "
+                         f"from checkpoint")
+            products_df, meta = checkpoint
+            return products_df, meta.get("last_page")
+
+    html_content = await fetch_html_from_pingodoce(cp, categoria, date)
+    products_df, last_page = await parse(parse_page, html_content, cp)
+
+    if journal is not None:
+        journal.record(categoria, cp, products_df, {"last_page": last_page})
+    return products_df, last_page
+
+
+async def parse_pages_concurrently(categoria, first_page_df, last_page,
+                                   journal=None, sink=None, date=None):
+    """
+    Fetches pages 2..last_page of a category concurrently and parses them, in
+    page order, together with the already parsed first page.
+
+    Parameters:
+    - categoria (str): The category of products being fetched.
+    - first_page_df (pd.DataFrame): The products of page 1.
+    - last_page (int): The last page number of the category.
+    - journal (CheckpointJournal): Optional journal of completed pages.
+    - sink (CategorySink): Optional sink each page is written to as soon as
+      it is parsed (in completion order).
+    - date (str): Crawl date (YYYYMMDD) the responses are archived under.
+
+    Returns:
+    - tuple: (pd.DataFrame, int) with the products of every page that could
+      be fetched, in page order (None when a sink is given), and the number
+      of pages that failed.
+    """
+    pages = list(range(2, last_page + 1))
+
+    async def fetch_cp(cp):
+        products_df, _ = await fetch_products_page(categoria, cp, journal,
+                                                   date)
+        if sink is None:
+            return products_df
+        sink.write_page(products_df)
+        return None
+
+    products = RecordBuilder(PRODUCT_SCHEMA)
+    if sink is not None:
+        sink.write_page(first_page_df)
+    else:
+        products.extend_frame(first_page_df)
+
+    page_dfs = await gather_in_order(fetch_cp, pages)
+
+    failed = 0
+    for cp, products_df in zip(pages, page_dfs):
+        if isinstance(products_df, Exception):
+            logger.error(f"Error parsing page {cp} for category "
+                         f"{categoria}: {str(products_df)}")
+            failed += 1
+            continue
+        if products_df is not None:
+            products.extend_frame(products_df)
+        logger.info(f"Successfully parsed page {cp} for category {categoria}")
+
+    if sink is not None:
+        return None, failed
+    return products.to_frame(), failed
+
+
+async def parse_all_pages_for_category(categoria,
+                                       fanout=config.FANOUT_ENABLED,
+                                       journal=None, sink=None, date=None):
     """
     Fetches and parses all pages for a specific category on the Pingo Doce website.
+
+    With `fanout` enabled the remaining pages are fetched concurrently once the
+    first page reveals the last page number. Pages already recorded in
+    `journal` are replayed instead of fetched. Responses are archived under the
+    crawl `date` (YYYYMMDD).
+
+    With a `sink`, every page is normalized and written as soon as it is
+    parsed and None is returned; otherwise the normalized products of the
+    whole category are.
+
+    Raises IncompleteCategoryError when some page could not be fetched, once
+    the other pages have been fetched and journaled.
     """
     logger.info(f"Starting to parse all pages for category: {categoria}")
-    first_page_html = fetch_html_from_pingodoce(cp=1, categoria=categoria)
-    last_page = parse_last_page(first_page_html)
+    first_page_df, last_page = await fetch_products_page(categoria, 1,
+                                                         journal, date)
 
     if last_page is None:
         last_page = 1
@@ -167,58 +293,116 @@ def parse_all_pages_for_category(categoria):
     else:
         logger.info(f"Found {last_page} pages for category {categoria}")
 
-    all_products_df = pd.DataFrame()
-
-    for cp in range(1, last_page + 1):
-        logger.debug(f"Fetching page {cp} of {last_page} for category {categoria}")
-        try:
-            html_content = fetch_html_from_pingodoce(cp, categoria)
-            products_df = parse_products_from_html(html_content)
-            all_products_df = pd.concat([all_products_df, products_df], ignore_index=True)
-            logger.info(f"Successfully parsed page {cp} for category {categoria}. Total products so far: {len(all_products_df)}")
-        except Exception as e:
-            logger.error(f"Error parsing page {cp} for category {categoria}: {str(e)}", exc_info=True)
-        
-        time.sleep(3)
-        logger.debug(f"Waiting 3 seconds before next request")
+    if fanout:
+        all_products_df, failed = await parse_pages_concurrently(
+            categoria, first_page_df, last_page, journal, sink, date)
+    else:
+        failed = 0
+        products = RecordBuilder(PRODUCT_SCHEMA)
+        # Pages go straight to the sink when there is one
+        add_page = (sink.write_page if sink is not None
+                    else products.extend_frame)
+        add_page(first_page_df)
+        for cp in range(2, last_page + 1):
+            logger.debug(f"Fetching page {cp} of {last_page} for category "
+                         f"{categoria}")
+            try:
+                products_df, _ = await fetch_products_page(
+                    categoria, cp, journal, date)
+                add_page(products_df)
+                total = sink.rows if sink is not None else len(products)
+                logger.info(f"Successfully parsed page {cp} for category "
+                            f"{categoria}. Total products so far: {total}")
+            except Exception as e:
+                logger.error(f"Error parsing page {cp} for category "
+                             f"{categoria}: {str(e)}", exc_info=True)
+                failed += 1
+        all_products_df = products.to_frame()
+
+    # A category with missing pages is not saved, so the next run retries them
+    if failed:
+        raise IncompleteCategoryError(
+            f"{failed} pages of category {categoria} could not be fetched")
+
+    if sink is not None:
+        logger.info(f"Completed parsing all pages for category "
+                    f"{categoria}. Total products: {sink.rows}")
+        return None
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    all_products_df["source"] = "pingo-doce"
-    all_products_df["timestamp"] = timestamp
+    # Convert the category to the canonical product schema in one pass
+    all_products_df = normalize_pingo_doce(all_products_df, categoria)
 
     logger.info(f"Completed parsing all pages for category {categoria}. Total products: {len(all_products_df)}")
     return all_products_df
 
-def parse_and_save_all_categories(categories, base_path="data/raw/pingo_doce"):
+
+async def parse_and_save_all_categories_async(
+        categories, base_path="data/raw/pingo_doce"):
     """
     Parses and saves the product data for multiple categories as CSV files.
     """
     logger.info(f"Starting to parse and save data for {len(categories)} categories")
 
-    base_path = base_path + "/" + datetime.now().strftime("%Y%m%d")
+    date = datetime.now().strftime("%Y%m%d")
+    base_path = base_path + "/" + date
 
     if not os.path.exists(base_path):
         os.makedirs(base_path)
         logger.info(f"Created directory: {base_path}")
 
+    # Completed pages and categories survive a crash in the checkpoint journal
+    journal = CheckpointJournal("pingo_doce", date=date)
+
     for categoria in categories:
+        if journal.is_category_done(categoria):
+            logger.info(f"Skipping category {categoria}, already saved by "
+                        f"a previous run")
+            continue
+
         logger.info(f"Processing category: {categoria}")
         try:
-            all_products_df = parse_all_pages_for_category(categoria)
-
-            if not all_products_df.empty:
-                csv_filename = f"{categoria.replace(' ', '_')}.csv"
-                file_path = os.path.join(base_path, csv_filename)
-                all_products_df.to_csv(file_path, index=False)
-                logger.info(f"Saved data for category '{categoria}' to '{file_path}'. Total products: {len(all_products_df)}")
+            csv_filename = f"{categoria.replace(' ', '_')}.csv"
+            file_path = os.path.join(base_path, csv_filename)
+            # Pages are normalized and written as they are parsed, not held
+            # until the end
+            with open_category_sink(
+                    "pingo_doce", date, categoria,
+                    lambda page: normalize_pingo_doce(page, categoria,
+                                                      tracking_date=date),
+                    file_path) as sink:
+                await parse_all_pages_for_category(
+                    categoria, journal=journal, sink=sink, date=date)
+
+            if sink.rows:
+                logger.info(f"Saved data for category '{categoria}' to "
+                            f"'{sink.path}'. Total products: {sink.rows}")
+                journal.mark_category_done(categoria)
             else:
                 logger.warning(f"No data found for category '{categoria}'. Skipping...")
+        except IncompleteCategoryError as e:
+            logger.warning(f"Category {categoria} left incomplete for the "
+                           f"next run: {str(e)}")
         except Exception as e:
             logger.error(f"Error processing category {categoria}: {str(e)}", exc_info=True)
 
+    # Keep the journal while some category is still missing so a rerun can
+    # finish it
+    if all(journal.is_category_done(categoria) for categoria in categories):
+        journal.discard()
+
     logger.info("Completed parsing and saving data for all categories")
 
 
+def parse_and_save_all_categories(categories, base_path="data/raw/pingo_doce"):
+    """
+    Synchronous entry point that runs `parse_and_save_all_categories_async`
+    in its own event loop.
+    """
+    run(
+        closing_parse_stage(
+            parse_and_save_all_categories_async(categories, base_path)))
+
+
 if __name__ == "__main__":
     # Example usage
     categories = [
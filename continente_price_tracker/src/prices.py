@@ -0,0 +1,144 @@
+"""
+Vectorized parsing of the price strings shown by every retailer.
+
+The sites write the same kind of price in several ways:
+
+    "€22,99/un"      Continente unit price, decimal comma
+    "€1,997,33/lt"   Continente, a comma for the thousands as well
+    "0,15€ / UN"     Pingo Doce, currency after the amount
+    "10,49€ / KG"    per-kg and per-litre prices carry their unit
+    "22.99"          plain floats from the grids and older CSV files
+    "1.234,56"       thousands separators
+
+`parse_prices` reads a whole column at once with pandas string operations
+(each distinct string is only parsed once) and returns the amount and the
+canonical unit. Anything that does not hold a number becomes NaN instead of
+raising.
+"""
+import numpy as np
+import pandas as pd
+
+# Spellings of the same price unit across the sites
+UNIT_ALIASES = {
+    "lt": "l",
+    "ltr": "l",
+    "gr": "g",
+    "duz": "doz",
+}
+
+# Longest unit kept, e.g. "unidade"
+_UNIT_WIDTH = 16
+
+
+def _parse_strings(values):
+    """
+    Parses distinct price strings with array operations over their characters.
+
+    Every string becomes a row of Unicode code points, so finding the number,
+    its decimal separator and the unit is a handful of whole-matrix NumPy
+    operations instead of one regex call per string.
+
+    Returns:
+        tuple: (np.ndarray, np.ndarray) with the float amounts (NaN when the
+        string holds no digit) and the units (None when there is none).
+    """
+    if not len(values):
+        return np.empty(0), np.empty(0, dtype="object")
+    chars = np.array(values, dtype="U").view(np.int32).reshape(len(values), -1)
+    width = chars.shape[1]
+    positions = np.arange(width)
+
+    is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+    is_point = (chars == ord(".")) | (chars == ord(","))
+    is_space = (chars == ord(" ")) | (chars == 0xA0)
+    has_digit = is_digit.any(axis=1)
+
+    # The number runs from the first digit over digits and separators, up to
+    # its last digit
+    start = is_digit.argmax(axis=1)
+    after_start = positions >= start[:, None]
+    breaks = after_start & ~(is_digit | is_point | is_space)
+    end = np.where(breaks.any(axis=1), breaks.argmax(axis=1), width)
+    digits = is_digit & after_start & (positions < end[:, None])
+    last_digit = width - 1 - digits[:, ::-1].argmax(axis=1)
+    points = is_point & after_start & (positions < last_digit[:, None])
+
+    # The last separator is the decimal one, unless it closes a run of
+    # thousands groups with the same separator ("1.234.567")
+    has_point = points.any(axis=1)
+    last_point = width - 1 - points[:, ::-1].argmax(axis=1)
+    decimals = np.where(has_point, last_digit - last_point, 0)
+    point_char = chars[np.arange(len(chars)), last_point]
+    repeated = ((chars == point_char[:, None]) & points).sum(axis=1) > 1
+    decimals = np.where((decimals == 3) & repeated, 0, decimals)
+
+    # All the digits read as one integer, then shifted by the decimals
+    rank = np.cumsum(digits[:, ::-1], axis=1)[:, ::-1] - 1
+    scale = np.power(10.0, np.where(digits, rank, 0))
+    mantissa = np.where(digits, (chars - ord("0")) * scale, 0)
+    amount = np.where(has_digit,
+                      mantissa.sum(axis=1) / np.power(10.0, decimals), np.nan)
+
+    # The unit is the first run of letters after a "/" that follows the number
+    is_upper = (chars >= ord("A")) & (chars <= ord("Z"))
+    lower = np.where(is_upper, chars + 32, chars)
+    is_letter = (lower >= ord("a")) & (lower <= ord("z"))
+    slash = (chars == ord("/")) & (positions > last_digit[:, None])
+    letters = is_letter & (positions > slash.argmax(axis=1)[:, None])
+    unit_start = letters.argmax(axis=1)
+    gaps = (positions > unit_start[:, None]) & ~is_letter
+    unit_end = np.where(gaps.any(axis=1), gaps.argmax(axis=1), width)
+    unit_length = unit_end - unit_start
+    has_unit = has_digit & slash.any(axis=1) & letters.any(axis=1)
+
+    offsets = np.arange(_UNIT_WIDTH)
+    unit_chars = np.take_along_axis(
+        lower, np.minimum(unit_start[:, None] + offsets, width - 1), axis=1)
+    in_unit = (offsets < unit_length[:, None]) & has_unit[:, None]
+    unit_chars = np.where(in_unit, unit_chars, 0)
+    unit = np.ascontiguousarray(unit_chars, dtype=np.int32).view(
+        f"U{_UNIT_WIDTH}").ravel()
+    unit = unit.astype("object")
+    unit[unit == ""] = None
+    for alias, canonical in UNIT_ALIASES.items():
+        unit[unit == alias] = canonical
+    return amount, unit
+
+
+def parse_prices(prices):
+    """
+    Parses price strings into their amount and unit.
+
+    The number is the first run of digits and separators. Its last "." or ","
+    is the decimal separator and the others (and spaces) group thousands, so
+    "22,99", "22.99", "1.234,56", Continente's "€1,997,33/lt" and a lone
+    "1.234" all keep their decimals; only a number made of several thousands
+    groups with the same separator ("1.234.567") has none.
+
+    Args:
+        prices (pd.Series): Raw prices; numeric columns are returned as
+            they are.
+
+    Returns:
+        pd.DataFrame: "amount" (float64) and "unit" (categorical, lowercase
+        and canonical, e.g. "kg", "l", "un"; missing when the price has
+        none), on the index of `prices`.
+    """
+    if pd.api.types.is_numeric_dtype(prices):
+        return pd.DataFrame({
+            "amount": prices.astype("float64"),
+            "unit": pd.Categorical([None] * len(prices)),
+        }, index=prices.index)
+
+    # Prices repeat a lot: every distinct string is parsed once and the
+    # results are spread back with the factorize codes
+    codes, uniques = pd.factorize(prices.astype("str"))
+    amount, unit = _parse_strings(np.asarray(uniques, dtype="object"))
+    unit_codes, units = pd.factorize(unit)
+
+    # Missing prices have code -1, which picks the trailing missing value
+    return pd.DataFrame({
+        "amount": np.append(amount, np.nan)[codes],
+        "unit": pd.Categorical.from_codes(np.append(unit_codes, -1)[codes],
+                                          categories=units),
+    }, index=prices.index)
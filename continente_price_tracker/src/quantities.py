@@ -0,0 +1,225 @@
+"""
+Package size extraction from product names, with a persistent cache.
+
+Names such as "iogurte pur natur 4x125g", "vodka trofeu silver 70 cl",
+"Sacos Lixo Eco+ Maxi Rolo 30 lt", "cordão 20mt" or "detergente 60 doses"
+carry the package size. `extract_quantities` reads it into:
+
+    pack_count     items in the pack ("4x125g" -> 4; 1 otherwise)
+    unit_size      size of one item, in `quantity_unit`
+    quantity       pack_count * unit_size
+    quantity_unit  "g", "ml", "m", or a count: "un", "doses", "par"
+
+One combined pattern is applied with `str.extract` to the distinct names
+only. Names barely change from day to day, so the results are kept in a
+Parquet cache keyed by a hash of the name; a day's catalogue is then a cache
+lookup plus the few names never seen before.
+"""
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import config
+from storage.files import move_into_place
+
+# Units and their (base unit, factor to it); counts are kept as counts
+UNITS = {
+    "kg": ("g", 1000.0),
+    "gr": ("g", 1.0),
+    "g": ("g", 1.0),
+    "mg": ("g", 0.001),
+    "lt": ("ml", 1000.0),
+    "l": ("ml", 1000.0),
+    "dl": ("ml", 100.0),
+    "cl": ("ml", 10.0),
+    "ml": ("ml", 1.0),
+    "mts": ("m", 1.0),
+    "mt": ("m", 1.0),
+    "m": ("m", 1.0),
+    "cm": ("m", 0.01),
+    "unidades": ("un", 1.0),
+    "unid": ("un", 1.0),
+    "un": ("un", 1.0),
+    "vcaps": ("un", 1.0),
+    "caps": ("un", 1.0),
+    "cápsulas": ("un", 1.0),
+    "comprimidos": ("un", 1.0),
+    "saquetas": ("un", 1.0),
+    "rolos": ("un", 1.0),
+    "doses": ("doses", 1.0),
+    "dose": ("doses", 1.0),
+    "pares": ("par", 1.0),
+    "par": ("par", 1.0),
+}
+
+# Counted in eggs
+_DOZENS = {"dúzia": 12.0, "meia dúzia": 6.0}
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_UNIT = "|".join(sorted(map(re.escape, UNITS), key=len, reverse=True))
+
+# Bumped whenever the pattern or the units change, so older cache entries
+# are not reused
+PARSER_VERSION = 2
+
+# The first size in the name, in one of three shapes: a multipack
+# ("4x125g", "3 x 75 cl", "4×170 g"), a single size ("0.75l", "60 doses")
+# or a dozen.
+# Numbers glued to a letter or "+" ("+6M", "T5") are not sizes.
+QUANTITY_PATTERN = re.compile(
+    rf"(?<![\w+.,])(?:"
+    rf"(?P<pack>\d+)\s*[x×]\s*"
+    rf"(?P<pack_size>{_NUMBER})\s*(?P<pack_unit>{_UNIT})"
+    rf"|(?P<size>{_NUMBER})\s*(?P<unit>{_UNIT})"
+    rf")(?!\w)"
+    rf"|(?P<dozen>meia\s+dúzia|dúzia)",
+    re.IGNORECASE)
+
+QUANTITY_COLUMNS = ["pack_count", "unit_size", "quantity", "quantity_unit"]
+
+
+def parse_quantities(names):
+    """
+    Reads the package size of every name, without the cache.
+
+    Args:
+        names (pd.Series): Product names.
+
+    Returns:
+        pd.DataFrame: The `QUANTITY_COLUMNS`, on the index of `names`; all
+        missing when a name has no size.
+    """
+    parts = names.astype("object").str.extract(QUANTITY_PATTERN)
+
+    is_pack = parts["pack"].notna()
+    size = parts["pack_size"].where(is_pack, parts["size"])
+    unit = parts["pack_unit"].where(is_pack, parts["unit"]).str.lower()
+    size = pd.to_numeric(size.str.replace(",", ".", regex=False),
+                         errors="coerce")
+
+    base_unit = unit.map({name: base for name, (base, _) in UNITS.items()})
+    factor = unit.map({name: factor for name, (_, factor) in UNITS.items()})
+    unit_size = size * factor
+    pack_count = pd.to_numeric(parts["pack"],
+                               errors="coerce").where(is_pack, 1.0)
+
+    dozen = parts["dozen"].str.lower().str.replace(
+        r"\s+", " ", regex=True).map(_DOZENS)
+    is_dozen = dozen.notna()
+    unit_size = unit_size.mask(is_dozen, dozen)
+    base_unit = base_unit.mask(is_dozen, "un")
+
+    found = unit_size.notna()
+    quantities = pd.DataFrame({
+        "pack_count": pack_count.where(found),
+        "unit_size": unit_size,
+        "quantity": (pack_count * unit_size).where(found),
+        "quantity_unit": base_unit.where(found),
+    }, index=names.index)
+    return quantities.astype({
+        "pack_count": "float32",
+        "unit_size": "float64",
+        "quantity": "float64",
+        "quantity_unit": "category",
+    })
+
+
+def name_hashes(names):
+    """Stable 64-bit hashes of product names, the cache key."""
+    return pd.util.hash_array(np.asarray(names, dtype="object"))
+
+
+class QuantityCache:
+    """
+    Parsed package sizes by name hash, kept in one Parquet file.
+
+    Args:
+        path (str): Cache file; created on the first `save`.
+    """
+
+    def __init__(self, path="data/cache/quantities.parquet"):
+        self.path = path
+        self._entries = None
+
+    def entries(self):
+        """Returns the cached sizes, indexed by name hash."""
+        if self._entries is None:
+            if os.path.exists(self.path):
+                entries = pd.read_parquet(self.path)
+                entries = entries[
+                    entries["parser_version"] == PARSER_VERSION]
+                self._entries = entries.set_index(
+                    "name_hash")[QUANTITY_COLUMNS]
+            else:
+                empty = parse_quantities(pd.Series([], dtype="object"))
+                self._entries = empty.set_axis(
+                    pd.Index([], dtype="uint64", name="name_hash"))
+        return self._entries
+
+    def add(self, hashes, quantities):
+        """Adds freshly parsed sizes and rewrites the cache file."""
+        new = quantities.set_axis(
+            pd.Index(hashes, dtype="uint64", name="name_hash"))
+        entries = pd.concat([self.entries(), new])
+        entries = entries[~entries.index.duplicated(keep="last")]
+        self._entries = entries.astype({"quantity_unit": "category"})
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".quantities-")
+        os.close(fd)
+        try:
+            entries = self._entries.assign(parser_version=PARSER_VERSION)
+            entries.reset_index().to_parquet(tmp_path, index=False,
+                                             compression="zstd")
+            move_into_place(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+# Cache shared by the whole process, created on first use
+_cache = None
+
+
+def get_quantity_cache():
+    """Returns the process-wide cache at `config.QUANTITY_CACHE_PATH`."""
+    global _cache
+    if _cache is None:
+        _cache = QuantityCache(config.QUANTITY_CACHE_PATH)
+    return _cache
+
+
+def extract_quantities(names, cache=None):
+    """
+    Package sizes of product names, parsing only names missing from the cache.
+
+    Args:
+        names (pd.Series): Product names.
+        cache (QuantityCache): Cache to use; defaults to the process-wide one.
+
+    Returns:
+        pd.DataFrame: The `QUANTITY_COLUMNS`, on the index of `names`.
+    """
+    cache = cache or get_quantity_cache()
+    codes, uniques = pd.factorize(names.astype("object"))
+    hashes = name_hashes(uniques)
+
+    entries = cache.entries()
+    is_new = ~pd.Index(hashes).isin(entries.index)
+    if is_new.any():
+        new_names = pd.Series(uniques[is_new], dtype="object")
+        cache.add(hashes[is_new], parse_quantities(new_names))
+        entries = cache.entries()
+
+    # One row per distinct name, then spread over the rows; a missing name
+    # (code -1) takes the trailing empty row
+    found = entries.reindex(pd.Index(hashes, dtype="uint64"))
+    found = pd.concat([found, found.iloc[:0].reindex([0])], ignore_index=True)
+    rows = np.where(codes < 0, len(uniques), codes)
+    return found.iloc[rows].set_axis(names.index)
@@ -0,0 +1,80 @@
+"""
+Shows the price history of one product, read through the product index.
+
+Usage:
+    python continente_price_tracker/src/query_prices.py continente 7130167 \
+        --days 30
+    python continente_price_tracker/src/query_prices.py auchan 3341432 \
+        --start 20241101 --csv
+    python continente_price_tracker/src/query_prices.py --rebuild-index
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import config
+from logger import setup_logger
+from schema import RETAILERS
+from storage.output import get_product_index, product_history
+
+logger = setup_logger("logs/query_prices.log")
+
+COLUMNS = ["tracking_date", "cgid", "product_name", "price", "unit_price",
+           "unit", "promotion"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("retailer", nargs="?", choices=RETAILERS)
+    parser.add_argument("product_id", nargs="?")
+    parser.add_argument("--days", type=int, help="Only the last DAYS days")
+    parser.add_argument("--start", help="First day, as YYYYMMDD")
+    parser.add_argument("--end", help="Last day, as YYYYMMDD")
+    parser.add_argument("--columns", nargs="+", default=COLUMNS,
+                        help="Product schema columns to show")
+    parser.add_argument("--csv", action="store_true",
+                        help="Print CSV instead of a table")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Index every day of the Parquet store again "
+                        "first")
+    parser.add_argument("--index-path", default=config.INDEX_PATH)
+    args = parser.parse_args()
+
+    # The command line asks for the index explicitly, whatever the scheduled
+    # default
+    config.INDEX_ENABLED = True
+    config.INDEX_PATH = args.index_path
+    index = get_product_index()
+    if index is None:
+        parser.error("the product index needs the parquet output format")
+
+    if args.rebuild_index:
+        for retailer in RETAILERS:
+            entries = index.rebuild(retailer)
+            logger.info(
+                f"Rebuilt the {retailer} index with {entries} entries")
+            print(f"Indexed {entries} {retailer} rows")
+    if args.retailer is None or args.product_id is None:
+        if not args.rebuild_index:
+            parser.error(
+                "give a retailer and a product id, or --rebuild-index")
+        return
+
+    start = args.start
+    if args.days is not None:
+        start = (datetime.now()
+                 - timedelta(days=args.days - 1)).strftime("%Y%m%d")
+    history = product_history(args.retailer, args.product_id,
+                              columns=args.columns, start_date=start,
+                              end_date=args.end)
+    if history.empty:
+        print(f"No rows of {args.retailer} product {args.product_id}")
+        return
+    if args.csv:
+        history.to_csv(sys.stdout, index=False)
+    else:
+        print(history.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
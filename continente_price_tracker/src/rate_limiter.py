@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import config
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate adapts to how the server is coping (AIMD).
+
+    Every request takes one token. While responses come back healthy the rate
+    grows additively by `increase` requests/second; a 429, a 5xx, a transport
+    failure or a latency spike cuts it multiplicatively by `decrease`. Cuts are
+    applied at most once per `cooldown` seconds, so a burst of bad responses
+    to requests that were already in flight only counts once.
+
+    Args:
+        rate (float): Initial rate, in requests per second.
+        min_rate (float): Lower bound for the rate.
+        max_rate (float): Upper bound for the rate.
+        burst (int): Bucket capacity, i.e. how many requests may start back
+            to back.
+        increase (float): Additive increase applied after each healthy
+            response.
+        decrease (float): Multiplicative factor applied on congestion.
+        latency_factor (float): A response slower than `latency_factor` times
+            the baseline latency is treated as congestion.
+        cooldown (float): Minimum number of seconds between two decreases.
+    """
+
+    def __init__(self,
+                 rate=None,
+                 min_rate=None,
+                 max_rate=None,
+                 burst=None,
+                 increase=0.1,
+                 decrease=0.5,
+                 latency_factor=3.0,
+                 cooldown=2.0):
+        self.rate = rate or config.RATE_LIMIT_INITIAL
+        self.min_rate = min_rate or config.RATE_LIMIT_MIN
+        self.max_rate = max_rate or config.RATE_LIMIT_MAX
+        self.capacity = burst or config.RATE_LIMIT_BURST
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._latency = None
+        self._baseline = None
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Waits until a token is available and takes it."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    def record(self, status, latency):
+        """
+        Feeds the outcome of a request back into the limiter.
+
+        Args:
+            status (int): HTTP status code, or None if the request failed at
+                the transport level (timeout, connection reset, ...).
+            latency (float): Time the request took, in seconds.
+        """
+        if status is None or status == 429 or status >= 500:
+            self._back_off()
+            return
+
+        self._latency = latency if self._latency is None else (
+            0.8 * self._latency + 0.2 * latency)
+        if self._baseline is None or self._latency < self._baseline:
+            self._baseline = self._latency
+
+        if self._latency > self.latency_factor * self._baseline:
+            self._back_off()
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def _back_off(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # Let the latency baseline be re-learned at the new rate
+        self._latency = None
@@ -0,0 +1,69 @@
+"""
+Columnar accumulator for parsed product records.
+
+Growing a DataFrame page by page with `pd.concat` copies everything collected
+so far on every page, which is quadratic in the depth of a category.
+`RecordBuilder` instead appends each page's fields to one buffer per column
+and builds the DataFrame once, when the category is complete.
+"""
+import pandas as pd
+
+
+class RecordBuilder:
+    """
+    Collects records column by column and materializes them as one DataFrame.
+
+    Args:
+        schema (dict): Optional {column: dtype}. These columns come first, in
+            order, and exist in the result even when no record was added.
+
+    Records may carry columns missing from the schema or from earlier records;
+    every column is padded with None where a record had no value for it.
+    """
+
+    def __init__(self, schema=None):
+        self.schema = dict(schema or {})
+        self._columns = {column: [] for column in self.schema}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def _column(self, name):
+        values = self._columns.get(name)
+        if values is None:
+            values = self._columns[name] = [None] * self._length
+        return values
+
+    def _pad(self):
+        for values in self._columns.values():
+            if len(values) < self._length:
+                values.extend([None] * (self._length - len(values)))
+
+    def append(self, record):
+        """Adds one record, given as a {column: value} dict."""
+        for name, value in record.items():
+            self._column(name).append(value)
+        self._length += 1
+        self._pad()
+
+    def extend(self, records):
+        """Adds every record of an iterable of dicts."""
+        for record in records:
+            self.append(record)
+
+    def extend_frame(self, df):
+        """Adds the rows of a page DataFrame, column by column."""
+        if df is None or df.empty:
+            return
+        for name in df.columns:
+            self._column(name).extend(df[name].tolist())
+        self._length += len(df)
+        self._pad()
+
+    def to_frame(self):
+        """Builds the DataFrame of every record added so far."""
+        return pd.DataFrame({
+            name: pd.Series(values, dtype=self.schema.get(name))
+            for name, values in self._columns.items()
+        })
@@ -0,0 +1,133 @@
+"""
+Rebuilds a day's category files from the raw response archive, offline,
+then refreshes the tables derived from that day, like a scrape does.
+
+Usage:
+    python continente_price_tracker/src/reparse.py 20241125
+    python continente_price_tracker/src/reparse.py 20241125 \
+        --retailer auchan --base-path data/reparsed
+"""
+import argparse
+import os
+from itertools import groupby
+
+import pandas as pd
+
+import config
+from archive import RawArchive
+from logger import setup_logger
+from schema import (normalize_auchan, normalize_continente,
+                    normalize_pingo_doce)
+from storage.output import (detect_changes, load_warehouse, save_category,
+                            update_aggregates, update_history,
+                            update_matches, update_matrix,
+                            update_product_index)
+from continente.catalog import parse_product_data
+from pingo_doce.pingo_doce import (
+    parse_products_from_html as parse_pingo_doce_products)
+from auchan.auchan import parse_products_from_html as parse_auchan_products
+
+logger = setup_logger("logs/reparse.log")
+
+
+def rebuild_continente(category, pages, date):
+    df = pd.concat([parse_product_data(html, category) for html in pages])
+    return normalize_continente(df, tracking_date=date), f"{category}.csv"
+
+
+def rebuild_pingo_doce(category, pages, date):
+    df = pd.concat([parse_pingo_doce_products(html) for html in pages],
+                   ignore_index=True)
+    filename = f"{category.replace(' ', '_')}.csv"
+    return normalize_pingo_doce(df, category, tracking_date=date), filename
+
+
+def rebuild_auchan(category, pages, date):
+    df = pd.concat([parse_auchan_products(html) for html in pages],
+                   ignore_index=True)
+    filename = f"{category}_{date}.csv"
+    return normalize_auchan(df, category, tracking_date=date), filename
+
+
+# Mirrors the file names each scraper writes
+REBUILDERS = {
+    "continente": rebuild_continente,
+    "pingo_doce": rebuild_pingo_doce,
+    "auchan": rebuild_auchan,
+}
+
+
+def reparse_day(date, retailers=None, archive_path=None, base_path="data/raw"):
+    """
+    Re-runs the parsers over every response archived on `date`, rewrites the
+    categories in the configured output format (see `config.OUTPUT_FORMAT`)
+    and refreshes the warehouse, history, change events, aggregates, price
+    matrix, product index and matches with the rebuilt day.
+
+    Args:
+        date (str): Crawl date as YYYYMMDD.
+        retailers (list): Retailers to rebuild; defaults to all of them.
+        archive_path (str): Root of the raw archive; defaults to
+            `config.ARCHIVE_PATH`.
+        base_path (str): Directory the rebuilt CSV files are written to.
+
+    Returns:
+        list: Paths of the files written.
+    """
+    archive = RawArchive(archive_path or config.ARCHIVE_PATH)
+    retailers = retailers or list(REBUILDERS)
+    written = []
+
+    for retailer in retailers:
+        entries = archive.entries(date, retailer=retailer)
+        logger.info(f"Re-parsing {len(entries)} archived pages for "
+                    f"{retailer} on {date}")
+
+        output_directory = os.path.join(base_path, retailer, date)
+        os.makedirs(output_directory, exist_ok=True)
+
+        for category, category_entries in groupby(
+                entries, key=lambda e: e["category"]):
+            category_entries = list(category_entries)
+            try:
+                pages = [archive.get(entry) for entry in category_entries]
+                df, filename = REBUILDERS[retailer](category, pages, date)
+            except Exception as e:
+                logger.error(f"Error re-parsing {retailer} category "
+                             f"{category}: {str(e)}", exc_info=True)
+                continue
+
+            file_path = save_category(df, retailer, date, category,
+                                      os.path.join(output_directory, filename))
+            written.append(file_path)
+            logger.info(f"Rebuilt {retailer} category '{category}' "
+                        f"({len(df)} products) to {file_path}")
+
+    # The rebuilt files replace the ones the derived tables were built from,
+    # so the day goes through the same steps as after a scrape
+    load_warehouse([date], retailers)
+    update_history([date], retailers)
+    detect_changes([date], retailers)
+    update_aggregates([date], retailers)
+    update_matrix([date])
+    update_product_index([date], retailers)
+    update_matches(date)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("date", help="Crawl date to rebuild, as YYYYMMDD")
+    parser.add_argument("--retailer", action="append",
+                        choices=sorted(REBUILDERS),
+                        help="Retailer to rebuild (repeatable); defaults to "
+                        "all")
+    parser.add_argument("--archive-path", default=config.ARCHIVE_PATH)
+    parser.add_argument("--base-path", default="data/raw")
+    args = parser.parse_args()
+
+    reparse_day(args.date, args.retailer, args.archive_path, args.base_path)
+
+
+if __name__ == "__main__":
+    main()
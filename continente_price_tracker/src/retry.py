@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: the server is overloaded or briefly unavailable
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """
+    Total number of seconds a run may spend waiting between retries.
+
+    The budget is shared by every request of the process, so a site that keeps
+    failing cannot stall the nightly run for longer than `seconds`.
+    """
+
+    def __init__(self, seconds):
+        self.remaining = seconds
+
+    def take(self, delay):
+        """
+        Reserves `delay` seconds of the budget; returns False if it is
+        exhausted.
+        """
+        if delay > self.remaining:
+            return False
+        self.remaining -= delay
+        return True
+
+
+# Budget shared by every retry policy of this run
+RUN_BUDGET = RetryBudget(config.RETRY_BUDGET)
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """Tells whether a failed request is worth retrying."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class RetryPolicy:
+    """
+    Per-request retry policy: exponential backoff with full jitter.
+
+    A server-provided Retry-After always wins over the computed backoff. Every
+    wait is charged to `budget`; once it is spent, failures are raised at once.
+
+    Args:
+        attempts (int): Maximum number of attempts, the first one included.
+        base_delay (float): Backoff before the first retry, in seconds.
+        max_delay (float): Upper bound for a single wait, in seconds.
+        budget (RetryBudget): Retry-time budget to charge; defaults to the
+            run budget.
+    """
+
+    def __init__(self, attempts=None, base_delay=None, max_delay=None,
+                 budget=None):
+        self.attempts = attempts or config.RETRY_ATTEMPTS
+        self.base_delay = base_delay or config.RETRY_BASE_DELAY
+        self.max_delay = max_delay or config.RETRY_MAX_DELAY
+        self.budget = budget or RUN_BUDGET
+
+    def next_delay(self, error, attempt):
+        """
+        Computes how long to wait before retrying after `error`.
+
+        Args:
+            error (Exception): The error raised by attempt number `attempt`.
+            attempt (int): Zero-based index of the attempt that failed.
+
+        Returns:
+            float: Seconds to wait, or None if the request must not be retried.
+        """
+        if attempt + 1 >= self.attempts or not is_retryable(error):
+            return None
+
+        headers = getattr(error, "headers", None) or {}
+        delay = parse_retry_after(headers.get("Retry-After"))
+        if delay is None:
+            delay = random.uniform(
+                0, min(self.max_delay, self.base_delay * 2**attempt))
+
+        if not self.budget.take(delay):
+            logger.warning("Retry budget exhausted, giving up on request")
+            return None
+        return delay
+
+    async def call(self, func, *args, **kwargs):
+        """Awaits `func(*args, **kwargs)`, retrying it as the policy says."""
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as error:
+                delay = self.next_delay(error, attempt)
+                if delay is None:
+                    raise
+                logger.warning(
+                    f"Request failed: {error}. "
+                    f"Retrying in {delay:.1f} seconds..."
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
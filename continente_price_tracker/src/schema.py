@@ -0,0 +1,197 @@
+"""
+Canonical product record shared by every retailer.
+
+The parsers still read each site in its own layout (Continente's "Product
+Name"/"Price per unit", Pingo Doce's "0,15€ / UN" price strings, Auchan's
+JSON blobs); the `normalize_*` functions turn a category's rows into the
+single schema below in one vectorized pass, before anything is written.
+Repeated strings are stored as categoricals and prices as float32, so a day
+of data takes a fraction of the memory of the raw object columns and
+downstream code never has to clean strings again.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from prices import parse_prices
+
+# Canonical columns, in order, and their dtypes
+PRODUCT_SCHEMA = {
+    "source": "category",
+    "tracking_date": "datetime64[s]",
+    "cgid": "category",
+    "product_id": "category",
+    "product_name": "str",
+    "brand": "category",
+    "category": "category",
+    "price": "float32",
+    "unit_price": "float32",
+    "unit": "category",
+    "package": "str",
+    "promotion": "category",
+    "labels": "category",
+    "rating": "float32",
+    "image_url": "str",
+    "product_url": "str",
+}
+
+# Static product attributes, kept once per product in the product dimension
+# instead of in every daily row
+ATTRIBUTE_COLUMNS = [
+    "product_name", "brand", "category", "package", "labels", "image_url",
+    "product_url"
+]
+
+# What a daily price fact carries: the product key, prices and promotion
+FACT_COLUMNS = [
+    column for column in PRODUCT_SCHEMA if column not in ATTRIBUTE_COLUMNS
+]
+
+# Retailer keys used in the `source` column and in storage paths
+RETAILERS = ["continente", "pingo_doce", "auchan"]
+
+
+def _column(df, name):
+    # Legacy files do not always carry every column
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype="object")
+
+
+def _blank_to_none(values):
+    values = values.astype("str").str.strip()
+    return values.mask(values.isin(["", "nan", "None"]))
+
+
+def _tracking_date(df, tracking_date):
+    if tracking_date is None:
+        tracking_date = datetime.now().strftime("%Y-%m-%d")
+    return pd.Series(pd.Timestamp(tracking_date), index=df.index)
+
+
+def to_product_schema(columns, index):
+    """
+    Builds a DataFrame with the `PRODUCT_SCHEMA` columns, in order and cast to
+    their dtypes, from a {column: values} dict. Missing columns are left empty.
+    """
+    return pd.DataFrame({
+        name: pd.Series(columns.get(name), index=index).astype(dtype)
+        for name, dtype in PRODUCT_SCHEMA.items()
+    }, index=index).reset_index(drop=True)
+
+
+def normalize_continente(df, tracking_date=None):
+    """
+    Converts Continente category rows (as parsed from the grid) to the
+    canonical schema.
+
+    Args:
+        df (pd.DataFrame): Rows with the "Product Name", "Price per unit",
+            ... columns.
+        tracking_date (str): Crawl date; defaults to the "tracking_date"
+            column, then today.
+    """
+    df = df.reset_index(drop=True)
+    if tracking_date is None and "tracking_date" in df.columns:
+        dates = pd.to_datetime(df["tracking_date"])
+    else:
+        dates = _tracking_date(df, tracking_date)
+    unit_prices = parse_prices(_column(df, "Price per unit"))
+    return to_product_schema({
+        "source": "continente",
+        "tracking_date": dates,
+        "cgid": _column(df, "cgid"),
+        "product_id": _column(df, "Product ID").astype("str"),
+        "product_name": _column(df, "Product Name"),
+        "brand": _blank_to_none(_column(df, "Brand")),
+        "category": _blank_to_none(_column(df, "Category")),
+        "price": parse_prices(_column(df, "Price"))["amount"],
+        "unit_price": unit_prices["amount"],
+        "unit": unit_prices["unit"],
+        "package": _column(df, "Minimum Quantity"),
+        "image_url": _blank_to_none(_column(df, "Image URL")),
+        "product_url": _blank_to_none(_column(df, "Product Link")),
+    }, df.index)
+
+
+def normalize_pingo_doce(df, cgid, tracking_date=None):
+    """
+    Converts Pingo Doce category rows to the canonical schema. Pingo Doce only
+    shows the price per sale unit ("0,15€ / UN", "10,49€ / KG").
+
+    Args:
+        df (pd.DataFrame): Rows with the "product_price", ... columns.
+        cgid (str): The category the rows were scraped from.
+        tracking_date (str): Crawl date; defaults to the "timestamp" column,
+            then today.
+    """
+    df = df.reset_index(drop=True)
+    if tracking_date is None and "timestamp" in df.columns:
+        dates = pd.to_datetime(df["timestamp"].astype("str").str[:8],
+                               format="%Y%m%d")
+    else:
+        dates = _tracking_date(df, tracking_date)
+    prices = parse_prices(_column(df, "product_price"))
+    return to_product_schema({
+        "source": "pingo_doce",
+        "tracking_date": dates,
+        "cgid": cgid,
+        "product_id": _column(df, "product_id"),
+        "product_name": _column(df, "product_name"),
+        "price": prices["amount"],
+        "unit_price": prices["amount"],
+        "unit": prices["unit"],
+        "rating": pd.to_numeric(_column(df, "product_rating"),
+                                errors="coerce"),
+        "image_url": _blank_to_none(_column(df, "product_image")),
+        "product_url": _blank_to_none(_column(df, "product_url")),
+    }, df.index)
+
+
+def normalize_auchan(df, cgid, tracking_date=None):
+    """
+    Converts Auchan category rows to the canonical schema. The category levels
+    are joined into a "/" path like Continente's, the product link is taken
+    from the `data-urls` JSON and the labels are reduced to their titles.
+
+    Args:
+        df (pd.DataFrame): Rows with the "product_price", "product_urls",
+            ... columns.
+        cgid (str): The cgid the rows were scraped from.
+        tracking_date (str): Crawl date; defaults to the "timestamp" column,
+            then today.
+    """
+    df = df.reset_index(drop=True)
+    if tracking_date is None and "timestamp" in df.columns:
+        dates = pd.to_datetime(df["timestamp"].astype("str").str[:8],
+                               format="%Y%m%d")
+    else:
+        dates = _tracking_date(df, tracking_date)
+
+    levels = [
+        _blank_to_none(_column(df, column))
+        for column in ("product_category", "product_category2",
+                       "product_category3")
+    ]
+    category = levels[0]
+    for level in levels[1:]:
+        category = category.where(level.isna(), category + "/" + level)
+
+    product_url = _column(df, "product_urls").astype("str").str.extract(
+        r'"absoluteProductUrl"\s*:\s*"([^"]*)"', expand=False)
+    labels = _column(df, "product_labels").astype("str").str.findall(
+        r"'title': '([^']*)'").str.join(";")
+
+    return to_product_schema({
+        "source": "auchan",
+        "tracking_date": dates,
+        "cgid": cgid,
+        "product_id": _column(df, "product_id").astype("str"),
+        "product_name": _column(df, "product_name"),
+        "category": category,
+        "price": parse_prices(_column(df, "product_price"))["amount"],
+        "promotion": _blank_to_none(_column(df, "product_promotions")),
+        "labels": labels.mask(labels == ""),
+        "image_url": _blank_to_none(_column(df, "product_image")),
+        "product_url": product_url,
+    }, df.index)
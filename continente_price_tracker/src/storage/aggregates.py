@@ -0,0 +1,242 @@
+"""
+Rolling price aggregates per product, maintained one crawl at a time.
+
+For every product the aggregate table holds, over the last 7, 30 and 90
+days, the minimum, maximum and time-weighted mean price and the share of
+days on promotion, along with the last price, when it was last seen and when
+its price last changed:
+
+    product_id, last_price, last_seen, last_change,
+    min_7d, max_7d, mean_7d, promo_share_7d, ..., promo_share_90d
+
+Rereading every day to compute them would grow with the history. The state
+behind the table is instead the runs of each product over the longest
+window, one row per stretch of crawls that saw the same price and promotion:
+
+    product_id, price, promoted, start, end
+
+A crawl extends or opens runs (shelf prices rarely change, so a product has
+one or two runs), runs ending before the longest window are dropped, and the
+windows are aggregated from the few rows left. The cost of an update and the
+size of both files follow the number of products, not the days of history.
+A run stands for every day from its first to its last crawl.
+
+Each retailer has `<base_path>/<retailer>.parquet` (the aggregates) and
+`<base_path>/state/<retailer>.parquet` (the runs).
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+from storage.files import move_into_place
+
+# Window lengths, in days
+WINDOWS = [7, 30, 90]
+
+STATE_SCHEMA = {
+    "product_id": "str",
+    "price": "float32",
+    "promoted": "bool",
+    "start": "datetime64[s]",
+    "end": "datetime64[s]",
+}
+
+AGGREGATE_SCHEMA = {
+    "product_id": "str",
+    "last_price": "float32",
+    "last_seen": "datetime64[s]",
+    "last_change": "datetime64[s]",
+    **{
+        f"{statistic}_{window}d": "float32"
+        for window in WINDOWS
+        for statistic in ("min", "max", "mean", "promo_share")
+    },
+}
+
+
+def _empty(schema):
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype) for column, dtype in schema.items()
+    })
+
+
+def window_aggregates(runs, date, window):
+    """
+    Aggregates the runs overlapping the `window` days up to `date`.
+
+    Returns:
+        pd.DataFrame: min, max, mean and promo_share of the window, indexed
+        by product_id.
+    """
+    first_day = date - pd.Timedelta(days=window - 1)
+    start = runs["start"].where(runs["start"] > first_day, first_day)
+    end = runs["end"].where(runs["end"] < date, date)
+    days = ((end - start).dt.days + 1).to_numpy()
+    inside = days > 0
+
+    price = runs["price"].to_numpy(dtype="float64")[inside]
+    days = days[inside]
+    weighted = pd.DataFrame({
+        "product_id": runs["product_id"].to_numpy()[inside],
+        "price": price,
+        "days": days,
+        "price_days": price * days,
+        "promo_days": runs["promoted"].to_numpy()[inside] * days,
+    }).groupby("product_id").agg(
+        min=("price", "min"), max=("price", "max"), days=("days", "sum"),
+        price_days=("price_days", "sum"), promo_days=("promo_days", "sum"))
+
+    return pd.DataFrame({
+        f"min_{window}d": weighted["min"],
+        f"max_{window}d": weighted["max"],
+        f"mean_{window}d": weighted["price_days"] / weighted["days"],
+        f"promo_share_{window}d": weighted["promo_days"] / weighted["days"],
+    })
+
+
+class RollingAggregates:
+    """
+    Maintains the per-retailer aggregate and run files under `base_path`.
+
+    Args:
+        base_path (str): Directory of the aggregates, with the runs under
+            `<base_path>/state`.
+    """
+
+    def __init__(self, base_path="data/aggregates"):
+        self.base_path = base_path
+
+    def _path(self, retailer):
+        return os.path.join(self.base_path, f"{retailer}.parquet")
+
+    def _state_path(self, retailer):
+        return os.path.join(self.base_path, "state", f"{retailer}.parquet")
+
+    @staticmethod
+    def _read(path, schema):
+        if not os.path.exists(path):
+            return _empty(schema)
+        return pd.read_parquet(path).astype(schema)
+
+    @staticmethod
+    def _write(df, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".aggregates-")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False, compression="zstd")
+            move_into_place(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, retailer):
+        """Returns the aggregates of every product of `retailer`."""
+        return self._read(self._path(retailer), AGGREGATE_SCHEMA)
+
+    def load_state(self, retailer):
+        """Returns the runs of `retailer` within the longest window."""
+        return self._read(self._state_path(retailer), STATE_SCHEMA)
+
+    def product(self, retailer, product_id):
+        """
+        Returns the aggregates of one product, as a Series (empty when
+        unknown).
+        """
+        aggregates = self.load(retailer)
+        rows = aggregates[aggregates["product_id"] == str(product_id)]
+        if rows.empty:
+            return pd.Series(dtype="object")
+        return rows.iloc[0]
+
+    @staticmethod
+    def merge_day(state, df, date):
+        """
+        Folds one crawl into the runs and drops the runs out of every window.
+
+        Args:
+            state (pd.DataFrame): Runs so far, see `STATE_SCHEMA`.
+            df (pd.DataFrame): The crawl rows, with "product_id", "price" and
+                "promotion".
+            date (pd.Timestamp): Crawl date.
+
+        Returns:
+            tuple: (updated runs, product_ids whose price changed today).
+        """
+        today = pd.DataFrame({
+            "product_id": df["product_id"].astype("str").to_numpy(),
+            "price": df["price"].astype("float32").to_numpy(),
+            "promoted": df["promotion"].notna().to_numpy(),
+        }).drop_duplicates(subset=["product_id"], ignore_index=True)
+
+        # Runs still open are the ones seen by the previous crawl
+        last_date = state["end"].max() if len(state) else None
+        is_open = (state["end"] == last_date).to_numpy()
+        merged = today.merge(
+            state[is_open].reset_index()[["index", "product_id", "price",
+                                          "promoted"]],
+            on="product_id", how="left", suffixes=("", "_open"))
+        seen_before = merged["index"].notna().to_numpy()
+        same_price = (merged["price"] == merged["price_open"]).to_numpy() | (
+            merged["price"].isna() & merged["price_open"].isna()).to_numpy()
+        unchanged = seen_before & same_price & (
+            merged["promoted"] == merged["promoted_open"]).to_numpy()
+
+        state = state.copy()
+        state.loc[merged.loc[unchanged, "index"].astype(int), "end"] = date
+        opened = merged.loc[~unchanged,
+                            ["product_id", "price", "promoted"]].assign(
+            start=date, end=date)
+        state = pd.concat([state, opened],
+                          ignore_index=True).astype(STATE_SCHEMA)
+
+        # Runs that ended before the longest window no longer count anywhere
+        horizon = date - pd.Timedelta(days=max(WINDOWS) - 1)
+        state = state[state["end"] >= horizon].reset_index(drop=True)
+        changed = merged.loc[seen_before & ~same_price, "product_id"]
+        return state, changed
+
+    def apply_day(self, df, retailer, date):
+        """
+        Updates a retailer's runs and aggregates with one full crawl.
+
+        Crawls are applied in date order: a crawl not newer than the last one
+        applied is ignored, which makes applying a day twice harmless.
+
+        Args:
+            df (pd.DataFrame): The retailer's rows of the crawl.
+            retailer (str): Retailer key.
+            date (str): Crawl date as YYYYMMDD.
+
+        Returns:
+            int: Number of products aggregated, or 0 when the crawl was
+            ignored.
+        """
+        date = pd.Timestamp(date)
+        state = self.load_state(retailer)
+        if len(state) and state["end"].max() >= date:
+            return 0
+        state, changed = self.merge_day(state, df, date)
+
+        # The latest run of every product gives its last price
+        latest = state.sort_values("end", kind="stable").drop_duplicates(
+            subset=["product_id"], keep="last").set_index("product_id")
+        previous = self.load(retailer).set_index("product_id")["last_change"]
+        last_change = previous.reindex(latest.index)
+        last_change[last_change.index.isin(changed)] = date
+
+        aggregates = pd.concat(
+            [pd.DataFrame({
+                "last_price": latest["price"],
+                "last_seen": latest["end"],
+                "last_change": last_change,
+            })] + [window_aggregates(state, date, window)
+                   for window in WINDOWS],
+            axis=1)
+        aggregates = aggregates.rename_axis("product_id").reset_index()
+
+        self._write(state, self._state_path(retailer))
+        self._write(aggregates.astype(AGGREGATE_SCHEMA), self._path(retailer))
+        return len(aggregates)
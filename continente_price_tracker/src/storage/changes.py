@@ -0,0 +1,237 @@
+"""
+Day-over-day price change events.
+
+Finding what changed used to mean loading two full days and comparing them.
+The detector keeps a compact state per retailer instead, one row per product
+as the previous crawl saw it:
+
+    product_id, cgid, price, promotion, row_hash, crawl_date
+
+where `row_hash` hashes the tracked columns (price, unit price, unit,
+promotion). A new crawl is hash-joined against it in one vectorized pass and
+only the differences are written out, as events:
+
+    new          product not in the state
+    removed      product of a crawled category missing from the crawl
+    price_up     higher price
+    price_down   lower price
+    changed      same price, different unit price, unit or promotion
+
+Events go to `<base_path>/<retailer>/<YYYYMMDD>.parquet`, so alerting and
+downstream loads only read the rows that changed. A retailer's first crawl
+only seeds the state. Products of categories missing from a crawl (a failed
+category, say) are kept in the state and not reported as removed.
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from storage.files import move_into_place
+from storage.history import TRACKED_COLUMNS
+
+STATE_SCHEMA = {
+    "product_id": "str",
+    "cgid": "str",
+    "price": "float32",
+    "promotion": "category",
+    "row_hash": "uint64",
+    "crawl_date": "datetime64[s]",
+}
+
+EVENT_SCHEMA = {
+    "source": "str",
+    "product_id": "str",
+    "cgid": "str",
+    "event": "category",
+    "old_price": "float32",
+    "new_price": "float32",
+    "old_promotion": "category",
+    "new_promotion": "category",
+    "date": "datetime64[s]",
+}
+
+EVENTS = ["new", "removed", "price_up", "price_down", "changed"]
+
+
+def _empty(schema):
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype) for column, dtype in schema.items()
+    })
+
+
+def row_hash(df):
+    """Hashes the tracked columns of every row into one uint64."""
+    return pd.util.hash_pandas_object(
+        df[TRACKED_COLUMNS].astype("object"), index=False).to_numpy()
+
+
+class ChangeDetector:
+    """
+    Compares each crawl with the previous one and records the differences.
+
+    Args:
+        base_path (str): Directory of the events, with the state files under
+            `<base_path>/state`.
+    """
+
+    def __init__(self, base_path="data/changes"):
+        self.base_path = base_path
+
+    def _state_path(self, retailer):
+        return os.path.join(self.base_path, "state", f"{retailer}.parquet")
+
+    def _events_path(self, retailer, date):
+        return os.path.join(self.base_path, retailer, f"{date}.parquet")
+
+    def load_state(self, retailer):
+        """Returns the products of `retailer` as its last crawl saw them."""
+        path = self._state_path(retailer)
+        if not os.path.exists(path):
+            return _empty(STATE_SCHEMA)
+        return pd.read_parquet(path).astype(STATE_SCHEMA)
+
+    @staticmethod
+    def _write(df, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".changes-")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False, compression="zstd")
+            move_into_place(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def diff(state, df, retailer, date):
+        """
+        Compares one crawl with the previous state.
+
+        Args:
+            state (pd.DataFrame): Previous state, see `STATE_SCHEMA`.
+            df (pd.DataFrame): The retailer's rows of the crawl, with
+                "product_id", "cgid" and the tracked columns.
+            retailer (str): Retailer key.
+            date (pd.Timestamp): Crawl date.
+
+        Returns:
+            tuple: (events, new state) as DataFrames.
+        """
+        today = df[["product_id", "cgid"] + TRACKED_COLUMNS].astype(
+            {"product_id": "str", "cgid": "str"}).drop_duplicates(
+                subset=["product_id"], ignore_index=True)
+        today["row_hash"] = row_hash(today)
+        today["crawl_date"] = date
+
+        # Nullable hashes, so products on one side only become NA instead of
+        # turning the column into (lossy) floats
+        merged = today[["product_id", "cgid", "price", "promotion",
+                        "row_hash"]].astype({"row_hash": "UInt64"}).merge(
+            state.astype({"row_hash": "UInt64"}), on="product_id",
+            how="outer", suffixes=("", "_old"), indicator=True)
+        is_new = (merged["_merge"] == "left_only").to_numpy()
+        is_kept = (merged["_merge"] == "both").to_numpy()
+        is_missing = (merged["_merge"] == "right_only").to_numpy()
+        # Only products of a category crawled today can have been removed
+        crawled = merged["cgid_old"].isin(today["cgid"].unique()).to_numpy()
+        is_removed = is_missing & crawled
+
+        old_price = merged["price_old"].to_numpy(dtype="float64")
+        new_price = merged["price"].to_numpy(dtype="float64")
+        is_changed = is_kept & (
+            merged["row_hash"] != merged["row_hash_old"]).fillna(
+                False).to_numpy(dtype=bool)
+        with np.errstate(invalid="ignore"):
+            went_up = new_price > old_price
+            went_down = new_price < old_price
+
+        event = np.select(
+            [is_new, is_removed, is_changed & went_up,
+             is_changed & went_down, is_changed],
+            EVENTS, default="")
+        changes = merged[event != ""]
+        events = pd.DataFrame({
+            "source": retailer,
+            "product_id": changes["product_id"].to_numpy(),
+            "cgid": changes["cgid"].fillna(changes["cgid_old"]).to_numpy(),
+            "event": event[event != ""],
+            "old_price": changes["price_old"].to_numpy(),
+            "new_price": changes["price"].to_numpy(),
+            "old_promotion":
+                changes["promotion_old"].astype("object").to_numpy(),
+            "new_promotion":
+                changes["promotion"].astype("object").to_numpy(),
+            "date": date,
+        }).astype(EVENT_SCHEMA)
+
+        # Today's products, plus the ones of categories that were not crawled
+        not_crawled = state[state["product_id"].isin(
+            merged.loc[is_missing & ~is_removed, "product_id"])]
+        new_state = pd.concat(
+            [today[list(STATE_SCHEMA)].astype(STATE_SCHEMA), not_crawled],
+            ignore_index=True).astype(STATE_SCHEMA)
+        return events, new_state
+
+    def apply_day(self, df, retailer, date):
+        """
+        Records the events of one retailer's crawl and moves its state on.
+
+        Crawls are applied in date order: a crawl not newer than the state is
+        ignored, which makes running the detector twice harmless.
+
+        Args:
+            df (pd.DataFrame): The retailer's rows of the crawl.
+            retailer (str): Retailer key.
+            date (str): Crawl date as YYYYMMDD.
+
+        Returns:
+            pd.DataFrame: The events, or None when the crawl was ignored.
+        """
+        state = self.load_state(retailer)
+        crawl_date = pd.Timestamp(date)
+        if len(state) and state["crawl_date"].max() >= crawl_date:
+            return None
+
+        events, new_state = self.diff(state, df, retailer, crawl_date)
+        if len(state):
+            self._write(events, self._events_path(retailer, date))
+        else:
+            # A first crawl has nothing to compare with
+            events = events.iloc[:0]
+        self._write(new_state, self._state_path(retailer))
+        return events
+
+    def events(self, date, retailers=None, kinds=None):
+        """
+        Loads the events recorded for the crawl of `date`.
+
+        Args:
+            date (str): Crawl date as YYYYMMDD.
+            retailers (list): Retailers to include; defaults to all.
+            kinds (list): Event kinds to keep, from `EVENTS`; defaults to all.
+
+        Returns:
+            pd.DataFrame: The events, see `EVENT_SCHEMA`.
+        """
+        frames = [_empty(EVENT_SCHEMA)]
+        for retailer in retailers or self.retailers():
+            path = self._events_path(retailer, date)
+            if os.path.exists(path):
+                frames.append(pd.read_parquet(path).astype(EVENT_SCHEMA))
+        events = pd.concat(frames, ignore_index=True).astype(EVENT_SCHEMA)
+        if kinds is not None:
+            events = events[events["event"].isin(kinds)].reset_index(
+                drop=True)
+        return events
+
+    def retailers(self):
+        """Lists the retailers with a recorded state."""
+        directory = os.path.join(self.base_path, "state")
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len(".parquet")]
+                      for name in os.listdir(directory)
+                      if name.endswith(".parquet"))
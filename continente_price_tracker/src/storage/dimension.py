@@ -0,0 +1,165 @@
+"""
+Product dimension: the static attributes of every product, stored once.
+
+Names, brands, category paths, image URLs and product links barely change,
+yet they used to be repeated in every daily row. The dimension keeps one row
+per (retailer, product_id) with the latest attributes, a hash of them and
+when they were first seen and last changed. A crawl only rewrites it when
+some product is new or has changed attributes; the daily facts then only
+need the product key.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+from schema import ATTRIBUTE_COLUMNS, PRODUCT_SCHEMA
+from storage.files import move_into_place
+
+KEY_COLUMNS = ["source", "product_id"]
+
+DIMENSION_SCHEMA = {
+    **{column: PRODUCT_SCHEMA[column]
+       for column in KEY_COLUMNS + ATTRIBUTE_COLUMNS},
+    "attributes_hash": "uint64",
+    "first_seen": "datetime64[s]",
+    "last_changed": "datetime64[s]",
+}
+
+
+def _empty_dimension():
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype)
+        for column, dtype in DIMENSION_SCHEMA.items()
+    })
+
+
+def attributes_hash(df):
+    """Hashes the attribute columns of every row into one uint64."""
+    return pd.util.hash_pandas_object(
+        df[ATTRIBUTE_COLUMNS].astype("object"), index=False).to_numpy()
+
+
+class ProductDimension:
+    """
+    Reads and upserts the per-retailer dimension files under `base_path`.
+
+    Args:
+        base_path (str): Directory holding one `<retailer>.parquet` per
+            retailer.
+    """
+
+    def __init__(self, base_path="data/dimension"):
+        self.base_path = base_path
+
+    def _path(self, retailer):
+        return os.path.join(self.base_path, f"{retailer}.parquet")
+
+    def load(self, retailer):
+        """Returns the dimension rows of `retailer`."""
+        path = self._path(retailer)
+        if not os.path.exists(path):
+            return _empty_dimension()
+        return pd.read_parquet(path).astype(DIMENSION_SCHEMA)
+
+    def hashes(self, retailer):
+        """
+        Returns the stored attribute hash of every product of `retailer`, as
+        a nullable UInt64 Series indexed by product_id.
+        """
+        path = self._path(retailer)
+        if not os.path.exists(path):
+            return pd.Series(dtype="UInt64", index=pd.Index([], dtype="str"))
+        df = pd.read_parquet(path, columns=["product_id", "attributes_hash"])
+        return pd.Series(df["attributes_hash"].to_numpy(), dtype="UInt64",
+                         index=df["product_id"].astype("str").to_numpy())
+
+    def _save(self, retailer, dimension):
+        os.makedirs(self.base_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path,
+                                        prefix=".dimension-")
+        os.close(fd)
+        try:
+            dimension.to_parquet(tmp_path, index=False, compression="zstd")
+            move_into_place(tmp_path, self._path(retailer))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def upsert(self, df, retailer, date):
+        """
+        Adds new products and updates the ones whose attributes changed.
+
+        Products whose stored attributes were last changed after `date` are
+        left alone, so importing an older crawl (a backfill or a reparse)
+        never brings back outdated attributes.
+
+        Args:
+            df (pd.DataFrame): Rows in the product schema.
+            retailer (str): Retailer key.
+            date (str): Crawl date as YYYYMMDD.
+
+        Returns:
+            int: Number of products inserted or updated; the file is only
+            rewritten when it is not zero.
+        """
+        incoming = df[ATTRIBUTE_COLUMNS].assign(
+            source=retailer, product_id=df["product_id"].astype("str"))
+        incoming["attributes_hash"] = attributes_hash(incoming)
+        incoming = incoming.drop_duplicates(subset=["product_id"], keep="last")
+
+        dimension = self.load(retailer)
+        # Nullable hashes, so products missing from the dimension become NA
+        # instead of turning the column into (lossy) floats
+        previous = dimension[
+            ["product_id", "attributes_hash", "first_seen",
+             "last_changed"]].astype(
+                {"product_id": "str", "attributes_hash": "UInt64"})
+        merged = incoming.merge(previous, on="product_id", how="left",
+                                suffixes=("", "_previous"))
+        date = pd.Timestamp(date)
+        is_changed = (merged["attributes_hash"]
+                      != merged["attributes_hash_previous"]).fillna(True)
+        is_newer = ~(merged["last_changed"] > date)
+        changed = merged[is_changed.to_numpy(dtype=bool)
+                         & is_newer.to_numpy(dtype=bool)].copy()
+        if changed.empty:
+            return 0
+
+        changed["first_seen"] = changed["first_seen"].fillna(date)
+        changed["last_changed"] = date
+
+        kept = dimension[~dimension["product_id"].astype("str").isin(
+            changed["product_id"])]
+        updated = pd.concat(
+            [kept.astype("object"),
+             changed[list(DIMENSION_SCHEMA)].astype("object")],
+            ignore_index=True).astype(DIMENSION_SCHEMA)
+        self._save(retailer, updated)
+        return len(changed)
+
+    def attach(self, facts, columns=None):
+        """
+        Joins product attributes onto daily facts by (source, product_id).
+
+        Args:
+            facts (pd.DataFrame): Rows with at least `source` and `product_id`.
+            columns (list): Attribute columns to add; defaults to all of them.
+
+        Returns:
+            pd.DataFrame: `facts` with the attribute columns added, in order.
+        """
+        columns = list(columns or ATTRIBUTE_COLUMNS)
+        key_types = {column: "str" for column in KEY_COLUMNS}
+        dimension = pd.concat(
+            [self.load(retailer)[KEY_COLUMNS + columns].astype(key_types)
+             for retailer in facts["source"].astype("str").unique()] +
+            [_empty_dimension()[KEY_COLUMNS + columns].astype(key_types)],
+            ignore_index=True)
+
+        joined = facts.drop(columns=[c for c in columns if c in facts.columns])
+        joined = joined.astype(key_types).merge(dimension, on=KEY_COLUMNS,
+                                                how="left")
+        return joined.astype({
+            column: PRODUCT_SCHEMA[column] for column in KEY_COLUMNS + columns
+        })
@@ -0,0 +1,24 @@
+"""
+Atomic file replacement shared by the stores.
+
+Every store writes a hidden temporary file next to its target and moves it
+into place, so readers never see a partial file. `tempfile.mkstemp` creates
+that file readable by its owner only; `move_into_place` gives it the usual
+permissions first, so other users (a dashboard, a backup job) can still
+read what the scrapers write.
+"""
+import os
+
+# Read once, at import: os.umask can only be read by setting it, which is
+# not safe once other threads are writing files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Mode of the published files, before the umask
+FILE_MODE = 0o644
+
+
+def move_into_place(tmp_path, path):
+    """Gives `tmp_path` the usual file permissions and renames it to `path`."""
+    os.chmod(tmp_path, FILE_MODE & ~_UMASK)
+    os.replace(tmp_path, path)
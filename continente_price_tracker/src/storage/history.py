@@ -0,0 +1,262 @@
+"""
+Change-only price history (SCD type 2).
+
+Most shelf prices are the same from one crawl to the next, so instead of
+keeping every daily row the history keeps one row per validity interval:
+
+    source, cgid, product_id, price, unit_price, unit, promotion,
+    valid_from, valid_to
+
+An interval is extended while a product is seen again with the same price,
+unit price and promotion. A change closes it and opens a new one, and so
+does a product that disappears from its category and comes back later, so
+the gaps between intervals record availability. `valid_to` is the last
+crawl that saw the interval, inclusive.
+
+Each retailer's intervals live in one small Parquet file,
+`<base_path>/<retailer>.parquet`, from which any day's snapshot can be
+rebuilt. A run folds each retailer's day in once, when it is over, so
+the file is rewritten once per retailer and day.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+from storage.files import move_into_place
+
+# Columns that identify a product within a category
+KEY_COLUMNS = ["source", "cgid", "product_id"]
+
+# Columns whose change opens a new interval
+TRACKED_COLUMNS = ["price", "unit_price", "unit", "promotion"]
+
+HISTORY_SCHEMA = {
+    "source": "category",
+    "cgid": "category",
+    "product_id": "category",
+    "price": "float32",
+    "unit_price": "float32",
+    "unit": "category",
+    "promotion": "category",
+    "valid_from": "datetime64[s]",
+    "valid_to": "datetime64[s]",
+}
+
+
+def _empty_history():
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype)
+        for column, dtype in HISTORY_SCHEMA.items()
+    })
+
+
+def _same(left, right):
+    # Missing values (no promotion, no unit price) compare equal to each other
+    return (left == right) | (left.isna() & right.isna())
+
+
+class PriceHistory:
+    """
+    Reads and maintains the per-retailer interval files under `base_path`.
+
+    Args:
+        base_path (str): Directory holding one `<retailer>.parquet` per
+            retailer.
+    """
+
+    def __init__(self, base_path="data/history"):
+        self.base_path = base_path
+
+    def _path(self, retailer):
+        return os.path.join(self.base_path, f"{retailer}.parquet")
+
+    def load(self, retailer):
+        """Returns every interval recorded for `retailer`."""
+        path = self._path(retailer)
+        if not os.path.exists(path):
+            return _empty_history()
+        return pd.read_parquet(path).astype(HISTORY_SCHEMA)
+
+    def _save(self, retailer, history):
+        os.makedirs(self.base_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path,
+                                        prefix=".history-")
+        os.close(fd)
+        try:
+            history.to_parquet(tmp_path, index=False, compression="zstd")
+            move_into_place(tmp_path, self._path(retailer))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def merge_day(history, df, date):
+        """
+        Folds one crawl of one category into its intervals.
+
+        Args:
+            history (pd.DataFrame): Intervals of the category so far.
+            df (pd.DataFrame): The category rows of the crawl, in the product
+                schema.
+            date (pd.Timestamp): Crawl date.
+
+        Returns:
+            pd.DataFrame: The updated intervals.
+        """
+        today = df[KEY_COLUMNS + TRACKED_COLUMNS].drop_duplicates(
+            subset=KEY_COLUMNS).astype(
+                {column: HISTORY_SCHEMA[column]
+                 for column in KEY_COLUMNS + TRACKED_COLUMNS})
+        for column in KEY_COLUMNS:
+            today[column] = today[column].astype("str")
+
+        # Intervals still open are the ones seen by the previous crawl
+        last_date = history["valid_to"].max() if len(history) else None
+        if last_date is not None:
+            is_open = history["valid_to"] == last_date
+        else:
+            is_open = pd.Series(False, index=history.index)
+        open_intervals = history[is_open].copy()
+        for column in KEY_COLUMNS:
+            open_intervals[column] = open_intervals[column].astype("str")
+
+        merged = today.merge(open_intervals.reset_index(),
+                             on=KEY_COLUMNS,
+                             how="left",
+                             suffixes=("", "_open"),
+                             indicator=True)
+        seen_before = merged["_merge"] == "both"
+        unchanged = seen_before.copy()
+        for column in TRACKED_COLUMNS:
+            unchanged &= _same(merged[column].astype("object"),
+                               merged[f"{column}_open"].astype("object"))
+
+        history = history.copy()
+        extended = merged.loc[unchanged, "index"].astype(int)
+        history.loc[extended, "valid_to"] = date
+
+        opened = merged.loc[~unchanged, KEY_COLUMNS + TRACKED_COLUMNS].copy()
+        opened["valid_from"] = date
+        opened["valid_to"] = date
+
+        return pd.concat([history, opened],
+                         ignore_index=True).astype(HISTORY_SCHEMA)
+
+    def apply_category(self, df, retailer, date, cgid):
+        """
+        Records one saved category of one crawl.
+
+        Crawls are applied in date order: a crawl not newer than the last one
+        recorded for the category is ignored, which makes re-saving a
+        category harmless.
+
+        Args:
+            df (pd.DataFrame): The category rows, in the product schema.
+            retailer (str): Retailer key.
+            date (str): Crawl date as YYYYMMDD.
+            cgid (str): The category.
+
+        Returns:
+            bool: Whether the crawl was recorded.
+        """
+        return bool(self.apply_day({cgid: df}, retailer, date))
+
+    def apply_day(self, categories, retailer, date):
+        """
+        Records several saved categories of one crawl, rewriting the
+        retailer's file once. Same rules as `apply_category`.
+
+        Args:
+            categories (dict): {cgid: category rows in the product schema}.
+            retailer (str): Retailer key.
+            date (str): Crawl date as YYYYMMDD.
+
+        Returns:
+            list: The categories recorded.
+        """
+        date = pd.Timestamp(date)
+        history = self.load(retailer)
+        recorded = []
+        updated = []
+        for cgid, df in categories.items():
+            in_category = (history["cgid"] == cgid).to_numpy()
+            category_history = history[in_category]
+            if (len(category_history)
+                    and category_history["valid_to"].max() >= date):
+                continue
+            rows = df.assign(source=retailer, cgid=cgid)
+            updated.append(self.merge_day(
+                category_history.reset_index(drop=True), rows, date))
+            recorded.append(cgid)
+
+        if recorded:
+            kept = history[~history["cgid"].isin(recorded).to_numpy()]
+            self._save(retailer, pd.concat(
+                [kept] + updated, ignore_index=True).astype(HISTORY_SCHEMA))
+        return recorded
+
+    def snapshot(self, date, retailers=None):
+        """
+        Rebuilds the prices of every product as seen by the crawl of `date`.
+
+        Args:
+            date (str): Day to rebuild, as YYYYMMDD.
+            retailers (list): Retailers to include; defaults to every
+                recorded one.
+
+        Returns:
+            pd.DataFrame: One row per product and category, with the key,
+            the tracked columns and `tracking_date`.
+        """
+        date = pd.Timestamp(date)
+        frames = []
+        for retailer in retailers or self.retailers():
+            history = self.load(retailer)
+            valid = ((history["valid_from"] <= date)
+                     & (history["valid_to"] >= date))
+            frames.append(history.loc[valid, KEY_COLUMNS + TRACKED_COLUMNS])
+        if not frames:
+            return _empty_history()[KEY_COLUMNS + TRACKED_COLUMNS].assign(
+                tracking_date=pd.Series(dtype="datetime64[s]"))
+        snapshot = pd.concat(frames, ignore_index=True)
+        snapshot["tracking_date"] = date
+        return snapshot
+
+    def product_history(self, retailer, product_id):
+        """Returns the intervals of one product, oldest first."""
+        history = self.load(retailer)
+        rows = history[history["product_id"] == str(product_id)]
+        return rows.sort_values("valid_from").reset_index(drop=True)
+
+    def retailers(self):
+        """Lists the retailers with a recorded history."""
+        if not os.path.isdir(self.base_path):
+            return []
+        return sorted(name[:-len(".parquet")]
+                      for name in os.listdir(self.base_path)
+                      if name.endswith(".parquet"))
+
+    def rebuild(self, store, retailer):
+        """
+        Recomputes a retailer's history from every day in a `ParquetStore`.
+
+        Returns:
+            int: Number of categories recorded.
+        """
+        path = self._path(retailer)
+        if os.path.exists(path):
+            os.remove(path)
+        recorded = 0
+        # One read and one rewrite per day
+        dates = {date for _, date, _ in store.partitions(retailer)}
+        for date in sorted(dates):
+            df = store.read(columns=["cgid", "product_id"] + TRACKED_COLUMNS,
+                            retailers=[retailer],
+                            dates=[date])
+            categories = {
+                cgid: rows.drop(columns="cgid")
+                for cgid, rows in df.groupby("cgid", observed=True)
+            }
+            recorded += len(self.apply_day(categories, retailer, date))
+        return recorded
@@ -0,0 +1,276 @@
+"""
+Dense day × product price matrix on disk, for time-series analytics.
+
+Basket indices, correlations between retailers or inflation curves are
+matrix operations. The matrix keeps every price of every crawl in one
+float32 file, read through a NumPy memmap so that months of history are
+sliced without loading them:
+
+    prices-<capacity>.f32   one row per crawl day, `capacity` float32 columns,
+                            NaN where a product was not seen
+    products.parquet        source, product_id of every column, in order
+    days.parquet            date of every row, in order
+
+Products get a stable column the first time they are seen, and each crawl
+appends one row, so a new day only writes its own row. The file is laid out
+by day for that reason: a product-major file would need every one of its
+rows rewritten to add a day's column. Rows are wider than
+the products known (the capacity, in the file name); when new products no
+longer fit, the file is rewritten once with twice the capacity. The day map
+is written last, so a row that was not completely recorded is never read.
+
+    matrix = PriceMatrix()
+    prices, dates, products = matrix.window("20241101", "20241130",
+                                            retailers=["continente"])
+    seen_all_month = ~np.isnan(prices).any(axis=0)
+    basket = np.nanmean(prices[:, seen_all_month] / prices[0, seen_all_month],
+                        axis=1)
+"""
+import glob
+import os
+import re
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from storage.files import move_into_place
+
+PRODUCTS_SCHEMA = {
+    "source": "str",
+    "product_id": "str",
+}
+
+DAYS_SCHEMA = {
+    "date": "datetime64[s]",
+}
+
+# Columns of a new matrix file
+INITIAL_CAPACITY = 1024
+
+# Rows copied at a time when the file grows
+_COPY_ROWS = 64
+
+_FILE_PATTERN = re.compile(r"^prices-(\d+)\.f32$")
+
+
+def _empty(schema):
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype) for column, dtype in schema.items()
+    })
+
+
+class PriceMatrix:
+    """
+    Appends crawl days to, and reads, the price matrix under `base_path`.
+
+    Args:
+        base_path (str): Directory of the matrix and its index maps.
+    """
+
+    def __init__(self, base_path="data/matrix"):
+        self.base_path = base_path
+
+    def _map_path(self, name):
+        return os.path.join(self.base_path, f"{name}.parquet")
+
+    def _matrix_file(self):
+        # The widest file is the current one; a narrower one is only left
+        # behind by an interrupted growth
+        files = []
+        for path in glob.glob(os.path.join(self.base_path, "prices-*.f32")):
+            match = _FILE_PATTERN.match(os.path.basename(path))
+            if match:
+                files.append((int(match.group(1)), path))
+        return max(files) if files else (0, None)
+
+    def _read_map(self, name, schema):
+        path = self._map_path(name)
+        if not os.path.exists(path):
+            return _empty(schema)
+        return pd.read_parquet(path).astype(schema)
+
+    def _write_map(self, name, df):
+        os.makedirs(self.base_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path,
+                                        prefix=f".{name}-")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            move_into_place(tmp_path, self._map_path(name))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def products(self):
+        """
+        Returns the (source, product_id) of every column, in column order.
+        """
+        return self._read_map("products", PRODUCTS_SCHEMA)
+
+    def dates(self):
+        """Returns the date of every row, in row order."""
+        return pd.DatetimeIndex(self._read_map("days", DAYS_SCHEMA)["date"])
+
+    def open(self):
+        """
+        Maps the matrix read-only.
+
+        Returns:
+            np.ndarray: A (days, products) float32 memmap view; nothing is
+            read until it is indexed.
+        """
+        # The maps first: the file holding their rows and columns is in
+        # place before they are written
+        rows, columns = len(self.dates()), len(self.products())
+        while rows:
+            capacity, path = self._matrix_file()
+            if path is None:
+                break
+            try:
+                matrix = np.memmap(path, dtype="float32", mode="r",
+                                   shape=(rows, capacity))
+            except FileNotFoundError:
+                # A growth replaced the file after it was listed; the wider
+                # one is in place by now
+                continue
+            return matrix[:, :columns]
+        return np.full((rows, columns), np.nan, dtype="float32")
+
+    def _grow(self, capacity, path, rows, needed):
+        # Rewrites the file with at least `needed` columns, copying the rows
+        # a few at a time
+        new_capacity = max(needed, 2 * capacity, INITIAL_CAPACITY)
+        new_path = os.path.join(self.base_path, f"prices-{new_capacity}.f32")
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path,
+                                        prefix=".prices-")
+        os.close(fd)
+        try:
+            with open(tmp_path, "wb") as out:
+                if path is not None and rows:
+                    old = np.memmap(path, dtype="float32", mode="r",
+                                    shape=(rows, capacity))
+                    for start in range(0, rows, _COPY_ROWS):
+                        block = np.full(
+                            (min(_COPY_ROWS, rows - start), new_capacity),
+                            np.nan, dtype="float32")
+                        block[:, :capacity] = old[start:start + _COPY_ROWS]
+                        out.write(block.tobytes())
+                    del old
+            move_into_place(tmp_path, new_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if path is not None:
+            os.remove(path)
+        return new_capacity, new_path
+
+    def append_day(self, df, date):
+        """
+        Writes one crawl day, giving new products their column.
+
+        A day already in the matrix has its row overwritten, so writing a day
+        twice is harmless.
+
+        Args:
+            df (pd.DataFrame): The day's rows of every retailer, with
+                "source", "product_id" and "price".
+            date (str): Crawl date as YYYYMMDD.
+
+        Returns:
+            int: Number of prices written.
+        """
+        os.makedirs(self.base_path, exist_ok=True)
+        today = pd.DataFrame({
+            "source": df["source"].astype("str").to_numpy(),
+            "product_id": df["product_id"].astype("str").to_numpy(),
+            "price": df["price"].astype("float32").to_numpy(),
+        }).drop_duplicates(subset=["source", "product_id"], ignore_index=True)
+
+        products = self.products()
+        known = pd.MultiIndex.from_frame(products)
+        columns = known.get_indexer(
+            pd.MultiIndex.from_frame(today[["source", "product_id"]]))
+        is_new = columns < 0
+        if is_new.any():
+            columns[is_new] = len(products) + np.arange(is_new.sum())
+            products = pd.concat(
+                [products, today.loc[is_new, ["source", "product_id"]]],
+                ignore_index=True)
+
+        days = self._read_map("days", DAYS_SCHEMA)
+        date = pd.Timestamp(date)
+        existing = np.flatnonzero(
+            days["date"].to_numpy() == date.to_datetime64())
+        row = int(existing[0]) if len(existing) else len(days)
+
+        capacity, path = self._matrix_file()
+        if len(products) > capacity:
+            capacity, path = self._grow(capacity, path, len(days),
+                                        len(products))
+
+        values = np.full(capacity, np.nan, dtype="float32")
+        values[columns] = today["price"].to_numpy()
+        with open(path, "r+b") as matrix:
+            matrix.seek(row * capacity * values.itemsize)
+            matrix.write(values.tobytes())
+
+        # Columns before rows: a day is only visible once its row is complete
+        self._write_map("products", products)
+        if not len(existing):
+            self._write_map("days", pd.concat(
+                [days, pd.DataFrame({"date": [date]})],
+                ignore_index=True).astype(DAYS_SCHEMA))
+        return len(today)
+
+    def series(self, retailer, product_id):
+        """Returns the prices of one product by date (NaN where not seen)."""
+        products = self.products()
+        column = np.flatnonzero(
+            (products["source"] == retailer).to_numpy()
+            & (products["product_id"] == str(product_id)).to_numpy())
+        dates = self.dates()
+        if not len(column):
+            return pd.Series(np.nan, index=dates, dtype="float32")
+        series = pd.Series(np.asarray(self.open()[:, column[0]]),
+                           index=dates)
+        return series.sort_index()
+
+    def window(self, start_date=None, end_date=None, retailers=None):
+        """
+        Reads the rows of a date range, and optionally only some retailers.
+
+        Args:
+            start_date (str): First day, as YYYYMMDD (inclusive).
+            end_date (str): Last day, as YYYYMMDD (inclusive).
+            retailers (list): Retailers whose columns are kept; defaults to
+                all.
+
+        Returns:
+            tuple: (np.ndarray of shape (days, products), pd.DatetimeIndex of
+            the rows, pd.DataFrame of the columns' source and product_id),
+            rows in date order.
+        """
+        dates = self.dates()
+        in_range = np.ones(len(dates), dtype=bool)
+        if start_date is not None:
+            in_range &= dates >= pd.Timestamp(start_date)
+        if end_date is not None:
+            in_range &= dates <= pd.Timestamp(end_date)
+        rows = np.flatnonzero(in_range)
+        rows = rows[np.argsort(dates[rows], kind="stable")]
+
+        products = self.products()
+        matrix = self.open()
+        # Days are appended in order, so a range is usually one slice of the
+        # file
+        if len(rows) and (np.diff(rows) == 1).all():
+            prices = matrix[rows[0]:rows[-1] + 1]
+        else:
+            prices = matrix[rows]
+        if retailers is not None:
+            columns = np.flatnonzero(
+                products["source"].isin(retailers).to_numpy())
+            prices = prices[:, columns]
+            products = products.iloc[columns].reset_index(drop=True)
+        return np.asarray(prices), dates[rows], products
@@ -0,0 +1,463 @@
+"""
+Category writer shared by the scrapers.
+
+`save_category` stores a finished category in the configured output format
+(see `config.OUTPUT_FORMAT`): the partitioned Parquet store by default, or the
+original per-category CSV files under data/raw.
+
+Once a run is over, `load_warehouse` copies whole days into the DuckDB
+warehouse, `update_history` folds them into the price history,
+`detect_changes` records what changed since the previous crawl,
+`update_aggregates` rolls the per-product price windows forward,
+`update_matrix` appends the days to the price matrix,
+`update_product_index` indexes where each product's rows are and
+`update_matches` links the new products to the other retailers.
+`product_history` reads one product's rows through that index.
+
+With the product dimension enabled, the Parquet files only hold the daily
+facts and `read_products` joins the attributes back when they are asked for.
+"""
+import logging
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+import config
+from matching import ProductMatcher
+from schema import ATTRIBUTE_COLUMNS, FACT_COLUMNS, PRODUCT_SCHEMA, RETAILERS
+from storage.aggregates import RollingAggregates
+from storage.changes import ChangeDetector
+from storage.dimension import ProductDimension
+from storage.history import TRACKED_COLUMNS, PriceHistory
+from storage.matrix import PriceMatrix
+from storage.parquet import ParquetStore
+from storage.product_index import ProductIndex
+from storage.warehouse import Warehouse
+
+logger = logging.getLogger(__name__)
+
+# Stores shared by every scraper of the process, created on first use
+_store = None
+_history = None
+_dimension = None
+_warehouse = None
+_matcher = None
+_changes = None
+_aggregates = None
+_matrix = None
+_product_index = None
+
+
+def get_store():
+    """
+    Returns the process-wide Parquet store rooted at `config.PARQUET_PATH`.
+    """
+    global _store
+    if _store is None:
+        columns = FACT_COLUMNS if config.DIMENSION_ENABLED else None
+        _store = ParquetStore(config.PARQUET_PATH, columns=columns)
+    return _store
+
+
+def get_dimension():
+    """
+    Returns the process-wide product dimension, or None when it is disabled
+    (see `config.DIMENSION_ENABLED`).
+    """
+    global _dimension
+    if not config.DIMENSION_ENABLED:
+        return None
+    if _dimension is None:
+        _dimension = ProductDimension(config.DIMENSION_PATH)
+    return _dimension
+
+
+def get_history():
+    """
+    Returns the process-wide price history, or None when it is disabled (see
+    `config.HISTORY_ENABLED`) or the output is not the Parquet store.
+    """
+    global _history
+    if not config.HISTORY_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _history is None:
+        _history = PriceHistory(config.HISTORY_PATH)
+    return _history
+
+
+def update_history(dates, retailers=None):
+    """
+    Folds the given crawl days (YYYYMMDD) of the Parquet store into the price
+    history, in date order, rewriting each retailer's file once per day. A
+    failure is logged and leaves the previous history in place.
+
+    Returns:
+        dict: Categories recorded per (retailer, day).
+    """
+    history = get_history()
+    if history is None:
+        return {}
+    columns = ["cgid", "product_id"] + TRACKED_COLUMNS
+    recorded = {}
+    for date in sorted(set(dates)):
+        for retailer in retailers or RETAILERS:
+            try:
+                df = get_store().read(columns=columns, retailers=[retailer],
+                                      dates=[date])
+                if df.empty:
+                    continue
+                categories = {
+                    cgid: rows.drop(columns="cgid")
+                    for cgid, rows in df.groupby("cgid", observed=True)
+                }
+                cgids = history.apply_day(categories, retailer, date)
+                if cgids:
+                    recorded[(retailer, date)] = len(cgids)
+                    logger.info(f"Recorded {len(cgids)} {retailer} "
+                                f"categories of {date} in the price history")
+            except Exception as e:
+                logger.error(f"Error updating the {retailer} price history "
+                             f"with {date}: {str(e)}", exc_info=True)
+    return recorded
+
+
+def get_warehouse():
+    """
+    Returns the process-wide DuckDB warehouse, or None when it is disabled
+    (see `config.WAREHOUSE_ENABLED`) or the output is not the Parquet store.
+    """
+    global _warehouse
+    if not config.WAREHOUSE_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _warehouse is None:
+        _warehouse = Warehouse(config.WAREHOUSE_PATH)
+    return _warehouse
+
+
+def load_warehouse(dates, retailers=None):
+    """
+    Loads the given crawl days (YYYYMMDD) of the Parquet store, attributes
+    included, into the warehouse, one transaction per day. A failure is
+    logged and leaves the scraped files untouched.
+
+    Returns:
+        dict: Rows loaded per day that was loaded.
+    """
+    warehouse = get_warehouse()
+    if warehouse is None:
+        return {}
+    retailers = list(retailers or RETAILERS)
+    loaded = {}
+    for date in sorted(set(dates)):
+        try:
+            df = read_products(retailers=retailers, dates=[date])
+            loaded[date] = warehouse.load_frame(df, date, retailers)
+            logger.info(f"Loaded {loaded[date]} rows of {date} into the "
+                        f"warehouse {warehouse.path}")
+        except Exception as e:
+            logger.error(f"Error loading {date} into the warehouse: "
+                         f"{str(e)}", exc_info=True)
+    return loaded
+
+
+def get_change_detector():
+    """
+    Returns the process-wide change detector, or None when it is disabled
+    (see `config.CHANGES_ENABLED`) or the output is not the Parquet store.
+    """
+    global _changes
+    if not config.CHANGES_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _changes is None:
+        _changes = ChangeDetector(config.CHANGES_PATH)
+    return _changes
+
+
+def detect_changes(dates, retailers=None):
+    """
+    Compares the given crawl days (YYYYMMDD) of the Parquet store with the
+    crawl before them, in date order, and records the events. A failure is
+    logged and leaves the detector's state where it was.
+
+    Returns:
+        dict: Events recorded per (retailer, day).
+    """
+    detector = get_change_detector()
+    if detector is None:
+        return {}
+    columns = ["cgid", "product_id"] + TRACKED_COLUMNS
+    recorded = {}
+    for date in sorted(set(dates)):
+        for retailer in retailers or RETAILERS:
+            try:
+                df = get_store().read(columns=columns, retailers=[retailer],
+                                      dates=[date])
+                if df.empty:
+                    continue
+                events = detector.apply_day(df, retailer, date)
+                if events is not None:
+                    recorded[(retailer, date)] = len(events)
+                    logger.info(f"Recorded {len(events)} {retailer} changes "
+                                f"of {date}")
+            except Exception as e:
+                logger.error(f"Error detecting the {retailer} changes of "
+                             f"{date}: {str(e)}", exc_info=True)
+    return recorded
+
+
+def get_aggregates():
+    """
+    Returns the process-wide rolling aggregates, or None when they are
+    disabled (see `config.AGGREGATES_ENABLED`) or the output is not the
+    Parquet store.
+    """
+    global _aggregates
+    if not config.AGGREGATES_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _aggregates is None:
+        _aggregates = RollingAggregates(config.AGGREGATES_PATH)
+    return _aggregates
+
+
+def update_aggregates(dates, retailers=None):
+    """
+    Rolls the per-product aggregates forward with the given crawl days
+    (YYYYMMDD) of the Parquet store, in date order. A failure is logged and
+    leaves the previous aggregates in place.
+
+    Returns:
+        dict: Products aggregated per (retailer, day).
+    """
+    aggregates = get_aggregates()
+    if aggregates is None:
+        return {}
+    updated = {}
+    for date in sorted(set(dates)):
+        for retailer in retailers or RETAILERS:
+            try:
+                df = get_store().read(
+                    columns=["product_id", "price", "promotion"],
+                    retailers=[retailer], dates=[date])
+                if df.empty:
+                    continue
+                products = aggregates.apply_day(df, retailer, date)
+                if products:
+                    updated[(retailer, date)] = products
+                    logger.info(f"Updated the aggregates of {products} "
+                                f"{retailer} products with {date}")
+            except Exception as e:
+                logger.error(f"Error updating the {retailer} aggregates with "
+                             f"{date}: {str(e)}", exc_info=True)
+    return updated
+
+
+def get_matrix():
+    """
+    Returns the process-wide price matrix, or None when it is disabled (see
+    `config.MATRIX_ENABLED`) or the output is not the Parquet store.
+    """
+    global _matrix
+    if not config.MATRIX_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _matrix is None:
+        _matrix = PriceMatrix(config.MATRIX_PATH)
+    return _matrix
+
+
+def update_matrix(dates):
+    """
+    Writes the given crawl days (YYYYMMDD) of the Parquet store, every
+    retailer included, into the price matrix. A failure is logged and leaves
+    the other days in place.
+
+    Returns:
+        dict: Prices written per day.
+    """
+    matrix = get_matrix()
+    if matrix is None:
+        return {}
+    written = {}
+    for date in sorted(set(dates)):
+        try:
+            df = get_store().read(columns=["source", "product_id", "price"],
+                                  dates=[date])
+            if df.empty:
+                continue
+            written[date] = matrix.append_day(df, date)
+            logger.info(f"Wrote {written[date]} prices of {date} into the "
+                        f"matrix {matrix.base_path}")
+        except Exception as e:
+            logger.error(f"Error writing {date} into the price matrix: "
+                         f"{str(e)}", exc_info=True)
+    return written
+
+
+def get_product_index():
+    """
+    Returns the process-wide product index, or None when it is disabled (see
+    `config.INDEX_ENABLED`) or the output is not the Parquet store.
+    """
+    global _product_index
+    if not config.INDEX_ENABLED or config.OUTPUT_FORMAT != "parquet":
+        return None
+    if _product_index is None:
+        _product_index = ProductIndex(get_store(), config.INDEX_PATH)
+    return _product_index
+
+
+def update_product_index(dates, retailers=None):
+    """
+    Indexes the given crawl days (YYYYMMDD) of the Parquet store. A failure
+    is logged and leaves the previous index in place.
+
+    Returns:
+        dict: Entries written per retailer.
+    """
+    index = get_product_index()
+    if index is None:
+        return {}
+    indexed = {}
+    for retailer in retailers or RETAILERS:
+        try:
+            indexed[retailer] = index.update(retailer, dates)
+            logger.info(f"Indexed {indexed[retailer]} {retailer} rows of "
+                        f"{', '.join(sorted(set(dates)))}")
+        except Exception as e:
+            logger.error(f"Error updating the {retailer} product index: "
+                         f"{str(e)}", exc_info=True)
+    return indexed
+
+
+def get_matcher():
+    """
+    Returns the process-wide cross-retailer matcher, or None when it is
+    disabled (see `config.MATCHING_ENABLED`) or there is no product dimension
+    to match from.
+    """
+    global _matcher
+    if not config.MATCHING_ENABLED or not config.DIMENSION_ENABLED:
+        return None
+    if _matcher is None:
+        _matcher = ProductMatcher(config.MATCHES_PATH, config.MATCH_MIN_SCORE)
+    return _matcher
+
+
+def update_matches(date):
+    """
+    Matches the products added to or changed in the dimension since the last
+    update against the other retailers. A failure is logged and leaves the
+    previous match table in place.
+
+    Returns:
+        int: Number of products matched.
+    """
+    matcher = get_matcher()
+    if matcher is None:
+        return 0
+    try:
+        dimension = get_dimension()
+        products = pd.concat(
+            [dimension.load(retailer).astype({"source": "str"})
+             for retailer in RETAILERS], ignore_index=True)
+        matched = matcher.update(products, date)
+        logger.info(f"Matched {matched} new or changed products into "
+                    f"{matcher.base_path}")
+        return matched
+    except Exception as e:
+        logger.error(f"Error updating the product matches: {str(e)}",
+                     exc_info=True)
+        return 0
+
+
+def save_category(df, retailer, date, cgid, csv_path):
+    """
+    Saves one scraped category.
+
+    Args:
+        df (pd.DataFrame): Rows in the canonical product schema.
+        retailer (str): Retailer key ("continente", "pingo_doce", "auchan").
+        date (str): Crawl date as YYYYMMDD.
+        cgid (str): Category the rows were scraped from.
+        csv_path (str): File the category is written to in "csv" mode.
+
+    Returns:
+        str: Path of the written file.
+    """
+    # The attributes go first, so the facts never reference an unknown product
+    dimension = get_dimension()
+    if dimension is not None:
+        dimension.upsert(df, retailer, date)
+
+    if config.OUTPUT_FORMAT == "csv":
+        df.to_csv(csv_path, index=False)
+        file_path = csv_path
+    elif config.OUTPUT_FORMAT == "parquet":
+        file_path = get_store().write_category(df, retailer, date, cgid)
+    else:
+        raise ValueError(f"Unknown output format: {config.OUTPUT_FORMAT}")
+    return file_path
+
+
+def read_products(columns=None, **filters):
+    """
+    Loads products from the Parquet store, adding the product attributes from
+    the dimension when some are requested.
+
+    Args:
+        columns (list): Product schema columns to load; defaults to all of
+            them.
+        **filters: Partition and row filters, see `ParquetStore.read`.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    columns = list(columns or PRODUCT_SCHEMA)
+    dimension = get_dimension()
+    attributes = [column for column in columns if column in ATTRIBUTE_COLUMNS]
+    if dimension is None or not attributes:
+        return get_store().read(columns=columns, **filters)
+
+    facts = [column for column in columns if column not in ATTRIBUTE_COLUMNS]
+    keys = [column for column in ("source", "product_id")
+            if column not in facts]
+    df = dimension.attach(get_store().read(columns=facts + keys, **filters),
+                          attributes)
+    return df[columns]
+
+
+def product_history(retailer, product_id, columns=None, start_date=None,
+                    end_date=None):
+    """
+    Loads every row of one product, through the product index when there is
+    one and with a filtered scan of the store otherwise.
+
+    Args:
+        retailer (str): Retailer key.
+        product_id (str): The product.
+        columns (list): Product schema columns to load; defaults to all of
+            them.
+        start_date (str): First day, as YYYYMMDD (inclusive).
+        end_date (str): Last day, as YYYYMMDD (inclusive).
+
+    Returns:
+        pd.DataFrame: One row per day and category that saw the product,
+        oldest first.
+    """
+    columns = list(columns or PRODUCT_SCHEMA)
+    index = get_product_index()
+    if index is None:
+        df = read_products(columns=columns + ["date"], retailers=[retailer],
+                           start_date=start_date, end_date=end_date,
+                           filter=ds.field("product_id") == str(product_id))
+        df = df.sort_values("date", kind="stable", ignore_index=True)
+        return df[columns]
+
+    facts = [column for column in columns
+             if column not in ATTRIBUTE_COLUMNS + ["source", "cgid"]]
+    df = index.lookup(retailer, product_id, columns=facts + ["product_id"],
+                      start_date=start_date, end_date=end_date)
+    attributes = [column for column in columns if column in ATTRIBUTE_COLUMNS]
+    dimension = get_dimension()
+    if attributes and dimension is not None:
+        df = dimension.attach(df, attributes)
+    return df[[column for column in columns if column in df.columns]]
@@ -0,0 +1,283 @@
+"""
+Partitioned Parquet store for the daily product data.
+
+Every saved category becomes one zstd-compressed Parquet file in a
+hive-style tree, so readers can skip whole retailers, days or categories
+from the directory names alone:
+
+    <base_path>/source=<retailer>/date=<YYYYMMDD>/cgid=<category>/part-0.parquet
+
+The files follow `ARROW_SCHEMA`, derived from the canonical product schema,
+or a subset of it (e.g. only the daily facts when the attributes live in the
+product dimension); the partition columns are only stored in the directory
+names. Columns missing from a file read as nulls.
+"""
+import os
+import tempfile
+from urllib.parse import quote, unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from schema import PRODUCT_SCHEMA
+from storage.files import move_into_place
+
+# Columns encoded in the directory names, in nesting order
+PARTITION_COLUMNS = ["source", "date", "cgid"]
+
+PARTITIONING = ds.partitioning(
+    pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+    flavor="hive")
+
+_ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "str": pa.string(),
+    "float32": pa.float32(),
+    "datetime64[s]": pa.timestamp("s"),
+}
+
+# Schema of the Parquet files: the product schema minus the partition columns
+ARROW_SCHEMA = pa.schema([
+    (name, _ARROW_TYPES[dtype]) for name, dtype in PRODUCT_SCHEMA.items()
+    if name not in PARTITION_COLUMNS
+])
+
+# Schema seen by readers: the file columns plus the partition columns
+DATASET_SCHEMA = pa.schema(list(ARROW_SCHEMA) + list(PARTITIONING.schema))
+
+
+class ParquetStore:
+    """
+    Reads and writes the partitioned Parquet tree rooted at `base_path`.
+
+    Args:
+        base_path (str): Root directory of the store.
+        compression_level (int): zstd compression level.
+        columns (list): Product schema columns written to new files; defaults
+            to all of them.
+    """
+
+    def __init__(self, base_path="data/parquet", compression_level=9,
+                 columns=None):
+        self.base_path = base_path
+        self.compression_level = compression_level
+        self.file_schema = ARROW_SCHEMA
+        if columns is not None:
+            self.file_schema = pa.schema(
+                [field for field in ARROW_SCHEMA if field.name in columns])
+
+    def partition_path(self, retailer, date, cgid):
+        # Partition values are URI-encoded, as pyarrow's hive partitioning
+        # expects
+        return os.path.join(self.base_path,
+                            f"source={quote(retailer, safe='')}",
+                            f"date={quote(date, safe='')}",
+                            f"cgid={quote(cgid, safe='')}")
+
+    def category_writer(self, retailer, date, cgid):
+        """
+        Opens a writer that appends one category of one day page by page.
+
+        See `CategoryWriter`; `write_category` is the one-shot equivalent.
+        """
+        return CategoryWriter(self, retailer, date, cgid)
+
+    def to_table(self, df):
+        """Converts product rows to an Arrow table with the file schema."""
+        return pa.Table.from_pandas(df.reindex(columns=self.file_schema.names),
+                                    schema=self.file_schema,
+                                    preserve_index=False)
+
+    def write_category(self, df, retailer, date, cgid):
+        """
+        Writes (or replaces) one category of one day.
+
+        The file is written next to its final name and moved into place, so
+        readers never see a partially written category.
+
+        Args:
+            df (pd.DataFrame): Rows in the canonical product schema.
+            retailer (str): Retailer key ("continente", "pingo_doce",
+                "auchan").
+            date (str): Crawl date as YYYYMMDD.
+            cgid (str): Category the rows were scraped from.
+
+        Returns:
+            str: Path of the written file.
+        """
+        writer = self.category_writer(retailer, date, cgid)
+        try:
+            writer.write(df)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def dataset(self):
+        """Returns the whole store as a `pyarrow.dataset.Dataset`."""
+        # Files being written start with "." and are ignored by the scan
+        return ds.dataset(self.base_path,
+                          format="parquet",
+                          partitioning=PARTITIONING,
+                          schema=DATASET_SCHEMA)
+
+    @staticmethod
+    def _filter(retailers, start_date, end_date, cgids, dates):
+        expression = None
+
+        def combine(condition):
+            return condition if expression is None else expression & condition
+
+        if retailers is not None:
+            expression = combine(ds.field("source").isin(list(retailers)))
+        if dates is not None:
+            expression = combine(ds.field("date").isin(list(dates)))
+        # YYYYMMDD strings sort like the dates they encode
+        if start_date is not None:
+            expression = combine(ds.field("date") >= start_date)
+        if end_date is not None:
+            expression = combine(ds.field("date") <= end_date)
+        if cgids is not None:
+            expression = combine(ds.field("cgid").isin(list(cgids)))
+        return expression
+
+    def read(self,
+             columns=None,
+             retailers=None,
+             start_date=None,
+             end_date=None,
+             cgids=None,
+             dates=None,
+             filter=None):
+        """
+        Loads products from the store.
+
+        Only the partitions matching the retailer, date and category filters
+        are opened, and only the requested columns are read from them.
+
+        Args:
+            columns (list): Columns to load; defaults to the whole product
+                schema.
+            retailers (list): Retailers to load; defaults to all of them.
+            start_date (str): First day to load, as YYYYMMDD (inclusive).
+            end_date (str): Last day to load, as YYYYMMDD (inclusive).
+            cgids (list): Categories to load; defaults to all of them.
+            dates (list): Exact days to load, as YYYYMMDD.
+            filter (pyarrow.compute.Expression): Extra row filter, e.g.
+                `ds.field("product_id") == "7130167"`.
+
+        Returns:
+            pd.DataFrame: The matching rows with the product schema dtypes,
+            plus a "date" column when requested.
+        """
+        columns = list(columns or PRODUCT_SCHEMA)
+        if not os.path.isdir(self.base_path):
+            return pd.DataFrame({
+                column: pd.Series(dtype=PRODUCT_SCHEMA.get(column, "str"))
+                for column in columns
+            })
+
+        expression = self._filter(retailers, start_date, end_date, cgids,
+                                  dates)
+        if filter is not None:
+            expression = filter if expression is None else expression & filter
+
+        table = self.dataset().to_table(columns=columns, filter=expression)
+        df = table.to_pandas()
+        return df.astype({
+            column: PRODUCT_SCHEMA[column]
+            for column in columns if column in PRODUCT_SCHEMA
+        })
+
+    def partitions(self, retailer=None):
+        """
+        Lists the (retailer, date, cgid) partitions present in the store, from
+        the directory tree only. Directories without a committed file (a
+        category still being written, say) are left out.
+        """
+        found = []
+        if not os.path.isdir(self.base_path):
+            return found
+        for source_dir in sorted(os.listdir(self.base_path)):
+            if not source_dir.startswith("source="):
+                continue
+            source = unquote(source_dir.split("=", 1)[1])
+            if retailer is not None and source != retailer:
+                continue
+            source_path = os.path.join(self.base_path, source_dir)
+            for date_dir in sorted(os.listdir(source_path)):
+                date_path = os.path.join(source_path, date_dir)
+                for cgid_dir in sorted(os.listdir(date_path)):
+                    if not os.path.exists(os.path.join(
+                            date_path, cgid_dir, "part-0.parquet")):
+                        continue
+                    found.append((source, unquote(date_dir.split("=", 1)[1]),
+                                  unquote(cgid_dir.split("=", 1)[1])))
+        return found
+
+
+class CategoryWriter:
+    """
+    Appends pages of one category to a hidden temporary Parquet file, one row
+    group per page, and moves it into place on `commit`.
+
+    Only the page being written is held in memory. Until `commit`, readers
+    keep seeing the previous version of the category, if any.
+    """
+
+    def __init__(self, store, retailer, date, cgid):
+        self.store = store
+        self.directory = store.partition_path(retailer, date, cgid)
+        self.path = os.path.join(self.directory, "part-0.parquet")
+        self.rows = 0
+        self._tmp_path = None
+        self._writer = None
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=self.directory,
+                                              prefix=".part-")
+        os.close(fd)
+        self._writer = pq.ParquetWriter(
+            self._tmp_path,
+            self.store.file_schema,
+            compression="zstd",
+            compression_level=self.store.compression_level)
+
+    def write(self, df):
+        """Appends a page of rows, in the product schema, as a row group."""
+        if self._writer is None:
+            self._open()
+        if len(df):
+            self._writer.write_table(self.store.to_table(df))
+            self.rows += len(df)
+
+    def commit(self):
+        """
+        Finalizes the file and atomically replaces the category with it.
+
+        Returns:
+            str: Path of the category file.
+        """
+        if self._writer is None:
+            self._open()
+        self._writer.close()
+        move_into_place(self._tmp_path, self.path)
+        self._writer = None
+        return self.path
+
+    def abort(self):
+        """Drops the pages written so far, leaving the category untouched."""
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._tmp_path)
+            self._writer = None
+            # Drop the partition directories the writer created, so the
+            # category does not show up in `partitions` without a file
+            base_path = os.path.normpath(self.store.base_path)
+            directory = os.path.normpath(self.directory)
+            while directory != base_path and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
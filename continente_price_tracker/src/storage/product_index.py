@@ -0,0 +1,268 @@
+"""
+Persistent index from products to where their rows live in the Parquet store.
+
+A product's history is spread over one file per category and day, so
+reading it means opening every file of the retailer. The index records, for
+every product and day, the file and the row group (one per scraped page)
+holding its row, and the size and modification time the file had then:
+
+    product_id, date, cgid, file, row_group, row, file_size, file_mtime
+
+Each retailer's entries live in `<base_path>/<retailer>.parquet`, sorted by
+product and written in small row groups, so the min/max statistics of the
+index itself narrow a lookup down to one of its row groups. A history is
+then read from a handful of row groups of the store, in milliseconds however
+many days it holds. `update` re-indexes whole days, so indexing a day again
+(after a category was re-scraped, say) is harmless. Until then, a lookup
+notices that a file no longer has the size or modification time it was
+indexed with, and reads that day with a filtered scan of the store instead.
+"""
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from schema import PRODUCT_SCHEMA
+from storage.files import move_into_place
+
+INDEX_SCHEMA = {
+    "product_id": "str",
+    "date": "str",
+    "cgid": "str",
+    "file": "str",
+    "row_group": "int32",
+    "row": "int32",
+    "file_size": "int64",
+    "file_mtime": "int64",
+}
+
+# Rows per row group of the index files: small enough for a lookup to read
+# little more than the product's own entries
+INDEX_ROW_GROUP_SIZE = 4096
+
+
+def _empty_index():
+    return pd.DataFrame({
+        column: pd.Series(dtype=dtype)
+        for column, dtype in INDEX_SCHEMA.items()
+    })
+
+
+def _as_index(df):
+    # Entries written before the file stamps existed never match a file, so
+    # their days are read by a scan until they are indexed again
+    return df.reindex(columns=list(INDEX_SCHEMA), fill_value=-1).astype(
+        INDEX_SCHEMA)
+
+
+def _file_stamp(path):
+    """Returns the (size, mtime in ns) of a file, or (-1, -1) if it is gone."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return -1, -1
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ProductIndex:
+    """
+    Builds and queries the per-retailer index files under `base_path`.
+
+    Args:
+        store (ParquetStore): The store being indexed.
+        base_path (str): Directory holding one `<retailer>.parquet` per
+            retailer.
+    """
+
+    def __init__(self, store, base_path="data/index"):
+        self.store = store
+        self.base_path = base_path
+
+    def _path(self, retailer):
+        return os.path.join(self.base_path, f"{retailer}.parquet")
+
+    def load(self, retailer):
+        """Returns every entry of `retailer`."""
+        path = self._path(retailer)
+        if not os.path.exists(path):
+            return _empty_index()
+        return _as_index(pd.read_parquet(path))
+
+    def _save(self, retailer, index):
+        os.makedirs(self.base_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_path, prefix=".index-")
+        os.close(fd)
+        try:
+            index.to_parquet(tmp_path, index=False, compression="zstd",
+                             row_group_size=INDEX_ROW_GROUP_SIZE)
+            move_into_place(tmp_path, self._path(retailer))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def index_file(self, path, date, cgid):
+        """Lists the product rows of one store file, by row group."""
+        frames = [_empty_index()]
+        # Stamped before reading, so a rewrite racing the indexing shows up
+        # as a mismatch rather than going unnoticed
+        file_size, file_mtime = _file_stamp(path)
+        parquet_file = pq.ParquetFile(path)
+        file = os.path.relpath(path, self.store.base_path)
+        for row_group in range(parquet_file.num_row_groups):
+            product_ids = parquet_file.read_row_group(
+                row_group,
+                columns=["product_id"]).column("product_id").to_pandas()
+            frames.append(pd.DataFrame({
+                "product_id": product_ids.astype("str").to_numpy(),
+                "date": date,
+                "cgid": cgid,
+                "file": file,
+                "row_group": row_group,
+                "row": range(len(product_ids)),
+                "file_size": file_size,
+                "file_mtime": file_mtime,
+            }))
+        return pd.concat(frames, ignore_index=True).astype(INDEX_SCHEMA)
+
+    def update(self, retailer, dates):
+        """
+        Re-indexes the given crawl days (YYYYMMDD) of `retailer`.
+
+        Returns:
+            int: Number of entries written for those days.
+        """
+        dates = set(dates)
+        frames = []
+        for _, date, cgid in self.store.partitions(retailer):
+            if date not in dates:
+                continue
+            path = os.path.join(
+                self.store.partition_path(retailer, date, cgid),
+                "part-0.parquet")
+            if os.path.exists(path):
+                frames.append(self.index_file(path, date, cgid))
+        entries = pd.concat([_empty_index()] + frames, ignore_index=True)
+
+        index = self.load(retailer)
+        index = pd.concat([index[~index["date"].isin(dates)], entries],
+                          ignore_index=True)
+        index = index.sort_values(["product_id", "date"], kind="stable",
+                                  ignore_index=True)
+        self._save(retailer, index.astype(INDEX_SCHEMA))
+        return len(entries)
+
+    def rebuild(self, retailer):
+        """Indexes every day of `retailer` in the store from scratch."""
+        path = self._path(retailer)
+        if os.path.exists(path):
+            os.remove(path)
+        return self.update(retailer, {
+            date for _, date, _ in self.store.partitions(retailer)})
+
+    def entries(self, retailer, product_id, start_date=None, end_date=None):
+        """Returns the entries of one product, oldest day first."""
+        path = self._path(retailer)
+        if not os.path.exists(path):
+            return _empty_index()
+        filters = [("product_id", "==", str(product_id))]
+        # YYYYMMDD strings sort like the dates they encode
+        if start_date is not None:
+            filters.append(("date", ">=", start_date))
+        if end_date is not None:
+            filters.append(("date", "<=", end_date))
+        entries = pq.read_table(path, filters=filters).to_pandas()
+        return _as_index(entries).sort_values("date", ignore_index=True)
+
+    def _stale(self, entries):
+        # Days with some file that changed since it was indexed; a day is
+        # read either through the index or by a scan, never both
+        stamps = pd.DataFrame.from_dict(
+            {file: _file_stamp(os.path.join(self.store.base_path, file))
+             for file in entries["file"].unique()},
+            orient="index", columns=["file_size", "file_mtime"])
+        current = stamps.reindex(entries["file"]).to_numpy()
+        indexed = entries[["file_size", "file_mtime"]].to_numpy()
+        changed = (current != indexed).any(axis=1)
+        return entries["date"].isin(entries.loc[changed, "date"])
+
+    def _read_indexed(self, entries, columns):
+        # Rows are gathered as Arrow tables and converted to pandas once
+        tables = []
+        groups = entries.groupby(["file", "row_group"], sort=False)
+        for (file, row_group), group in groups:
+            parquet_file = pq.ParquetFile(
+                os.path.join(self.store.base_path, file))
+            available = parquet_file.schema_arrow.names
+            # The product_id is always read, to check the rows are its own
+            wanted = ["product_id"] + [
+                c for c in (columns or available) if c != "product_id"]
+            table = parquet_file.read_row_group(
+                row_group, columns=[c for c in wanted if c in available])
+            table = table.take(group["row"].to_numpy())
+            table = table.append_column(
+                "date", pa.array(group["date"].to_numpy(), pa.string()))
+            tables.append(table.append_column(
+                "cgid", pa.array(group["cgid"].to_numpy(), pa.string())))
+        return pa.concat_tables(tables,
+                                promote_options="permissive").to_pandas()
+
+    def _scan(self, retailer, product_id, dates, columns):
+        # The rows of the product on `dates`, from a filtered store scan
+        wanted = ["date", "cgid", "product_id"] + [
+            c for c in (columns or self.store.file_schema.names)
+            if c not in ("date", "cgid", "product_id")]
+        df = self.store.read(columns=wanted, retailers=[retailer],
+                             dates=list(dates),
+                             filter=ds.field("product_id") == str(product_id))
+        return df.astype({"date": "str", "cgid": "str"})
+
+    def lookup(self, retailer, product_id, columns=None, start_date=None,
+               end_date=None):
+        """
+        Reads the rows of one product from the store through the index.
+
+        Args:
+            retailer (str): Retailer key.
+            product_id (str): The product.
+            columns (list): Columns of the store files to load; defaults to
+                all of them.
+            start_date (str): First day, as YYYYMMDD (inclusive).
+            end_date (str): Last day, as YYYYMMDD (inclusive).
+
+        Returns:
+            pd.DataFrame: One row per day and category that saw the product,
+            with "source", "date" and "cgid" and the requested columns.
+        """
+        entries = self.entries(retailer, product_id, start_date, end_date)
+        if entries.empty:
+            return pd.DataFrame({
+                column: pd.Series(dtype=PRODUCT_SCHEMA.get(column, "str"))
+                for column in ["source", "date", "cgid"] + list(columns or [])
+            })
+
+        stale = self._stale(entries)
+        frames = []
+        if not stale.all():
+            frames.append(self._read_indexed(entries[~stale], columns))
+        if stale.any():
+            frames.append(self._scan(retailer, product_id,
+                                     entries.loc[stale, "date"].unique(),
+                                     columns))
+        df = pd.concat(frames, ignore_index=True)
+        # A file rewritten while it was being indexed may have moved the rows
+        df = df[df["product_id"].astype("str") == str(product_id)]
+        if columns is not None and "product_id" not in columns:
+            df = df.drop(columns="product_id")
+        df.insert(0, "source", retailer)
+        df = df[["source", "date", "cgid"] + [
+            column for column in df.columns
+            if column not in ("source", "date", "cgid")]]
+        df = df.sort_values(["date", "cgid"], ignore_index=True)
+        return df.astype({
+            column: PRODUCT_SCHEMA[column]
+            for column in df.columns
+            if column in PRODUCT_SCHEMA and column != "date"
+        })
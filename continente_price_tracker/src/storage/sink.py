@@ -0,0 +1,176 @@
+"""
+Bounded-memory category sink.
+
+The scrapers used to collect a whole category before writing it, so peak
+memory grew with the largest category and a crash lost everything fetched
+so far. A `CategorySink` instead normalizes each page as soon as it is
+parsed and appends it to the day's output (a Parquet row group, or CSV
+rows), then finalizes the category atomically when it ends:
+
+    with open_category_sink("auchan", date, cgid, normalize,
+                            csv_path) as sink:
+        for page in pages:
+            sink.write_page(page)
+
+Each page is compared against the attribute hashes stored in the product
+dimension, and only the attribute rows of new or changed products are kept
+until then, to update the dimension once per category.
+
+Leaving the block with an exception drops the partial output and leaves
+any previous version of the category in place.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+import config
+from storage.files import move_into_place
+from schema import ATTRIBUTE_COLUMNS
+from storage.dimension import attributes_hash
+from storage.output import get_dimension, get_store
+
+
+class CsvCategoryWriter:
+    """
+    Appends pages of one category to a temporary CSV file and moves it to
+    `path` on `commit`. Same interface as `storage.parquet.CategoryWriter`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._tmp_path = None
+
+    def write(self, df):
+        if self._tmp_path is None:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, self._tmp_path = tempfile.mkstemp(dir=directory,
+                                                  prefix=".part-")
+            os.close(fd)
+            # The first page brings the header
+            df.to_csv(self._tmp_path, index=False)
+        else:
+            df.to_csv(self._tmp_path, mode="a", header=False, index=False)
+        self.rows += len(df)
+
+    def commit(self):
+        if self._tmp_path is None:
+            return None
+        move_into_place(self._tmp_path, self.path)
+        self._tmp_path = None
+        return self.path
+
+    def abort(self):
+        if self._tmp_path is not None:
+            os.remove(self._tmp_path)
+            self._tmp_path = None
+
+
+class CategorySink:
+    """
+    Streams the pages of one category to the configured output.
+
+    Args:
+        retailer (str): Retailer key ("continente", "pingo_doce", "auchan").
+        date (str): Crawl date as YYYYMMDD.
+        cgid (str): The category.
+        normalize (callable): Turns a parsed page into the canonical product
+            schema.
+        writer: A `CategoryWriter` or `CsvCategoryWriter`.
+
+    After the `with` block, `rows` holds the number of rows written and `path`
+    the category file (None when the category was empty).
+    """
+
+    def __init__(self, retailer, date, cgid, normalize, writer):
+        self.retailer = retailer
+        self.date = date
+        self.cgid = cgid
+        self.normalize = normalize
+        self.writer = writer
+        self.rows = 0
+        self.path = None
+        # Attribute rows of new or changed products, for one dimension
+        # upsert, and the stored hashes they are compared against
+        self._attributes = []
+        self._hashes = None
+
+    def write_page(self, page):
+        """Normalizes one parsed page and appends it to the category output."""
+        if page is None or page.empty:
+            return
+        df = self.normalize(page)
+        if get_dimension() is not None:
+            self._keep_changed_attributes(df)
+        self.writer.write(df)
+        self.rows += len(df)
+
+    def _keep_changed_attributes(self, df):
+        # Products the dimension already holds with the same attributes are
+        # left out, so memory grows with the changes rather than the category
+        if self._hashes is None:
+            self._hashes = get_dimension().hashes(self.retailer)
+        attributes = df[["product_id"] + ATTRIBUTE_COLUMNS]
+        product_ids = attributes["product_id"].astype("str").to_numpy()
+        stored = self._hashes.reindex(product_ids).array
+        page = pd.array(attributes_hash(attributes), dtype="UInt64")
+        changed = (stored != page).fillna(True).to_numpy(dtype=bool)
+        if changed.any():
+            self._attributes.append(attributes[changed])
+
+    def close(self):
+        """
+        Finalizes the category, then upserts its products into the dimension
+        in one rewrite; an empty category writes nothing.
+        """
+        if not self.rows:
+            self.writer.abort()
+            return None
+        self.path = self.writer.commit()
+
+        dimension = get_dimension()
+        if dimension is not None and self._attributes:
+            dimension.upsert(pd.concat(self._attributes, ignore_index=True),
+                             self.retailer, self.date)
+        self._attributes = []
+        self._hashes = None
+        return self.path
+
+    def abort(self):
+        self.writer.abort()
+        self._attributes = []
+        self._hashes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def open_category_sink(retailer, date, cgid, normalize, csv_path):
+    """
+    Opens a sink for one category in the configured output format (see
+    `config.OUTPUT_FORMAT`).
+
+    Args:
+        retailer (str): Retailer key.
+        date (str): Crawl date as YYYYMMDD.
+        cgid (str): The category.
+        normalize (callable): Turns a parsed page into the canonical product
+            schema.
+        csv_path (str): File the category is written to in "csv" mode.
+    """
+    if config.OUTPUT_FORMAT == "csv":
+        writer = CsvCategoryWriter(csv_path)
+    elif config.OUTPUT_FORMAT == "parquet":
+        writer = get_store().category_writer(retailer, date, cgid)
+    else:
+        raise ValueError(f"Unknown output format: {config.OUTPUT_FORMAT}")
+    return CategorySink(retailer, date, cgid, normalize, writer)
@@ -0,0 +1,161 @@
+"""
+Embedded analytical warehouse.
+
+A single DuckDB file holds every loaded day in one `products` table, so
+history questions are answered with SQL in milliseconds, with no server:
+
+    source, date, cgid, product_id, product_name, brand, category, price,
+    unit_price, unit, package, promotion, labels, rating, image_url,
+    product_url
+
+A day (read from the Parquet store by `storage.output.load_warehouse`) is
+loaded in one transaction: the day's rows are replaced by a bulk
+`INSERT ... SELECT` over an Arrow table, never row by row, so reloading a
+day is harmless. The table is indexed on
+(source, product_id, date) for product histories and on (date, category)
+for category snapshots.
+"""
+import os
+
+import duckdb
+import pyarrow as pa
+
+from schema import PRODUCT_SCHEMA
+
+# Warehouse columns: the product schema with the crawl date as a DATE
+# instead of `tracking_date`
+_SQL_TYPES = {
+    "category": "VARCHAR",
+    "str": "VARCHAR",
+    "float32": "REAL",
+}
+
+COLUMNS = ["source", "date"] + [
+    column for column in PRODUCT_SCHEMA
+    if column not in ("source", "tracking_date")
+]
+
+_CREATE_TABLE = "CREATE TABLE IF NOT EXISTS products ({})".format(", ".join(
+    ["source VARCHAR NOT NULL", "date DATE NOT NULL"] + [
+        f"{column} {_SQL_TYPES[PRODUCT_SCHEMA[column]]}"
+        for column in COLUMNS[2:]
+    ]))
+
+_CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS products_source_product_date "
+    "ON products (source, product_id, date)",
+    "CREATE INDEX IF NOT EXISTS products_date_category "
+    "ON products (date, category)",
+]
+
+
+class Warehouse:
+    """
+    Loads and queries the DuckDB warehouse file at `path`.
+
+    Args:
+        path (str): Database file; created with its table and indexes on
+            the first load.
+    """
+
+    def __init__(self, path="data/warehouse.duckdb"):
+        self.path = path
+
+    def connect(self, read_only=False):
+        """Opens a connection; a read-only one needs an existing file."""
+        if not read_only:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return duckdb.connect(self.path, read_only=read_only)
+
+    @staticmethod
+    def _ensure_schema(connection):
+        connection.execute(_CREATE_TABLE)
+        for statement in _CREATE_INDEXES:
+            connection.execute(statement)
+
+    @staticmethod
+    def _to_arrow(df):
+        # Categoricals become plain strings and the crawl date a DATE, the
+        # layout of the table; DuckDB then scans the Arrow buffers directly
+        day = df.assign(date=df["tracking_date"].dt.date)
+        return pa.Table.from_pandas(
+            day[COLUMNS].astype({
+                column: "str" for column in COLUMNS
+                if PRODUCT_SCHEMA.get(column) == "category"
+            }),
+            preserve_index=False)
+
+    def load_frame(self, df, date, retailers=None):
+        """
+        Replaces one day of data with the rows of `df`, in one transaction.
+
+        Args:
+            df (pd.DataFrame): Rows in the canonical product schema.
+            date (str): Crawl date as YYYYMMDD; its previous rows are deleted.
+            retailers (list): Retailers whose rows of `date` are replaced;
+                defaults to the ones present in `df`.
+
+        Returns:
+            int: Number of rows loaded.
+        """
+        if retailers is None:
+            retailers = sorted(df["source"].astype("str").unique())
+        day = self._to_arrow(df)
+
+        connection = self.connect()
+        try:
+            self._ensure_schema(connection)
+            connection.register("day", day)
+            connection.begin()
+            try:
+                connection.execute(
+                    "DELETE FROM products "
+                    "WHERE date = strptime(?, '%Y%m%d')::DATE "
+                    "AND list_contains(?, source)",
+                    [date, list(retailers)])
+                # Sorted on the history key, so DuckDB's per-block min/max
+                # statistics prune as well as the indexes
+                connection.execute(
+                    f"INSERT INTO products SELECT {', '.join(COLUMNS)} "
+                    "FROM day ORDER BY source, product_id")
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+        finally:
+            connection.close()
+        return day.num_rows
+
+    def query(self, sql, params=None):
+        """Runs a read-only SQL query and returns the result as a DataFrame."""
+        connection = self.connect(read_only=True)
+        try:
+            return connection.execute(sql, params or []).df()
+        finally:
+            connection.close()
+
+    def product_history(self, retailer, product_id):
+        """Returns every loaded day of one product, oldest first."""
+        return self.query(
+            "SELECT * FROM products WHERE source = ? AND product_id = ? "
+            "ORDER BY date",
+            [retailer, str(product_id)])
+
+    def category_day(self, date, category):
+        """
+        Returns one day of a category path and everything below it (e.g.
+        "Bebé" matches "Bebé/Fraldas").
+        """
+        return self.query(
+            "SELECT * FROM products WHERE date = strptime(?, '%Y%m%d')::DATE "
+            "AND (category = ? OR starts_with(category, ? || '/')) "
+            "ORDER BY source, product_id",
+            [date, category, category])
+
+    def dates(self):
+        """Lists the loaded days, as YYYYMMDD."""
+        if not os.path.exists(self.path):
+            return []
+        df = self.query("SELECT DISTINCT strftime(date, '%Y%m%d') AS date "
+                        "FROM products ORDER BY date")
+        return df["date"].tolist()
@@ -0,0 +1,113 @@
+"""
+Streaming product tile extractor.
+
+Grid responses are close to 1 MB, mostly inline scripts and tracking markup,
+while the scrapers only need the product tiles. `TileStreamParser` is fed the
+response body chunk by chunk while it downloads, emits one record per tile as
+soon as the tile is complete and throws every finished element away, so the
+full DOM is never held in memory.
+"""
+import config
+from html_parsing import LxmlNode, etree
+
+
+def streaming_enabled():
+    """Tells whether grid pages should be parsed while they download."""
+    return config.PARSE_MODE == "stream" and etree is not None
+
+
+class TileStreamParser:
+    """
+    Incremental extractor of product tiles from an HTML byte stream.
+
+    Args:
+        tile_class (str): Class token identifying a product tile element.
+        row_function (callable): Turns a complete tile (an `LxmlNode`) into a
+            record.
+        tile_tag (str): Tag of the tile elements.
+        capture (dict): Optional {name: (tag, class_)} of elements outside the
+            tiles whose text should be kept, e.g. the product counter. `class_`
+            is compared against the whole class attribute.
+        keep_body (bool): Keep the raw bytes, e.g. for the raw response
+            archive.
+
+    After `close()`, `rows` holds the records in document order and `captured`
+    the text of the captured elements.
+    """
+
+    def __init__(self,
+                 tile_class,
+                 row_function,
+                 tile_tag="div",
+                 capture=None,
+                 keep_body=False):
+        self.tile_class = tile_class
+        self.row_function = row_function
+        self.tile_tag = tile_tag
+        self.capture = capture or {}
+        self.rows = []
+        self.captured = {}
+        self._chunks = [] if keep_body else None
+        # Tiles and captured elements currently open
+        self._open = 0
+        self._parser = etree.HTMLPullParser(events=("start", "end"),
+                                            encoding="utf-8")
+
+    def _match(self, element):
+        """Returns "tile", the capture name, or None for other elements."""
+        classes = element.get("class", "").split()
+        if element.tag == self.tile_tag and self.tile_class in classes:
+            return "tile"
+        class_attr = " ".join(classes)
+        for name, (tag, class_) in self.capture.items():
+            if element.tag == tag and class_attr == class_:
+                return name
+        return None
+
+    @staticmethod
+    def _discard(element):
+        # Drop the finished element and the already processed siblings before
+        # it
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def _drain(self):
+        for event, element in self._parser.read_events():
+            match = self._match(element)
+            if event == "start":
+                if match is not None:
+                    self._open += 1
+                continue
+
+            if match is not None:
+                self._open -= 1
+                if self._open == 0:
+                    if match == "tile":
+                        self.rows.append(self.row_function(LxmlNode(element)))
+                    else:
+                        self.captured[match] = LxmlNode(element).get_text()
+            if self._open:
+                # Part of a tile or captured element still being received
+                continue
+            self._discard(element)
+
+    def feed(self, chunk):
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self):
+        self._parser.close()
+        self._drain()
+        return self
+
+    @property
+    def body(self):
+        """The raw response, decoded, when `keep_body` was set."""
+        if self._chunks is None:
+            return None
+        return b"".join(self._chunks).decode("utf-8", errors="replace")
@@ -1,25 +0,0 @@
-# Decorator for retrying a function call
-from functools import wraps
-import requests
-import time
-
-
-def retry_on_failure(retries=3, delay=60):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            attempts = retries
-            while attempts > 0:
-                try:
-                    return func(*args, **kwargs)
-                except requests.RequestException as e:
-                    attempts -= 1
-                    print(
-                        f"Request failed: {e}. Retrying in {delay} seconds...")
-                    time.sleep(delay)
-            raise Exception(
-                f"Failed to complete {func.__name__} after {retries} retries.")
-
-        return wrapper
-
-    return decorator
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from schema import to_product_schema  # noqa: E402
+
+
+@pytest.fixture
+def make_products():
+    """Builds product rows in the canonical schema from a few columns."""
+
+    def make(retailer, product_ids, prices, date="20241101", cgid="c1",
+             **columns):
+        index = pd.RangeIndex(len(product_ids))
+        return to_product_schema({
+            "source": retailer,
+            "tracking_date": pd.Timestamp(date),
+            "cgid": cgid,
+            "product_id": [str(product_id) for product_id in product_ids],
+            "product_name": [f"Product {product_id}"
+                             for product_id in product_ids],
+            "price": prices,
+            **columns,
+        }, index)
+
+    return make
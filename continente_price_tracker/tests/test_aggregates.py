@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage.aggregates import WINDOWS, RollingAggregates
+
+
+def random_crawls(days=100, products=30, seed=0):
+    """
+    Daily crawls where products drop out now and then, and change price or
+    promotion a few times.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("20241101", periods=days, freq="D")
+    price = rng.choice([1.0, 1.5, 2.25, 3.0], size=products)
+    promoted = np.zeros(products, dtype=bool)
+    rows = []
+    for date in dates:
+        changes = rng.random(products) < 0.1
+        price = np.where(changes, rng.choice([1.0, 1.5, 2.25, 3.0],
+                                             size=products), price)
+        promoted = promoted ^ (rng.random(products) < 0.05)
+        seen = rng.random(products) < 0.9
+        rows.append(pd.DataFrame({
+            "product_id": np.arange(products)[seen].astype("str"),
+            "price": price[seen],
+            "promoted": promoted[seen],
+            "date": date,
+        }))
+    return pd.concat(rows, ignore_index=True)
+
+
+def brute_force(crawls):
+    """The aggregates recomputed from every daily row."""
+    date = crawls["date"].max()
+    expected = {}
+    for window in WINDOWS:
+        rows = crawls[crawls["date"] > date - pd.Timedelta(days=window)]
+        grouped = rows.groupby("product_id")
+        expected[f"min_{window}d"] = grouped["price"].min()
+        expected[f"max_{window}d"] = grouped["price"].max()
+        expected[f"mean_{window}d"] = grouped["price"].mean()
+        expected[f"promo_share_{window}d"] = grouped["promoted"].mean()
+
+    last = crawls.sort_values("date").groupby("product_id").last()
+    expected["last_price"] = last["price"]
+    expected["last_seen"] = last["date"]
+
+    # A change is a different price from the crawl the day before
+    wide = crawls.pivot(index="date", columns="product_id", values="price")
+    before = wide.shift()
+    changed = wide.notna() & before.notna() & (wide != before)
+    expected["last_change"] = changed.apply(
+        lambda column: column[column].index.max())
+    return pd.DataFrame(expected)
+
+
+def test_matches_a_brute_force_groupby(tmp_path):
+    crawls = random_crawls()
+    aggregates = RollingAggregates(str(tmp_path))
+    for date, rows in crawls.groupby("date"):
+        df = rows.assign(promotion=rows["promoted"].map({True: "-10%",
+                                                         False: None}))
+        aggregates.apply_day(df, "auchan", date.strftime("%Y%m%d"))
+
+    actual = aggregates.load("auchan").set_index("product_id")
+    expected = brute_force(crawls)
+    assert sorted(actual.index) == sorted(expected.index)
+    actual = actual.loc[expected.index]
+    for column in expected.columns:
+        if column in ("last_seen", "last_change"):
+            pd.testing.assert_series_equal(
+                actual[column], expected[column].astype("datetime64[s]"),
+                check_names=False, check_index_type=False)
+        else:
+            np.testing.assert_allclose(actual[column].astype("float64"),
+                                       expected[column].astype("float64"),
+                                       rtol=1e-6, err_msg=column)
+
+
+def test_a_day_is_applied_once(tmp_path):
+    aggregates = RollingAggregates(str(tmp_path))
+    df = pd.DataFrame({"product_id": ["1"], "price": [1.0],
+                       "promotion": [None]})
+    assert aggregates.apply_day(df, "auchan", "20241101") == 1
+    assert aggregates.apply_day(df, "auchan", "20241101") == 0
+    assert aggregates.product("auchan", "1")["mean_7d"] == pytest.approx(1.0)
+    assert aggregates.product("auchan", "2").empty
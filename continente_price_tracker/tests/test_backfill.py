@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import backfill
+from storage import output
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test from an empty directory, where every store lives."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("_store", "_history", "_dimension", "_warehouse",
+                 "_matcher", "_changes", "_aggregates", "_matrix",
+                 "_product_index"):
+        monkeypatch.setattr(output, name, None)
+    return tmp_path
+
+
+def write_csv(root, retailer, date, name, df):
+    directory = os.path.join(root, retailer, date)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    df.to_csv(path, index=False)
+    return os.path.abspath(path)
+
+
+def test_classify_recognises_every_layout(tmp_path):
+    raw = tmp_path / "raw"
+    assert backfill.classify(str(tmp_path / "bebe_20241114_012111.csv")) == (
+        "continente", "20241114", "bebe")
+    assert backfill.classify(str(raw / "continente" / "20241125" /
+                                 "frescos.csv")) == (
+        "continente", "20241125", "frescos")
+    assert backfill.classify(str(raw / "pingo_doce" / "20241125" /
+                                 "pingo-doce-bebidas.csv")) == (
+        "pingo_doce", "20241125", "pingo-doce-bebidas")
+    assert backfill.classify(str(raw / "auchan" / "20241125" /
+                                 "marcas-auchan_20241125.csv")) == (
+        "auchan", "20241125", "marcas-auchan")
+    assert backfill.classify(str(tmp_path / "price_data.csv")) is None
+
+
+def test_discover_orders_by_date_and_skips_hidden_files(workdir,
+                                                        make_products):
+    df = make_products("auchan", [1], [1.0])
+    late = write_csv("raw", "auchan", "20241102", "c1_20241102.csv", df)
+    early = write_csv("raw", "auchan", "20241101", "c1_20241101.csv", df)
+    other = write_csv("raw", "pingo_doce", "20241101", "c1.csv", df)
+    write_csv("raw/.partial", "auchan", "20241103", "c1_20241103.csv", df)
+    with open(os.path.join("raw", "notes.csv"), "w") as f:
+        f.write("not scraper output\n")
+
+    assert backfill.discover(["raw"]) == [
+        ("auchan", "20241101", "c1", early),
+        ("pingo_doce", "20241101", "c1", other),
+        ("auchan", "20241102", "c1", late),
+    ]
+
+
+def test_backfill_resumes_from_the_journal(workdir, make_products):
+    for date, product_ids in (("20241101", [1, 2]), ("20241102", [2, 3])):
+        for cgid in ("c1", "c2"):
+            write_csv("raw", "auchan", date, f"{cgid}_{date}.csv",
+                      make_products("auchan", product_ids, [1.0, 2.0],
+                                    date=date, cgid=cgid))
+
+    assert len(backfill.backfill(["raw"], workers=2)) == 4
+    store = output.get_store()
+    assert len(store.partitions("auchan")) == 4
+
+    # Only the files added since the last run are imported again
+    added = write_csv("raw", "auchan", "20241103", "c1_20241103.csv",
+                      make_products("auchan", [4], [4.0], date="20241103"))
+    assert backfill.backfill(["raw"], workers=2) == [added]
+    assert len(backfill.backfill(["raw"], workers=2, restart=True)) == 5
+
+    dimension = output.get_dimension().load("auchan")
+    assert sorted(dimension["product_id"].astype("str")) == ["1", "2", "3",
+                                                             "4"]
+    assert output.get_warehouse().dates() == ["20241101", "20241102",
+                                              "20241103"]
+
+
+class FakeExecutor:
+    """Holds the submitted tasks and finishes them in reverse order."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *task):
+        future = Future()
+        self.submitted.append((task, future))
+        return future
+
+    def finish(self):
+        for task, future in reversed(self.submitted):
+            if not future.done():
+                future.set_result(task[2])
+
+
+def test_results_come_back_in_task_order():
+    executor = FakeExecutor()
+    tasks = [("auchan", "20241101", f"c{i}", f"c{i}.csv") for i in range(7)]
+
+    results = []
+    for task, future in backfill._ordered_results(executor, tasks, window=3):
+        # Never more than `window` files are in flight
+        assert len(executor.submitted) - len(results) <= 3
+        executor.finish()
+        results.append((task[2], future.result()))
+
+    assert results == [(f"c{i}", f"c{i}") for i in range(7)]
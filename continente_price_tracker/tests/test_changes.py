@@ -0,0 +1,54 @@
+import pandas as pd
+
+from storage.changes import ChangeDetector
+
+
+def test_first_crawl_only_seeds_the_state(tmp_path, make_products):
+    detector = ChangeDetector(str(tmp_path))
+    events = detector.apply_day(make_products("auchan", [1, 2], [1.0, 2.0]),
+                                "auchan", "20241101")
+    assert events.empty
+    assert sorted(detector.load_state("auchan")["product_id"]) == ["1", "2"]
+    assert detector.events("20241101").empty
+
+
+def test_event_kinds(tmp_path, make_products):
+    detector = ChangeDetector(str(tmp_path))
+    detector.apply_day(
+        make_products("auchan", [1, 2, 3, 4, 5], [1.0, 2.0, 3.0, 4.0, 5.0],
+                      promotion=[None] * 5),
+        "auchan", "20241101")
+
+    # 1 up, 2 down, 3 promoted at the same price, 4 gone, 5 unchanged, 6 new
+    day2 = make_products("auchan", [1, 2, 3, 5, 6], [1.5, 1.0, 3.0, 5.0, 6.0],
+                         promotion=[None, None, "-20%", None, None])
+    events = detector.apply_day(day2, "auchan", "20241102")
+    kinds = dict(zip(events["product_id"], events["event"].astype("str")))
+    assert kinds == {"1": "price_up", "2": "price_down", "3": "changed",
+                     "4": "removed", "6": "new"}
+
+    stored = detector.events("20241102").set_index("product_id")
+    assert stored.loc["1", "old_price"] == 1.0
+    assert stored.loc["1", "new_price"] == 1.5
+    assert stored.loc["3", "new_promotion"] == "-20%"
+    assert list(detector.events("20241102", kinds=["new"])["product_id"]) == [
+        "6"]
+
+    # Applying the same crawl again is ignored
+    assert detector.apply_day(day2, "auchan", "20241102") is None
+
+
+def test_uncrawled_categories_are_kept(tmp_path, make_products):
+    detector = ChangeDetector(str(tmp_path))
+    day1 = pd.concat([make_products("auchan", [1], [1.0], cgid="c1"),
+                      make_products("auchan", [2], [2.0], cgid="c2")],
+                     ignore_index=True)
+    detector.apply_day(day1, "auchan", "20241101")
+
+    # Category c2 failed on the second day: product 2 is not removed
+    events = detector.apply_day(make_products("auchan", [1], [1.0]),
+                                "auchan", "20241102")
+    assert events.empty
+    state = detector.load_state("auchan").set_index("product_id")
+    assert sorted(state.index) == ["1", "2"]
+    assert state.loc["2", "crawl_date"] < state.loc["1", "crawl_date"]
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from checkpoint import CheckpointJournal
+
+
+def journal(tmp_path):
+    return CheckpointJournal("auchan", date="20241101",
+                             base_path=str(tmp_path))
+
+
+def test_recorded_rows_are_kept_on_disk_only(tmp_path):
+    first = journal(tmp_path)
+    first.record("c1", 0, pd.DataFrame({"id": ["1", "2"]}), {"total": 2})
+
+    assert first._units == {}
+    # Nothing to replay within the run that recorded the unit
+    assert first.get("c1", 0) is None
+
+
+def test_rerun_replays_each_unit_once(tmp_path):
+    journal(tmp_path).record("c1", 0, pd.DataFrame({"id": ["1"]}),
+                             {"total": 2})
+
+    rerun = journal(tmp_path)
+    rows, meta = rerun.get("c1", 0)
+    assert rows["id"].tolist() == ["1"]
+    assert meta == {"total": 2}
+    assert rerun.get("c1", 0) is None
+    assert rerun.get("c1", 1) is None
+
+
+def test_done_categories_are_skipped_and_forgotten(tmp_path):
+    first = journal(tmp_path)
+    first.record("c1", 0, pd.DataFrame({"id": ["1"]}))
+    first.record("c2", 0, pd.DataFrame({"id": ["2"]}))
+    first.mark_category_done("c1")
+
+    rerun = journal(tmp_path)
+    assert rerun.is_category_done("c1")
+    assert rerun.get("c1", 0) is None
+    assert rerun.get("c2", 0) is not None
+
+    rerun.discard()
+    assert not journal(tmp_path).is_category_done("c1")
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    first = journal(tmp_path)
+    first.record("c1", 0, pd.DataFrame({"id": ["1"]}))
+    with open(first.path, "a", encoding="utf-8") as f:
+        f.write('{"category": "c1", "unit": 1, "me')
+
+    rerun = journal(tmp_path)
+    assert rerun.get("c1", 0) is not None
+    assert rerun.get("c1", 1) is None
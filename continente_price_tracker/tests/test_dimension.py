@@ -0,0 +1,55 @@
+import pandas as pd
+
+from storage.dimension import ProductDimension
+
+
+def test_upsert_only_rewrites_changes(tmp_path, make_products):
+    dimension = ProductDimension(str(tmp_path))
+    day1 = make_products("auchan", [1, 2], [1.0, 2.0], brand=["A", "B"])
+    assert dimension.upsert(day1, "auchan", "20241101") == 2
+
+    # Prices are facts, not attributes
+    day2 = make_products("auchan", [1, 2], [9.0, 9.0], brand=["A", "B"])
+    assert dimension.upsert(day2, "auchan", "20241102") == 0
+
+    day3 = make_products("auchan", [1, 3], [1.0, 3.0], brand=["A2", "C"])
+    assert dimension.upsert(day3, "auchan", "20241103") == 2
+
+    rows = dimension.load("auchan").set_index("product_id")
+    assert sorted(rows.index.astype("str")) == ["1", "2", "3"]
+    assert rows.loc["1", "brand"] == "A2"
+    assert rows.loc["1", "first_seen"] == pd.Timestamp("20241101")
+    assert rows.loc["1", "last_changed"] == pd.Timestamp("20241103")
+    assert rows.loc["2", "last_changed"] == pd.Timestamp("20241101")
+
+
+def test_upsert_ignores_older_crawls(tmp_path, make_products):
+    dimension = ProductDimension(str(tmp_path))
+    dimension.upsert(make_products("auchan", [1], [1.0], brand=["A2"]),
+                     "auchan", "20241105")
+
+    # A backfill imports an older crawl after the newer one
+    older = make_products("auchan", [1, 2], [1.0, 2.0], brand=["A", "B"])
+    assert dimension.upsert(older, "auchan", "20241101") == 1
+
+    rows = dimension.load("auchan").set_index("product_id")
+    assert rows.loc["1", "brand"] == "A2"
+    assert rows.loc["1", "last_changed"] == pd.Timestamp("20241105")
+    assert rows.loc["2", "brand"] == "B"
+    assert rows.loc["2", "last_changed"] == pd.Timestamp("20241101")
+
+
+def test_attach_joins_attributes(tmp_path, make_products):
+    dimension = ProductDimension(str(tmp_path))
+    dimension.upsert(make_products("auchan", [1], [1.0], brand=["A"]),
+                     "auchan", "20241101")
+    dimension.upsert(make_products("continente", [1], [1.0], brand=["B"]),
+                     "continente", "20241101")
+
+    facts = pd.DataFrame({"source": ["continente", "auchan", "auchan"],
+                          "product_id": ["1", "1", "2"],
+                          "price": [1.0, 2.0, 3.0]})
+    joined = dimension.attach(facts, ["brand"])
+    assert joined["brand"].iloc[:2].astype("str").tolist() == ["B", "A"]
+    assert joined["brand"].isna().tolist() == [False, False, True]
+    assert joined["price"].tolist() == [1.0, 2.0, 3.0]
@@ -0,0 +1,116 @@
+import pandas as pd
+
+from storage.history import PriceHistory
+from storage.parquet import ParquetStore
+
+
+def crawl(make_products, prices, date, cgid="c1", promotions=None):
+    return make_products("auchan", list(prices), list(prices.values()),
+                         date=date, cgid=cgid, promotion=promotions)
+
+
+def intervals(history, product_id):
+    rows = history.product_history("auchan", product_id)
+    return [(row.price, row.valid_from.strftime("%Y%m%d"),
+             row.valid_to.strftime("%Y%m%d"))
+            for row in rows.itertuples()]
+
+
+def test_intervals_open_extend_and_close(tmp_path, make_products):
+    history = PriceHistory(str(tmp_path))
+    history.apply_category(crawl(make_products, {1: 1.0, 2: 2.0}, "20241101"),
+                           "auchan", "20241101", "c1")
+    history.apply_category(crawl(make_products, {1: 1.0, 2: 2.5}, "20241102"),
+                           "auchan", "20241102", "c1")
+    # Product 2 is missing on the 3rd and back on the 4th
+    history.apply_category(crawl(make_products, {1: 1.0}, "20241103"),
+                           "auchan", "20241103", "c1")
+    history.apply_category(crawl(make_products, {1: 1.0, 2: 2.5}, "20241104"),
+                           "auchan", "20241104", "c1")
+
+    assert intervals(history, 1) == [(1.0, "20241101", "20241104")]
+    assert intervals(history, 2) == [
+        (2.0, "20241101", "20241101"),
+        (2.5, "20241102", "20241102"),
+        (2.5, "20241104", "20241104"),
+    ]
+
+
+def test_promotion_change_opens_an_interval(tmp_path, make_products):
+    history = PriceHistory(str(tmp_path))
+    history.apply_category(crawl(make_products, {1: 1.0}, "20241101"),
+                           "auchan", "20241101", "c1")
+    history.apply_category(
+        crawl(make_products, {1: 1.0}, "20241102", promotions=["-20%"]),
+        "auchan", "20241102", "c1")
+
+    rows = history.product_history("auchan", 1)
+    assert rows["promotion"].isna().tolist() == [True, False]
+
+
+def test_older_crawls_are_ignored(tmp_path, make_products):
+    history = PriceHistory(str(tmp_path))
+    assert history.apply_category(
+        crawl(make_products, {1: 1.0}, "20241102"), "auchan", "20241102", "c1")
+    assert not history.apply_category(
+        crawl(make_products, {1: 9.0}, "20241101"), "auchan", "20241101", "c1")
+    assert intervals(history, 1) == [(1.0, "20241102", "20241102")]
+
+
+def test_apply_day_records_every_category(tmp_path, make_products):
+    history = PriceHistory(str(tmp_path))
+    recorded = history.apply_day({
+        "c1": crawl(make_products, {1: 1.0}, "20241101", cgid="c1"),
+        "c2": crawl(make_products, {2: 2.0}, "20241101", cgid="c2"),
+    }, "auchan", "20241101")
+
+    assert recorded == ["c1", "c2"]
+    snapshot = history.snapshot("20241101")
+    assert sorted(snapshot["cgid"].astype("str")) == ["c1", "c2"]
+    assert history.snapshot("20241102").empty
+
+
+def test_rebuild_matches_incremental_updates(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path / "store"))
+    incremental = PriceHistory(str(tmp_path / "incremental"))
+    for date, prices in [("20241101", {1: 1.0, 2: 2.0}),
+                         ("20241102", {1: 1.5, 2: 2.0})]:
+        for cgid, product_id in [("c1", 1), ("c2", 2)]:
+            df = crawl(make_products, {product_id: prices[product_id]}, date,
+                       cgid=cgid)
+            store.write_category(df, "auchan", date, cgid)
+            incremental.apply_category(df, "auchan", date, cgid)
+
+    rebuilt = PriceHistory(str(tmp_path / "rebuilt"))
+    assert rebuilt.rebuild(store, "auchan") == 4
+
+    def ordered(df):
+        return df.astype({"cgid": "str", "product_id": "str"}).sort_values(
+            ["product_id", "valid_from"], ignore_index=True)
+
+    pd.testing.assert_frame_equal(ordered(rebuilt.load("auchan")),
+                                  ordered(incremental.load("auchan")))
+
+
+def test_update_history_folds_each_day_once(tmp_path, monkeypatch,
+                                            make_products):
+    import config
+    from storage import output
+
+    monkeypatch.setattr(config, "PARQUET_PATH", str(tmp_path / "store"))
+    monkeypatch.setattr(config, "HISTORY_PATH", str(tmp_path / "history"))
+    monkeypatch.setattr(config, "OUTPUT_FORMAT", "parquet")
+    monkeypatch.setattr(config, "DIMENSION_ENABLED", False)
+    monkeypatch.setattr(output, "_store", None)
+    monkeypatch.setattr(output, "_history", None)
+
+    saves = []
+    monkeypatch.setattr(PriceHistory, "_save",
+                        lambda self, retailer, history: saves.append(retailer))
+    for cgid in ("c1", "c2", "c3"):
+        output.get_store().write_category(
+            crawl(make_products, {cgid: 1.0}, "20241101", cgid=cgid),
+            "auchan", "20241101", cgid)
+
+    assert output.update_history(["20241101"]) == {("auchan", "20241101"): 3}
+    assert saves == ["auchan"]
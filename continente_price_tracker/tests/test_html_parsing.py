@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+import pytest
+
+from continente.catalog import (COUNTER_CLASS, parse_page,
+                                product_row_from_tile, products_frame,
+                                total_products_from_text)
+from html_parsing import etree
+from tile_stream import TileStreamParser
+
+# A Continente grid response saved at the root of the repository
+DATA_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                         "..", "data.html")
+
+
+@pytest.fixture(scope="module")
+def grid():
+    with open(DATA_HTML, encoding="utf-8") as f:
+        return f.read()
+
+
+def stream(html_content, chunk_size=4096):
+    """Feeds the page to a tile stream parser, as a download would."""
+    parser = TileStreamParser("product-tile", product_row_from_tile,
+                              capture={"counter": ("div", COUNTER_CLASS)})
+    body = html_content.encode("utf-8")
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start:start + chunk_size])
+    parser.close()
+    return (total_products_from_text(parser.captured.get("counter")),
+            products_frame(parser.rows, "c1"))
+
+
+@pytest.mark.parametrize("backend", ["bs4", "lxml", "stream"])
+def test_backends_return_the_same_rows(grid, backend):
+    if backend != "bs4" and etree is None:
+        pytest.skip("lxml is not installed")
+    if backend == "stream":
+        total, df = stream(grid)
+    else:
+        total, df = parse_page(grid, "c1", backend)
+
+    expected_total, expected = parse_page(grid, "c1", "bs4")
+    assert len(expected) == 36
+    assert total == expected_total
+    pd.testing.assert_frame_equal(df, expected)
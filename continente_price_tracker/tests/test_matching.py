@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+import quantities
+from matching import ProductMatcher, find_matches, normalize_names
+
+
+@pytest.fixture(autouse=True)
+def quantity_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "QUANTITY_CACHE_PATH",
+                        str(tmp_path / "quantities.parquet"))
+    monkeypatch.setattr(quantities, "_cache", None)
+
+
+# Unrelated products, so that the tokens of the tested ones are rare
+FILLER = [
+    ("auchan", "f1", "Bolachas Maria 200g", 101),
+    ("auchan", "f2", "Papel Higienico Renova 12 rolos", 102),
+    ("pingo_doce", "f3", "Arroz Carolino Cigala 1kg", 103),
+    ("pingo_doce", "f4", "Cafe Delta Lote Chavena 250g", 104),
+]
+
+
+def products(*rows):
+    """Dimension rows from (source, product_id, name, attributes_hash)."""
+    return pd.DataFrame(list(rows) + FILLER,
+                        columns=["source", "product_id", "product_name",
+                                 "attributes_hash"])
+
+
+def test_normalize_names_strips_sizes_and_accents():
+    names = pd.Series(["Iogurte Líquido Morango Pingo Doce 4×170 g", None])
+    assert normalize_names(names).tolist() == [
+        "iogurte liquido morango pingo doce", ""]
+
+
+def test_find_matches_skips_same_retailer_and_other_sizes():
+    rows = products(
+        ("continente", "1", "Leite Mimosa Magro 1l", 1),
+        ("continente", "2", "Leite Mimosa Magro 1l", 2),
+        ("auchan", "3", "Leite Mimosa Magro 1 lt", 3),
+        ("pingo_doce", "4", "Leite Mimosa Magro 6x1l", 4),
+    )
+    new = np.arange(len(rows)) == 0
+    pairs = find_matches(rows, new)
+    assert pairs["product"].tolist() == [0]
+    assert pairs["match"].tolist() == [2]
+    assert pairs["score"].iloc[0] == pytest.approx(1.0)
+
+
+def test_update_rematches_changed_products_in_both_directions(tmp_path):
+    matcher = ProductMatcher(str(tmp_path))
+    day1 = products(
+        ("continente", "1", "Azeite Gallo Virgem Extra 750ml", 1),
+        ("auchan", "2", "Azeite Gallo Virgem Extra 75cl", 2),
+        ("auchan", "5", "Azeite Gallo Virgem Extra Garrafa 750ml", 5),
+    )
+    assert matcher.update(day1, "20241101") == 3 + len(FILLER)
+    assert matcher.matches_of("continente", "1")[
+        "match_product_id"].tolist() == ["2"]
+    assert matcher.matches_of("auchan", "2")[
+        "match_product_id"].tolist() == ["1"]
+
+    # Nothing changed, nothing is rewritten
+    assert matcher.update(day1, "20241102") == 0
+
+    # The Auchan product becomes another one: both directions of the old
+    # pair go, and the Continente product, which did not change, is matched
+    # again and finds the other Auchan product
+    day3 = products(
+        ("continente", "1", "Azeite Gallo Virgem Extra 750ml", 1),
+        ("auchan", "2", "Detergente Skip Liquido 60 doses", 3),
+        ("auchan", "5", "Azeite Gallo Virgem Extra Garrafa 750ml", 5),
+    )
+    assert matcher.update(day3, "20241103") == 2
+    assert matcher.matches_of("auchan", "2").empty
+    assert matcher.matches_of("continente", "1")[
+        "match_product_id"].tolist() == ["5"]
+    assert matcher.matches_of("auchan", "5")[
+        "match_product_id"].tolist() == ["1"]
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage import matrix as matrix_module
+from storage.matrix import PriceMatrix
+
+
+@pytest.fixture
+def matrix(tmp_path, monkeypatch):
+    # A few columns, so that the tests grow the file
+    monkeypatch.setattr(matrix_module, "INITIAL_CAPACITY", 2)
+    return PriceMatrix(str(tmp_path))
+
+
+def day(source, product_ids, prices):
+    return pd.DataFrame({"source": source,
+                         "product_id": [str(product_id)
+                                        for product_id in product_ids],
+                         "price": prices})
+
+
+def test_growth_keeps_every_day(matrix, tmp_path):
+    matrix.append_day(day("auchan", [1, 2], [1.0, 2.0]), "20241101")
+    matrix.append_day(day("auchan", [2, 3, 4], [2.5, 3.0, 4.0]), "20241102")
+    matrix.append_day(day("continente", range(5, 10), [5.0] * 5),
+                      "20241103")
+
+    # One file is left, wide enough for every product (2 -> 4 -> 9)
+    assert sorted(name for name in os.listdir(tmp_path)
+                  if name.startswith("prices-")) == ["prices-9.f32"]
+
+    prices, dates, products = matrix.window()
+    assert prices.shape == (3, 9)
+    assert list(dates.strftime("%Y%m%d")) == ["20241101", "20241102",
+                                              "20241103"]
+    np.testing.assert_array_equal(prices[:2, :4], [[1.0, 2.0, np.nan, np.nan],
+                                                   [np.nan, 2.5, 3.0, 4.0]])
+    assert np.isnan(prices[:2, 4:]).all()
+    assert (prices[2, 4:] == 5.0).all()
+
+    prices, _, products = matrix.window("20241102", "20241103",
+                                        retailers=["auchan"])
+    assert products["product_id"].tolist() == ["1", "2", "3", "4"]
+    assert prices.shape == (2, 4)
+
+
+def test_series_and_rewritten_days(matrix):
+    matrix.append_day(day("auchan", [1], [1.0]), "20241101")
+    matrix.append_day(day("auchan", [1, 2, 3], [1.5, 2.0, 3.0]), "20241102")
+    # Writing a day again overwrites its row
+    matrix.append_day(day("auchan", [1], [1.25]), "20241101")
+
+    series = matrix.series("auchan", 1)
+    assert list(series.index.strftime("%Y%m%d")) == ["20241101", "20241102"]
+    assert series.tolist() == [1.25, 1.5]
+    assert np.isnan(matrix.series("auchan", 2).iloc[0])
+    assert matrix.series("continente", 1).isna().all()
+
+
+def test_open_survives_a_growth_rename(matrix, monkeypatch):
+    matrix.append_day(day("auchan", [1, 2, 3], [1.0, 2.0, 3.0]), "20241101")
+
+    # The first listing returns a file a concurrent growth already removed
+    listings = [(2, os.path.join(matrix.base_path, "prices-2.f32"))]
+    current = PriceMatrix._matrix_file
+
+    def matrix_file(self):
+        return listings.pop() if listings else current(self)
+
+    monkeypatch.setattr(PriceMatrix, "_matrix_file", matrix_file)
+    np.testing.assert_array_equal(matrix.open(), [[1.0, 2.0, 3.0]])
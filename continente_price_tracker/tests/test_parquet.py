@@ -0,0 +1,78 @@
+import os
+
+import pyarrow.dataset as ds
+
+from storage.parquet import ParquetStore
+
+
+def test_write_and_read_back(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path))
+    store.write_category(make_products("continente", [1, 2], [1.5, 2.0]),
+                         "continente", "20241101", "c1")
+
+    df = store.read(columns=["product_id", "price", "date"])
+    assert sorted(df["product_id"]) == ["1", "2"]
+    assert df["price"].dtype == "float32"
+    assert set(df["date"]) == {"20241101"}
+
+
+def test_read_prunes_partitions(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path))
+    for retailer in ("continente", "auchan"):
+        for date in ("20241101", "20241102", "20241103"):
+            store.write_category(
+                make_products(retailer, [1], [1.0], date=date),
+                retailer, date, "c1")
+
+    # A pruned partition is never opened, so even an unreadable file in one
+    # does not get in the way
+    with open(os.path.join(store.partition_path("continente", "20241102",
+                                                "c1"), "part-0.parquet"),
+              "wb") as f:
+        f.write(b"not parquet")
+
+    df = store.read(columns=["source", "date"], retailers=["auchan"],
+                    start_date="20241102")
+    assert set(df["source"]) == {"auchan"}
+    assert sorted(df["date"]) == ["20241102", "20241103"]
+
+    df = store.read(columns=["date"], dates=["20241101"],
+                    filter=ds.field("source") == "continente")
+    assert list(df["date"]) == ["20241101"]
+
+
+def test_missing_columns_read_as_nulls(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path), columns=["product_id", "price"])
+    store.write_category(make_products("auchan", [1], [1.0]),
+                         "auchan", "20241101", "c1")
+
+    df = ParquetStore(str(tmp_path)).read(columns=["product_id", "brand"])
+    assert df["brand"].isna().all()
+
+
+def test_rewrite_replaces_category(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path))
+    store.write_category(make_products("auchan", [1, 2], [1.0, 2.0]),
+                         "auchan", "20241101", "c1")
+    store.write_category(make_products("auchan", [3], [3.0]),
+                         "auchan", "20241101", "c1")
+
+    assert list(store.read(columns=["product_id"])["product_id"]) == ["3"]
+
+
+def test_partitions_only_lists_committed_categories(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path))
+    store.write_category(make_products("auchan", [1], [1.0]),
+                         "auchan", "20241101", "c/1")
+    writer = store.category_writer("auchan", "20241101", "c2")
+    writer.write(make_products("auchan", [2], [2.0]))
+
+    # The category being written has a directory, but no file yet
+    assert os.path.isdir(store.partition_path("auchan", "20241101", "c2"))
+    assert store.partitions() == [("auchan", "20241101", "c/1")]
+    assert store.read(columns=["product_id"])["product_id"].tolist() == ["1"]
+
+    writer.abort()
+    assert not os.path.exists(
+        store.partition_path("auchan", "20241101", "c2"))
+    assert store.partitions("continente") == []
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from prices import parse_prices
+
+
+def test_parses_every_site_format():
+    prices = pd.Series(["€22,99/un", "€1,997,33/lt", "0,15€ / UN",
+                        "10,49€ / KG", "22.99", "1.234,56", "1.234.567"])
+    parsed = parse_prices(prices)
+    assert parsed["amount"].tolist() == [22.99, 1997.33, 0.15, 10.49, 22.99,
+                                         1234.56, 1234567.0]
+    assert parsed["unit"].tolist()[:4] == ["un", "l", "un", "kg"]
+    assert parsed["unit"].isna().tolist()[4:] == [True, True, True]
+
+
+def test_missing_and_invalid_prices_become_nan():
+    prices = pd.Series([None, "sem preço", "€1,50/gr"], index=[5, 6, 7])
+    parsed = parse_prices(prices)
+    assert parsed.index.tolist() == [5, 6, 7]
+    assert np.isnan(parsed["amount"].iloc[0])
+    assert np.isnan(parsed["amount"].iloc[1])
+    assert parsed["amount"].iloc[2] == 1.5
+    assert parsed["unit"].isna().tolist() == [True, True, False]
+    assert parsed["unit"].iloc[2] == "g"
+
+
+def test_numeric_prices_are_kept():
+    parsed = parse_prices(pd.Series([1.5, np.nan]))
+    assert parsed["amount"].iloc[0] == 1.5
+    assert parsed["unit"].isna().all()
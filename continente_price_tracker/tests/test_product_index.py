@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from storage.parquet import ParquetStore
+from storage.product_index import ProductIndex
+
+DATES = ["20241101", "20241102", "20241103", "20241104"]
+
+
+def fill_store(store, make_products):
+    """
+    Writes a few days of two categories, each in pages of three products,
+    with products that move between pages and categories.
+    """
+    rng = np.random.default_rng(0)
+    for date in DATES:
+        for cgid in ("c1", "c2"):
+            product_ids = rng.choice(12, size=7, replace=False)
+            writer = store.category_writer("auchan", date, cgid)
+            for start in range(0, len(product_ids), 3):
+                page = product_ids[start:start + 3]
+                writer.write(make_products(
+                    "auchan", page, rng.random(len(page)).round(2),
+                    date=date, cgid=cgid))
+            writer.commit()
+
+
+def scan(store, product_id, start_date=None, end_date=None):
+    df = store.read(columns=["date", "cgid", "product_id", "price"],
+                    retailers=["auchan"], start_date=start_date,
+                    end_date=end_date,
+                    filter=ds.field("product_id") == str(product_id))
+    df = df.astype({"date": "str", "cgid": "str", "product_id": "str"})
+    return df.sort_values(["date", "cgid"], ignore_index=True)
+
+
+def test_lookup_matches_a_scan(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path / "parquet"))
+    fill_store(store, make_products)
+    index = ProductIndex(store, str(tmp_path / "index"))
+    assert index.rebuild("auchan") == len(store.read(columns=["product_id"]))
+    # One row group per page
+    assert index.load("auchan")["row_group"].max() == 2
+
+    for product_id in range(12):
+        for start_date, end_date in ((None, None), ("20241102", "20241103")):
+            found = index.lookup("auchan", product_id,
+                                 columns=["product_id", "price"],
+                                 start_date=start_date, end_date=end_date)
+            expected = scan(store, product_id, start_date, end_date)
+            pd.testing.assert_frame_equal(
+                found[["date", "cgid", "product_id", "price"]].astype(
+                    {"date": "str", "cgid": "str", "product_id": "str"}),
+                expected, check_categorical=False)
+            assert (found["source"] == "auchan").all()
+
+    assert index.lookup("auchan", 99, columns=["price"]).empty
+
+
+def test_update_reindexes_a_rewritten_day(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path / "parquet"))
+    store.write_category(make_products("auchan", [1, 2], [1.0, 2.0]),
+                         "auchan", "20241101", "c1")
+    index = ProductIndex(store, str(tmp_path / "index"))
+    index.update("auchan", ["20241101"])
+
+    # The category is scraped again and the product moves to another row
+    store.write_category(make_products("auchan", [2, 1], [2.0, 1.5]),
+                         "auchan", "20241101", "c1")
+    # Until the day is indexed again, the changed file is read by a scan
+    found = index.lookup("auchan", 1, columns=["price"])
+    assert found["price"].tolist() == [1.5]
+
+    assert index.update("auchan", ["20241101"]) == 2
+    found = index.lookup("auchan", 1, columns=["price"])
+    assert found["price"].tolist() == [1.5]
+    assert len(index.load("auchan")) == 2
+
+
+def test_lookup_survives_a_rewritten_file(tmp_path, make_products):
+    store = ParquetStore(str(tmp_path / "parquet"))
+    for date in ("20241101", "20241102"):
+        for cgid in ("c1", "c2"):
+            store.write_category(
+                make_products("auchan", [2, 3, 1], [2.0, 3.0, 1.0],
+                              date=date, cgid=cgid),
+                "auchan", date, cgid)
+    index = ProductIndex(store, str(tmp_path / "index"))
+    index.rebuild("auchan")
+
+    # A reparse leaves fewer rows in one file, so the indexed row of the
+    # product is past its end, and the product moves to the other category
+    store.write_category(make_products("auchan", [3], [3.5], cgid="c1"),
+                         "auchan", "20241102", "c1")
+    store.write_category(
+        make_products("auchan", [2, 1, 4], [2.5, 1.5, 4.0], cgid="c2"),
+        "auchan", "20241102", "c2")
+
+    for product_id in (1, 2, 3):
+        found = index.lookup("auchan", product_id, columns=["price"])
+        expected = scan(store, product_id)
+        assert found[["date", "cgid"]].astype("str").values.tolist() == \
+            expected[["date", "cgid"]].values.tolist()
+        assert found["price"].tolist() == expected["price"].tolist()
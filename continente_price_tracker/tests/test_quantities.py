@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import quantities
+from quantities import QuantityCache, extract_quantities, parse_quantities
+
+
+def test_parses_package_sizes():
+    names = pd.Series(["iogurte pur natur 4x125g", "vodka trofeu silver 70 cl",
+                       "Sacos Lixo Eco+ Maxi Rolo 30 lt", "cordão 20mt",
+                       "detergente 60 doses", "ovos meia dúzia",
+                       "Agua 1,5L", "3 x 75 cl"])
+    parsed = parse_quantities(names)
+    assert parsed["pack_count"].tolist() == [4, 1, 1, 1, 1, 1, 1, 3]
+    assert parsed["quantity"].tolist() == [500, 700, 30000, 20, 60, 6, 1500,
+                                           2250]
+    assert parsed["quantity_unit"].astype("str").tolist() == [
+        "g", "ml", "ml", "m", "doses", "un", "ml", "ml"]
+
+
+def test_names_without_a_size_are_missing():
+    parsed = parse_quantities(pd.Series(["fralda T5 +6M", None], index=[3, 4]))
+    assert parsed.index.tolist() == [3, 4]
+    assert parsed.isna().all().all()
+
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "quantities.parquet")
+    names = pd.Series(["leite 1l", "arroz 1kg", "leite 1l", None])
+    expected = parse_quantities(names)
+
+    first = extract_quantities(names, QuantityCache(path))
+    pd.testing.assert_frame_equal(
+        first.astype({"quantity_unit": "object"}),
+        expected.astype({"quantity_unit": "object"}))
+
+    # A new cache on the same file parses nothing
+    def fail(names):
+        raise AssertionError(f"parsed {names.tolist()}")
+
+    monkeypatch.setattr(quantities, "parse_quantities", fail)
+    cache = QuantityCache(path)
+    assert len(cache.entries()) == 2
+    second = extract_quantities(names, cache)
+    assert second["quantity"].tolist()[:3] == [1000.0, 1000.0, 1000.0]
+    assert second["quantity_unit"].astype("object").tolist()[:3] == [
+        "ml", "g", "ml"]
+    assert np.isnan(second["quantity"].iloc[3])
+
+
+def test_cache_ignores_older_parser_versions(tmp_path, monkeypatch):
+    path = str(tmp_path / "quantities.parquet")
+    extract_quantities(pd.Series(["leite 1l"]), QuantityCache(path))
+
+    monkeypatch.setattr(quantities, "PARSER_VERSION",
+                        quantities.PARSER_VERSION + 1)
+    assert QuantityCache(path).entries().empty
@@ -0,0 +1,64 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    now = [100.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def limiter():
+    return AdaptiveRateLimiter(rate=4.0, min_rate=0.5, max_rate=5.0,
+                               burst=2, increase=0.5, decrease=0.5,
+                               cooldown=2.0)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503, None])
+def test_congestion_cuts_the_rate(clock, status):
+    bucket = limiter()
+    bucket.record(status, 0.1)
+    assert bucket.rate == 2.0
+
+
+def test_cuts_wait_for_the_cooldown(clock):
+    bucket = limiter()
+    bucket.record(429, 0.1)
+    # Responses to requests already in flight only count once
+    clock[0] += 1.0
+    bucket.record(503, 0.1)
+    assert bucket.rate == 2.0
+
+    clock[0] += 1.5
+    bucket.record(503, 0.1)
+    assert bucket.rate == 1.0
+
+    for _ in range(3):
+        clock[0] += 2.0
+        bucket.record(429, 0.1)
+    assert bucket.rate == 0.5
+
+
+def test_healthy_responses_recover_the_rate(clock):
+    bucket = limiter()
+    bucket.record(429, 0.1)
+    assert bucket.rate == 2.0
+
+    for expected in (2.5, 3.0, 3.5, 4.0, 4.5, 5.0, 5.0):
+        bucket.record(200, 0.1)
+        assert bucket.rate == pytest.approx(expected)
+
+
+def test_a_latency_spike_counts_as_congestion(clock):
+    bucket = limiter()
+    bucket.record(200, 0.1)
+    assert bucket.rate == 4.5
+
+    # The smoothed latency (0.8 * 0.1 + 0.2 * 2.0) is over three times the
+    # 0.1 s baseline
+    bucket.record(200, 2.0)
+    assert bucket.rate == 2.25
@@ -0,0 +1,108 @@
+import asyncio
+from email.utils import formatdate
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+import retry
+from retry import RetryBudget, RetryPolicy, parse_retry_after
+
+GRID_URL = URL("https://www.auchan.pt/grid")
+
+
+def response_error(status, retry_after=None):
+    headers = CIMultiDict()
+    if retry_after is not None:
+        headers["Retry-After"] = retry_after
+    request_info = aiohttp.RequestInfo(GRID_URL, "GET", CIMultiDictProxy(
+        CIMultiDict()), GRID_URL)
+    return aiohttp.ClientResponseError(request_info, (), status=status,
+                                       headers=headers)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the waits instead of sleeping."""
+    waits = []
+
+    async def sleep(delay):
+        waits.append(delay)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+    return waits
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    in_a_minute = formatdate(retry.time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(in_a_minute) <= 60
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_overload_statuses_are_retried(status):
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=10.0,
+                         budget=RetryBudget(100))
+    delay = policy.next_delay(response_error(status), 0)
+    assert 0 <= delay <= 1.0
+    # The second retry may wait up to twice as long
+    assert 0 <= policy.next_delay(response_error(status), 1) <= 2.0
+    # No attempt is left after the third
+    assert policy.next_delay(response_error(status), 2) is None
+
+
+def test_client_errors_are_not_retried():
+    policy = RetryPolicy(attempts=3, budget=RetryBudget(100))
+    assert policy.next_delay(response_error(404), 0) is None
+    assert policy.next_delay(ValueError("bad page"), 0) is None
+    assert policy.next_delay(asyncio.TimeoutError(), 0) is not None
+
+
+def test_retry_after_wins_over_the_backoff():
+    budget = RetryBudget(100)
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=2.0,
+                         budget=budget)
+    assert policy.next_delay(response_error(429, "30"), 0) == 30.0
+    assert budget.remaining == 70
+
+
+def test_the_run_budget_stops_retries(sleeps):
+    budget = RetryBudget(10)
+    policy = RetryPolicy(attempts=10, budget=budget)
+    calls = []
+
+    async def overloaded():
+        calls.append(1)
+        raise response_error(503, "4")
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(policy.call(overloaded))
+    # Two waits of 4 s fit in the budget; the third would not
+    assert sleeps == [4.0, 4.0]
+    assert len(calls) == 3
+    assert budget.remaining == 2
+
+    # The budget is shared: another request gets no retry at all
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(RetryPolicy(attempts=10, budget=budget).call(overloaded))
+    assert len(calls) == 4
+
+
+def test_call_returns_once_a_retry_succeeds(sleeps):
+    outcomes = [response_error(502, "1"), asyncio.TimeoutError(), "page"]
+
+    async def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    policy = RetryPolicy(attempts=3, base_delay=0.5, max_delay=0.5,
+                         budget=RetryBudget(100))
+    assert asyncio.run(policy.call(flaky)) == "page"
+    assert sleeps[0] == 1.0
+    assert 0 <= sleeps[1] <= 0.5
@@ -0,0 +1,99 @@
+import os
+import stat
+
+import pandas as pd
+import pytest
+
+import config
+from storage import output
+from storage.dimension import ProductDimension
+from storage.sink import CsvCategoryWriter, open_category_sink
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PARQUET_PATH", str(tmp_path / "store"))
+    monkeypatch.setattr(config, "DIMENSION_PATH", str(tmp_path / "dim"))
+    monkeypatch.setattr(config, "OUTPUT_FORMAT", "parquet")
+    monkeypatch.setattr(config, "DIMENSION_ENABLED", True)
+    monkeypatch.setattr(output, "_store", None)
+    monkeypatch.setattr(output, "_dimension", None)
+    return tmp_path
+
+
+def umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def page(make_products, product_ids):
+    return make_products("auchan", product_ids, [1.0] * len(product_ids))
+
+
+def test_pages_are_committed_with_one_dimension_upsert(
+        stores, monkeypatch, make_products):
+    upserts = []
+    upsert = ProductDimension.upsert
+
+    def counting_upsert(self, df, retailer, date):
+        upserts.append(len(df))
+        return upsert(self, df, retailer, date)
+
+    monkeypatch.setattr(ProductDimension, "upsert", counting_upsert)
+    with open_category_sink("auchan", "20241101", "c1", lambda df: df,
+                            "unused.csv") as sink:
+        sink.write_page(page(make_products, [1, 2]))
+        sink.write_page(pd.DataFrame())
+        sink.write_page(page(make_products, [3]))
+        assert upserts == []
+
+    assert sink.rows == 3
+    assert upserts == [3]
+    assert output.get_store().partitions() == [("auchan", "20241101", "c1")]
+    assert len(output.get_dimension().load("auchan")) == 3
+    assert file_mode(sink.path) == 0o644 & ~umask()
+
+
+def test_only_new_or_changed_attributes_are_kept(stores, make_products):
+    output.get_dimension().upsert(
+        make_products("auchan", [1, 2], [1.0, 2.0], brand=["A", "B"]),
+        "auchan", "20241101")
+
+    with open_category_sink("auchan", "20241102", "c1", lambda df: df,
+                            "unused.csv") as sink:
+        sink.write_page(make_products("auchan", [1, 2], [1.0, 2.0],
+                                      brand=["A", "B2"]))
+        sink.write_page(make_products("auchan", [3], [3.0], brand=["C"]))
+        kept = pd.concat(sink._attributes)
+        assert kept["product_id"].astype("str").tolist() == ["2", "3"]
+
+    rows = output.get_dimension().load("auchan").set_index("product_id")
+    assert rows["brand"].astype("str").to_dict() == {"1": "A", "2": "B2",
+                                                     "3": "C"}
+
+
+def test_failed_category_writes_nothing(stores, make_products):
+    with pytest.raises(RuntimeError):
+        with open_category_sink("auchan", "20241101", "c1", lambda df: df,
+                                "unused.csv") as sink:
+            sink.write_page(page(make_products, [1]))
+            raise RuntimeError("page failed")
+
+    assert output.get_store().partitions() == []
+    assert output.get_dimension().load("auchan").empty
+
+
+def test_csv_writer_publishes_readable_files(tmp_path, make_products):
+    path = str(tmp_path / "c1.csv")
+    writer = CsvCategoryWriter(path)
+    writer.write(page(make_products, [1]))
+    writer.write(page(make_products, [2]))
+    assert writer.commit() == path
+
+    assert pd.read_csv(path)["product_id"].tolist() == [1, 2]
+    assert file_mode(path) == 0o644 & ~umask()
@@ -0,0 +1,63 @@
+import config
+from storage import output
+from storage.warehouse import Warehouse
+
+
+def count(warehouse):
+    return warehouse.query("SELECT source, COUNT(*) AS n FROM products "
+                           "GROUP BY source ORDER BY source")
+
+
+def test_reloading_a_day_replaces_its_rows(tmp_path, make_products):
+    warehouse = Warehouse(str(tmp_path / "warehouse.duckdb"))
+    day = make_products("auchan", [1, 2], [1.0, 2.0])
+    assert warehouse.load_frame(day, "20241101") == 2
+    assert warehouse.load_frame(day, "20241101") == 2
+    assert count(warehouse).to_dict("list") == {"source": ["auchan"],
+                                                "n": [2]}
+
+    # Another retailer of the same day leaves the first one alone
+    warehouse.load_frame(make_products("continente", [1], [3.0]), "20241101")
+    assert count(warehouse)["n"].tolist() == [2, 1]
+
+    # A re-scrape of the day replaces its rows, including the gone ones
+    warehouse.load_frame(make_products("auchan", [1], [1.5]), "20241101")
+    assert count(warehouse)["n"].tolist() == [1, 1]
+    assert warehouse.product_history("auchan", 1)["price"].tolist() == [1.5]
+    assert warehouse.product_history("auchan", 2).empty
+
+
+def test_days_accumulate_into_the_history(tmp_path, make_products):
+    warehouse = Warehouse(str(tmp_path / "warehouse.duckdb"))
+    for date, price in (("20241102", 2.0), ("20241101", 1.0),
+                        ("20241102", 2.5)):
+        warehouse.load_frame(
+            make_products("auchan", [1], [price], date=date), date)
+
+    assert warehouse.dates() == ["20241101", "20241102"]
+    history = warehouse.product_history("auchan", 1)
+    assert history["price"].tolist() == [1.0, 2.5]
+
+
+def test_load_warehouse_twice_adds_no_rows(tmp_path, monkeypatch,
+                                           make_products):
+    monkeypatch.setattr(config, "PARQUET_PATH", str(tmp_path / "store"))
+    monkeypatch.setattr(config, "DIMENSION_PATH", str(tmp_path / "dim"))
+    monkeypatch.setattr(config, "WAREHOUSE_PATH",
+                        str(tmp_path / "warehouse.duckdb"))
+    monkeypatch.setattr(config, "OUTPUT_FORMAT", "parquet")
+    monkeypatch.setattr(config, "WAREHOUSE_ENABLED", True)
+    for name in ("_store", "_dimension", "_warehouse"):
+        monkeypatch.setattr(output, name, None)
+
+    for cgid, product_ids in (("c1", [1, 2]), ("c2", [3])):
+        df = make_products("auchan", product_ids, [1.0] * len(product_ids),
+                           cgid=cgid, brand=["A"] * len(product_ids))
+        output.save_category(df, "auchan", "20241101", cgid, "unused.csv")
+
+    assert output.load_warehouse(["20241101"]) == {"20241101": 3}
+    assert output.load_warehouse(["20241101"]) == {"20241101": 3}
+    warehouse = output.get_warehouse()
+    assert count(warehouse)["n"].tolist() == [3]
+    # The attributes come from the product dimension
+    assert warehouse.product_history("auchan", 3)["brand"].tolist() == ["A"]